@@ -1,20 +1,58 @@
-from typing import Set, Type, TYPE_CHECKING
+from contextlib import contextmanager
+from typing import Set, Type, TYPE_CHECKING, Optional, Dict, Iterator, Sequence
 
 if TYPE_CHECKING:
     from betty.builtins import _
 
 from betty.app.extension import Extension, UserFacingExtension
 from betty.privatizer import Privatizer
+from betty.model import Entity
 from betty.model.ancestry import Ancestry, Person, File, Citation, Source, Event
 from betty.functools import walk
 from betty.load import PostLoader
 
 
+class _BulkReplacement:
+    """
+    Collect the entities replaced by an anonymous entity, and their associates.
+
+    Associates are collected from all replaced entities first, without duplicates, so they can be added to the
+    anonymous entity in bulk, instead of one replaced entity at a time.
+    """
+
+    def __init__(self, associates_attr_names: Sequence[str]):
+        self.replaced: Dict[int, Entity] = {}
+        self.associates: Dict[str, Dict[int, Entity]] = {
+            associates_attr_name: {}
+            for associates_attr_name
+            in associates_attr_names
+        }
+
+    def add(self, replaced: Entity) -> None:
+        self.replaced[id(replaced)] = replaced
+        for associates_attr_name, associates in self.associates.items():
+            replaced_associates = getattr(replaced, associates_attr_name)
+            for associate in replaced_associates:
+                associates.setdefault(id(associate), associate)
+            replaced_associates.clear()
+
+    def finish(self, replacement: Entity) -> None:
+        for associates_attr_name, associates in self.associates.items():
+            # Replaced entities lose all their associations, including those with other replaced entities.
+            getattr(replacement, associates_attr_name).append(*[
+                associate
+                for associate_key, associate
+                in associates.items()
+                if associate_key not in self.replaced
+            ])
+
+
 class AnonymousSource(Source):
     _ID = 'betty-anonymous-source'
 
     def __init__(self):
         super().__init__(self._ID)
+        self._bulk_replacement: Optional[_BulkReplacement] = None
 
     @property  # type: ignore
     def name(self) -> str:  # type: ignore
@@ -30,10 +68,31 @@ class AnonymousSource(Source):
         # This is a no-op as the name is 'hardcoded'.
         pass
 
+    @contextmanager
+    def replace_in_bulk(self, ancestry: Ancestry) -> Iterator[None]:
+        """
+        Replace sources in bulk.
+
+        Within this context, replaced sources lose their associates immediately, but the associates are added to this
+        source, and the replaced sources are removed from the ancestry, only when the context exits.
+        """
+        self._bulk_replacement = _BulkReplacement(('citations', 'contains', 'files'))
+        try:
+            yield
+        finally:
+            bulk_replacement = self._bulk_replacement
+            self._bulk_replacement = None
+            bulk_replacement.finish(self)
+            ancestry.entities[Source].remove_many(bulk_replacement.replaced.values())  # type: ignore[arg-type]
+
     def replace(self, other: Source, ancestry: Ancestry) -> None:
         if isinstance(other, AnonymousSource):
             return
 
+        if self._bulk_replacement is not None:
+            self._bulk_replacement.add(other)
+            return
+
         self.citations.append(*other.citations)
         other.citations.clear()
         self.contains.append(*other.contains)
@@ -48,6 +107,7 @@ class AnonymousCitation(Citation):
 
     def __init__(self, source: Source):
         super().__init__(self._ID, source)
+        self._bulk_replacement: Optional[_BulkReplacement] = None
 
     @property  # type: ignore
     def location(self) -> str:  # type: ignore
@@ -63,10 +123,31 @@ class AnonymousCitation(Citation):
         # This is a no-op as the location is 'hardcoded'.
         pass
 
+    @contextmanager
+    def replace_in_bulk(self, ancestry: Ancestry) -> Iterator[None]:
+        """
+        Replace citations in bulk.
+
+        Within this context, replaced citations lose their associates immediately, but the associates are added to
+        this citation, and the replaced citations are removed from the ancestry, only when the context exits.
+        """
+        self._bulk_replacement = _BulkReplacement(('facts', 'files'))
+        try:
+            yield
+        finally:
+            bulk_replacement = self._bulk_replacement
+            self._bulk_replacement = None
+            bulk_replacement.finish(self)
+            ancestry.entities[Citation].remove_many(bulk_replacement.replaced.values())  # type: ignore[arg-type]
+
     def replace(self, other: Citation, ancestry: Ancestry) -> None:
         if isinstance(other, AnonymousCitation):
             return
 
+        if self._bulk_replacement is not None:
+            self._bulk_replacement.add(other)
+            return
+
         self.facts.append(*other.facts)
         other.facts.clear()
         self.files.append(*other.files)
@@ -88,12 +169,14 @@ def anonymize(ancestry: Ancestry, anonymous_citation: AnonymousCitation) -> None
     for file in ancestry.entities[File]:
         if file.private:
             anonymize_file(file)
-    for source in ancestry.entities[Source]:
-        if source.private:
-            anonymize_source(source, ancestry, anonymous_source)
-    for citation in ancestry.entities[Citation]:
-        if citation.private:
-            anonymize_citation(citation, ancestry, anonymous_citation)
+    with anonymous_source.replace_in_bulk(ancestry):
+        for source in ancestry.entities[Source]:
+            if source.private:
+                anonymize_source(source, ancestry, anonymous_source)
+    with anonymous_citation.replace_in_bulk(ancestry):
+        for citation in ancestry.entities[Citation]:
+            if citation.private:
+                anonymize_citation(citation, ancestry, anonymous_citation)
 
 
 def anonymize_person(person: Person) -> None:
@@ -133,9 +216,7 @@ def anonymize_source(source: Source, ancestry: Ancestry, anonymous_source: Anony
         return
 
     anonymous_source.replace(source, ancestry)
-    for citation in source.citations:
-        if not isinstance(citation, AnonymousCitation):
-            source.citations.remove(citation)
+    source.citations.remove_where(lambda citation: not isinstance(citation, AnonymousCitation))
     del source.contained_by
     del source.contains
     del source.files
@@ -1,12 +1,13 @@
 import asyncio
 import inspect
+import os
 import sys
 from asyncio import events, coroutines
 from asyncio.runners import _cancel_all_tasks  # type: ignore
 from contextlib import suppress
 from functools import wraps
-from threading import Thread
-from typing import Any
+from threading import Thread, Lock
+from typing import Any, List
 
 
 def _sync_function(f):
@@ -24,9 +25,7 @@ def sync(f):
             running_loop = None
 
         if running_loop:
-            synced = _SyncedAwaitable(f)
-            synced.start()
-            return synced.join()
+            return _get_bridge(running_loop).run(f)
 
         return _run(f)
 
@@ -72,22 +71,39 @@ def _run(main, *, debug=None):
             loop.close()
 
 
-class _SyncedAwaitable(Thread):
-    def __init__(self, awaitable):
-        super().__init__()
-        self._awaitable = awaitable
-        self._return_value = None
-        self._e = None
+class _Bridge:
+    """
+    Run coroutines for synchronous callers on a long-lived event loop in a background thread.
+    """
 
-    @sync
-    async def run(self) -> None:
-        try:
-            self._return_value = await self._awaitable
-        except BaseException as e:
-            self._e = e
-
-    def join(self, *args, **kwargs) -> Any:
-        super().join(*args, **kwargs)
-        if self._e:
-            raise self._e
-        return self._return_value
+    def __init__(self):
+        self.loop = events.new_event_loop()
+        self._thread = Thread(target=self._run_forever, daemon=True)
+        self._thread.start()
+
+    def _run_forever(self) -> None:
+        events.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def run(self, awaitable) -> Any:
+        return asyncio.run_coroutine_threadsafe(awaitable, self.loop).result()
+
+
+_bridges: List[_Bridge] = []
+_bridges_pid = os.getpid()
+_bridges_lock = Lock()
+
+
+def _get_bridge(running_loop: asyncio.AbstractEventLoop) -> _Bridge:
+    global _bridges_pid
+
+    with _bridges_lock:
+        # Threads do not survive forking, so child processes must start their own bridges.
+        if _bridges_pid != os.getpid():
+            _bridges.clear()
+            _bridges_pid = os.getpid()
+        # A bridge's loop cannot wait for itself, so coroutines synchronized on a bridge run on the next one.
+        depth = next((index + 1 for index, bridge in enumerate(_bridges) if bridge.loop is running_loop), 0)
+        while len(_bridges) <= depth:
+            _bridges.append(_Bridge())
+        return _bridges[depth]
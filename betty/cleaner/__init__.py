@@ -1,145 +1,137 @@
-from typing import Set, Type, Dict, TYPE_CHECKING
+from contextlib import suppress
+from typing import Set, Type, Dict, TYPE_CHECKING, Iterable, List, TypeVar, Callable
 
 from betty.anonymizer import Anonymizer
 from betty.app.extension import Extension, UserFacingExtension
 from betty.load import PostLoader
+from betty.model import Entity
 from betty.model.ancestry import Ancestry, Place, File, Person, Event, Source, Citation
 
-try:
-    from graphlib_backport import TopologicalSorter
-except ModuleNotFoundError:
-    from graphlib import TopologicalSorter
-
 if TYPE_CHECKING:
     from betty.builtins import _
 
 
 def clean(ancestry: Ancestry) -> None:
-    _clean_people(ancestry)
-    _clean_events(ancestry)
-    _clean_places(ancestry)
-    _clean_files(ancestry)
-    _clean_citations(ancestry)
-    _clean_sources(ancestry)
-
-
-def _clean_events(ancestry: Ancestry) -> None:
-    for event in ancestry.entities[Event]:
-        _clean_event(ancestry, event)
-
-
-def _clean_event(ancestry: Ancestry, event: Event) -> None:
-    if len(event.presences) > 0:
-        return
-
-    del event.presences
-    del event.place
-    del event.citations
-    del event.files
-    del ancestry.entities[Event][event]
-
-
-_PlacesGraph = Dict[Place, Set[Place]]
-
-
-def _clean_places(ancestry: Ancestry) -> None:
-    places = ancestry.entities[Place]
-
-    def _extend_place_graph(graph: _PlacesGraph, enclosing_place: Place) -> None:
-        enclosures = enclosing_place.encloses
-        # Ensure each place appears in the graph, even if they're anonymous.
-        graph.setdefault(enclosing_place, set())
-        for enclosure in enclosures:
-            enclosed_place = enclosure.encloses
-            seen_enclosed_place = enclosed_place in graph
-            graph[enclosing_place].add(enclosed_place)
-            if not seen_enclosed_place:
-                _extend_place_graph(graph, enclosed_place)
+    """
+    Remove all entities that are no longer needed.
+
+    Rather than removing entities one by one and checking their associates again after each removal, this counts each
+    entity's references once, and then cascades removals through those counts. All entities are then removed from the
+    ancestry in bulk.
+    """
+    people = [person for person in ancestry.entities[Person] if _is_person_removable(person)]
+    events = [event for event in ancestry.entities[Event] if len(event.presences) == 0]
+    places = _get_removable_places(ancestry, events)
+    files = _get_removable_files(ancestry, events)
+    citations = _get_removable_citations(ancestry, events)
+    sources = _get_removable_sources(ancestry, citations)
+
+    ancestry.entities[Person].remove_many(people)
+
+    for event in events:
+        del event.presences
+        del event.place
+        del event.citations
+        del event.files
+    ancestry.entities[Event].remove_many(events)
 
-    places_graph: _PlacesGraph = {}
     for place in places:
-        _extend_place_graph(places_graph, place)
-
-    for place in TopologicalSorter(places_graph).static_order():
-        _clean_place(ancestry, place)
-
-
-def _clean_place(ancestry: Ancestry, place: Place) -> None:
-    if len(place.events) > 0:
-        return
-
-    if len(place.encloses) > 0:
-        return
-
-    del place.enclosed_by
-    del ancestry.entities[Place][place]
-
-
-def _clean_people(ancestry: Ancestry) -> None:
-    for person in ancestry.entities[Person]:
-        _clean_person(ancestry, person)
-
-
-def _clean_person(ancestry: Ancestry, person: Person) -> None:
-    if not person.private:
-        return
-
-    if len(person.children) > 0:
-        return
-
-    del ancestry.entities[Person][person]
-
-
-def _clean_files(ancestry: Ancestry) -> None:
-    for file in ancestry.entities[File]:
-        _clean_file(ancestry, file)
-
-
-def _clean_file(ancestry: Ancestry, file: File) -> None:
-    if len(file.entities) > 0:
-        return
-
-    if len(file.citations) > 0:
-        return
-
-    del ancestry.entities[File][file]
-
-
-def _clean_sources(ancestry: Ancestry) -> None:
-    for source in ancestry.entities[Source]:
-        _clean_source(ancestry, source)
-
-
-def _clean_source(ancestry: Ancestry, source: Source) -> None:
-    if len(source.citations) > 0:
-        return
-
-    if source.contained_by is not None:
-        return
-
-    if len(source.contains) > 0:
-        return
-
-    if len(source.files) > 0:
-        return
-
-    del ancestry.entities[Source][source]
-
-
-def _clean_citations(ancestry: Ancestry) -> None:
-    for citation in ancestry.entities[Citation]:
-        _clean_citation(ancestry, citation)
-
-
-def _clean_citation(ancestry: Ancestry, citation: Citation) -> None:
-    if len(citation.facts) > 0:
-        return
-
-    if len(citation.files) > 0:
-        return
-
-    del citation.source
-    del ancestry.entities[Citation][citation]
+        del place.enclosed_by
+    ancestry.entities[Place].remove_many(places)
+
+    ancestry.entities[File].remove_many(files)
+
+    for citation in citations:
+        del citation.source
+    ancestry.entities[Citation].remove_many(citations)
+
+    ancestry.entities[Source].remove_many(sources)
+
+
+def _is_person_removable(person: Person) -> bool:
+    return bool(person.private) and len(person.children) == 0
+
+
+def _get_removable_places(ancestry: Ancestry, removed_events: Iterable[Event]) -> List[Place]:
+    """
+    Get the places without events or enclosed places.
+
+    This includes places that are not part of the ancestry, but are enclosed by places that are, so that removing them
+    lets their enclosing places be removed as well.
+    """
+    # Each place's references, keyed by place identity.
+    references: Dict[int, int] = {}
+    places: List[Place] = []
+    unvisited = list(ancestry.entities[Place])
+    while unvisited:
+        place = unvisited.pop()
+        if id(place) in references:
+            continue
+        references[id(place)] = len(place.events) + len(place.encloses)
+        places.append(place)
+        unvisited.extend(enclosure.encloses for enclosure in place.encloses)
+
+    for event in removed_events:
+        if event.place is not None and id(event.place) in references:
+            references[id(event.place)] -= 1
+
+    removable_places = []
+    unreferenced_places = [place for place in places if references[id(place)] == 0]
+    while unreferenced_places:
+        place = unreferenced_places.pop()
+        removable_places.append(place)
+        for enclosure in place.enclosed_by:
+            enclosing_place = enclosure.enclosed_by
+            if enclosing_place is None or id(enclosing_place) not in references:
+                continue
+            references[id(enclosing_place)] -= 1
+            if references[id(enclosing_place)] == 0:
+                unreferenced_places.append(enclosing_place)
+    return removable_places
+
+
+def _get_removable_files(ancestry: Ancestry, removed_events: Iterable[Event]) -> List[File]:
+    references = _count_references(ancestry.entities[File], lambda file: len(file.entities) + len(file.citations))
+    for event in removed_events:
+        for file in event.files:
+            _dereference(references, file)
+    return [file for file in ancestry.entities[File] if references[id(file)] == 0]
+
+
+def _get_removable_citations(ancestry: Ancestry, removed_events: Iterable[Event]) -> List[Citation]:
+    references = _count_references(ancestry.entities[Citation], lambda citation: len(citation.facts) + len(citation.files))
+    for event in removed_events:
+        for citation in event.citations:
+            _dereference(references, citation)
+    return [citation for citation in ancestry.entities[Citation] if references[id(citation)] == 0]
+
+
+def _get_removable_sources(ancestry: Ancestry, removed_citations: Iterable[Citation]) -> List[Source]:
+    references = _count_references(
+        ancestry.entities[Source],
+        lambda source: len(source.citations) + len(source.contains) + len(source.files) + (source.contained_by is not None),
+    )
+    for citation in removed_citations:
+        if citation.source is not None:
+            _dereference(references, citation.source)
+    return [source for source in ancestry.entities[Source] if references[id(source)] == 0]
+
+
+_EntityT = TypeVar('_EntityT', bound=Entity)
+
+
+def _count_references(entities: Iterable[_EntityT], count: Callable[[_EntityT], int]) -> Dict[int, int]:
+    return {
+        id(entity): count(entity)
+        for entity
+        in entities
+    }
+
+
+def _dereference(references: Dict[int, int], entity: Entity) -> None:
+    # Entities outside the ancestry are never removed, so their references are not counted.
+    with suppress(KeyError):
+        references[id(entity)] -= 1
 
 
 class Cleaner(UserFacingExtension, PostLoader):
@@ -169,10 +169,13 @@ async def _gui(configuration_file_path: Optional[str]):
 
 @click.command(help='Generate a static site.')
 @app_command
+@click.option('--incremental', is_flag=True, help='Only regenerate the pages that changed since the previous generation.')
+@click.option('--processes', type=click.IntRange(min=1), default=1, show_default=True, help='The number of processes to render entity pages with.')
+@click.option('--profile', is_flag=True, help='Report the time spent and the output produced per stage, locale, entity type, template, and generator.')
 @sync
-async def _generate(app: App):
+async def _generate(app: App, incremental: bool, processes: int, profile: bool):
     await load.load(app)
-    await generate.generate(app)
+    await generate.generate(app, incremental=incremental, processes=processes, profile=profile)
 
 
 @click.command(help='Serve a generated site.')
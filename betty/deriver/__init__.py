@@ -1,7 +1,10 @@
 from __future__ import annotations
 
 import logging
-from typing import List, Tuple, Set, Type, Iterable, Optional, TYPE_CHECKING, cast
+from collections import defaultdict
+from itertools import chain
+from operator import itemgetter
+from typing import List, Tuple, Set, Type, Iterable, Optional, TYPE_CHECKING, cast, Dict
 
 from betty.app.extension import Extension, UserFacingExtension
 from betty.load import PostLoader
@@ -31,13 +34,15 @@ class Deriver(UserFacingExtension, PostLoader):
 
     async def derive(self, ancestry: Ancestry) -> None:
         logger = logging.getLogger()
+        event_type_index = _EventTypeIndex(self.app.event_types)
+        people_events = [(person, _PersonEvents(person)) for person in ancestry.entities[Person]]
         for event_type_type in self.app.event_types:
             event_type = event_type_type()
             if isinstance(event_type, DerivableEventType):
                 created_derivations = 0
                 updated_derivations = 0
-                for person in ancestry.entities[Person]:
-                    created, updated = self.derive_person(person, event_type_type)
+                for person, person_events in people_events:
+                    created, updated = self._derive_person(person, person_events, event_type_type, event_type_index)
                     created_derivations += created
                     updated_derivations += updated
                 logger.info('Updated %d %s events based on existing information.' % (updated_derivations, event_type.label))
@@ -45,24 +50,22 @@ class Deriver(UserFacingExtension, PostLoader):
                     logger.info('Created %d additional %s events based on existing information.' % (created_derivations, event_type.label))
 
     def derive_person(self, person: Person, event_type_type: Type[DerivableEventType]) -> Tuple[int, int]:
+        return self._derive_person(person, _PersonEvents(person), event_type_type, _EventTypeIndex(self.app.event_types))
+
+    def _derive_person(self, person: Person, person_events: _PersonEvents, event_type_type: Type[DerivableEventType], event_type_index: _EventTypeIndex) -> Tuple[int, int]:
         # Gather any existing events that could be derived, or create a new derived event if needed.
-        derivable_events = list(_get_derivable_events(person, event_type_type))
+        event_type_events = person_events.get(event_type_index, (event_type_type,))
+        derivable_events = list(_get_derivable_events(event_type_events))
         if not derivable_events:
-            if list(filter(lambda x: isinstance(x.event.type, event_type_type), person.presences)):
+            if event_type_events:
                 return 0, 0
             if issubclass(event_type_type, CreatableDerivableEventType):
                 derivable_events = [DerivedEvent(event_type_type())]
             else:
                 return 0, 0
 
-        # Aggregate event type order from references and backreferences.
-        comes_before_event_type_types = event_type_type.comes_before()
-        comes_after_event_type_types = event_type_type.comes_after()
-        for other_event_type_type in self.app.event_types:
-            if event_type_type in other_event_type_type.comes_before():
-                comes_after_event_type_types.add(other_event_type_type)
-            if event_type_type in other_event_type_type.comes_after():
-                comes_before_event_type_types.add(other_event_type_type)
+        comes_before_event_type_types = event_type_index.comes_before(event_type_type)
+        comes_after_event_type_types = event_type_index.comes_after(event_type_type)
 
         created_derivations = 0
         updated_derivations = 0
@@ -74,15 +77,22 @@ class Deriver(UserFacingExtension, PostLoader):
             derivable_date = cast(Optional[DateRange], derivable_event.date)
 
             if derivable_date is None or derivable_date.end is None:
-                dates_derived = dates_derived or _ComesBeforeDateDeriver.derive(person, derivable_event, comes_before_event_type_types)
+                dates_derived = dates_derived or _ComesBeforeDateDeriver.derive(
+                    derivable_event,
+                    _get_reference_events(person_events.get(event_type_index, comes_before_event_type_types)),
+                )
 
             if derivable_date is None or derivable_date.start is None:
-                dates_derived = dates_derived or _ComesAfterDateDeriver.derive(person, derivable_event, comes_after_event_type_types)
+                dates_derived = dates_derived or _ComesAfterDateDeriver.derive(
+                    derivable_event,
+                    _get_reference_events(person_events.get(event_type_index, comes_after_event_type_types)),
+                )
 
             if dates_derived:
                 if isinstance(derivable_event, DerivedEvent):
                     created_derivations += 1
                     Presence(person, Subject(), derivable_event)
+                    person_events.add(derivable_event)
                 else:
                     updated_derivations += 1
 
@@ -103,11 +113,7 @@ class Deriver(UserFacingExtension, PostLoader):
 
 class _DateDeriver:
     @classmethod
-    def derive(cls, person: Person, derivable_event: Event, reference_event_type_types: Set[Type[EventType]]) -> bool:
-        if not reference_event_type_types:
-            return False
-
-        reference_events = _get_reference_events(person, reference_event_type_types)
+    def derive(cls, derivable_event: Event, reference_events: Iterable[Event]) -> bool:
         reference_events_dates: Iterable[Tuple[Event, Date]] = filter(
             lambda x: x[1].comparable,
             cls._get_events_dates(reference_events)
@@ -197,18 +203,99 @@ class _ComesAfterDateDeriver(_DateDeriver):
         derivable_date.start_is_boundary = True
 
 
-def _get_derivable_events(person: Person, derivable_event_type_type: Type[EventType]) -> Iterable[Event]:
-    for presence in person.presences:
-        event = presence.event
-
+class _EventTypeIndex:
+    """
+    Index how event types relate to each other.
+
+    Event types declare which other event types they come before or after, and the index combines those declarations
+    with the reverse declarations of all other known event types.
+    """
+
+    def __init__(self, event_type_types: Iterable[Type[EventType]]):
+        self._comes_before_by_reference: Dict[Type[EventType], Set[Type[EventType]]] = defaultdict(set)
+        self._comes_after_by_reference: Dict[Type[EventType], Set[Type[EventType]]] = defaultdict(set)
+        for event_type_type in event_type_types:
+            for other_event_type_type in event_type_type.comes_before():
+                self._comes_before_by_reference[other_event_type_type].add(event_type_type)
+            for other_event_type_type in event_type_type.comes_after():
+                self._comes_after_by_reference[other_event_type_type].add(event_type_type)
+        self._comes_before: Dict[Type[EventType], Tuple[Type[EventType], ...]] = {}
+        self._comes_after: Dict[Type[EventType], Tuple[Type[EventType], ...]] = {}
+        self._is_any: Dict[Tuple[Type[EventType], Tuple[Type[EventType], ...]], bool] = {}
+
+    def comes_before(self, event_type_type: Type[EventType]) -> Tuple[Type[EventType], ...]:
+        """
+        Get the event types an event type comes before.
+        """
+        try:
+            return self._comes_before[event_type_type]
+        except KeyError:
+            comes_before = self._comes_before[event_type_type] = tuple(
+                event_type_type.comes_before() | self._comes_after_by_reference[event_type_type]
+            )
+            return comes_before
+
+    def comes_after(self, event_type_type: Type[EventType]) -> Tuple[Type[EventType], ...]:
+        """
+        Get the event types an event type comes after.
+        """
+        try:
+            return self._comes_after[event_type_type]
+        except KeyError:
+            comes_after = self._comes_after[event_type_type] = tuple(
+                event_type_type.comes_after() | self._comes_before_by_reference[event_type_type]
+            )
+            return comes_after
+
+    def is_any(self, event_type_type: Type[EventType], other_event_type_types: Tuple[Type[EventType], ...]) -> bool:
+        """
+        Check if an event type is (a subclass of) any of the other event types.
+        """
+        try:
+            return self._is_any[event_type_type, other_event_type_types]
+        except KeyError:
+            is_any = self._is_any[event_type_type, other_event_type_types] = issubclass(event_type_type, other_event_type_types)
+            return is_any
+
+
+class _PersonEvents:
+    """
+    Bucket the events a person is present at by event type.
+    """
+
+    def __init__(self, person: Person):
+        # Each event is stored with its position among the person's presences, so events from different buckets can
+        # be returned in their original order.
+        self._events: Dict[Type[EventType], List[Tuple[int, Event]]] = defaultdict(list)
+        self._count = 0
+        for presence in person.presences:
+            self.add(presence.event)
+
+    def add(self, event: Event) -> None:
+        self._events[type(event.type)].append((self._count, event))
+        self._count += 1
+
+    def get(self, event_type_index: _EventTypeIndex, event_type_types: Tuple[Type[EventType], ...]) -> List[Event]:
+        """
+        Get the events that are of any of the given event types, in the order of the person's presences.
+        """
+        buckets = [
+            events
+            for event_type_type, events
+            in self._events.items()
+            if event_type_index.is_any(event_type_type, event_type_types)
+        ]
+        if len(buckets) == 1:
+            return [event for __, event in buckets[0]]
+        return [event for __, event in sorted(chain.from_iterable(buckets), key=itemgetter(0))]
+
+
+def _get_derivable_events(events: Iterable[Event]) -> Iterable[Event]:
+    for event in events:
         # Ignore events that have been derived already.
         if isinstance(event, DerivedEvent):
             continue
 
-        # Ignore events of the wrong type.
-        if not isinstance(event.type, derivable_event_type_type):
-            continue
-
         # Ignore events with enough date information that nothing more can be derived.
         if isinstance(event.date, Date):
             continue
@@ -218,16 +305,12 @@ def _get_derivable_events(person: Person, derivable_event_type_type: Type[EventT
         yield event
 
 
-def _get_reference_events(person: Person, reference_event_type_types: Set[Type[EventType]]) -> Iterable[Event]:
-    for reference_event in (presence.event for presence in person.presences):
+def _get_reference_events(events: Iterable[Event]) -> Iterable[Event]:
+    for reference_event in events:
         # We cannot reliably determine dates based on reference events with calculated date ranges, as those events
         # would start or end *sometime* during the date range, but to derive dates we need reference events' exact
         # start and end dates.
         if isinstance(reference_event, DerivedEvent):
             continue
 
-        # Ignore reference events of the wrong type.
-        if not isinstance(reference_event.type, tuple(reference_event_type_types)):
-            continue
-
         yield reference_event
@@ -1,22 +1,53 @@
-from typing import Any, Iterable, Sized
+from typing import Any, Iterable, Sized, Optional, Iterator, List, Dict
 
 
-def walk(item: Any, attribute_name: str) -> Iterable[Any]:
+def walk(item: Any, attribute_name: str, max_depth: Optional[int] = None) -> Iterable[Any]:
+    """
+    Walk a graph, such as a family tree, depth-first.
+
+    Each descendant is yielded once only, even if it can be reached through multiple paths, or through cycles. The walk
+    uses an explicit stack rather than recursion, so graphs of any depth can be walked. The walk is lazy, so consumers
+    can stop it early.
+
+    :param max_depth: The maximum depth to walk to, where the item's own children are at depth 1, or None to walk the
+        entire graph.
+    """
+    if max_depth is not None and max_depth < 1:
+        return
+    # Descendants are tracked by identity, because they may not be hashable. They are tracked with the depth they were
+    # reached at, so that when the depth is limited, descendants that are reached again through a shorter path are
+    # walked further.
+    depths: Dict[int, int] = {id(item): 0}
+    stack: List[Iterator[Any]] = [_walk_children(item, attribute_name)]
+    while stack:
+        depth = len(stack)
+        for child in stack[-1]:
+            if id(child) in depths:
+                if max_depth is None or depths[id(child)] <= depth:
+                    continue
+            else:
+                yield child
+            depths[id(child)] = depth
+            if max_depth is None or depth < max_depth:
+                stack.append(_walk_children(child, attribute_name))
+                break
+        else:
+            stack.pop()
+
+
+def _walk_children(item: Any, attribute_name: str) -> Iterator[Any]:
     child = getattr(item, attribute_name)
 
     # If the child has the requested attribute, yield it,
     if hasattr(child, attribute_name):
         yield child
-        yield from walk(child, attribute_name)
 
     # Otherwise loop over the children and yield their attributes.
     try:
-        child = iter(child)
+        children = iter(child)
     except TypeError:
         return
-    for child in child:
-        yield child
-        yield from walk(child, attribute_name)
+    yield from children
 
 
 def slice_to_range(indices: slice, iterable: Sized) -> Iterable[int]:
@@ -1,10 +1,20 @@
+from __future__ import annotations
+
 import asyncio
+import hashlib
 import json
 import logging
+import multiprocessing
 import os
+import re
 import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import suppress, contextmanager
+from enum import Enum
 from pathlib import Path
-from typing import TYPE_CHECKING, cast, AsyncContextManager, List, Type
+from typing import TYPE_CHECKING, cast, AsyncContextManager, List, Type, Dict, Optional, Any, Iterable, Awaitable, AsyncIterator, Set, \
+    Tuple, Callable, Iterator
 
 import aiofiles
 import math
@@ -12,11 +22,17 @@ from aiofiles import os as aiofiles_os
 from aiofiles.threadpool.text import AsyncTextIOWrapper
 from babel import Locale
 
+from betty import about, fs, load
 from betty.app import App
+from betty.app.extension import Extension
+from betty.config.load import Loader
 from betty.json import JSONEncoder
 from betty.locale import bcp_47_to_rfc_1766
-from betty.model import get_entity_type_name, UserFacingEntity, get_entity_type
+from betty.model import get_entity_type_name, UserFacingEntity, get_entity_type, Entity, EntityCollection, \
+    EntityTypeError, _EntityTypeAssociationRegistry, _DERIVED_VALUES_ATTR_NAME, _record_reads
+from betty.model.ancestry import File
 from betty.openapi import build_specification
+from betty.os import ChDir
 from betty.string import camel_case_to_kebab_case
 
 if TYPE_CHECKING:
@@ -39,33 +55,579 @@ class Generator:
         raise NotImplementedError
 
 
-async def generate(app: App) -> None:
-    shutil.rmtree(app.project.configuration.output_directory_path, ignore_errors=True)
-    await aiofiles_os.makedirs(app.project.configuration.output_directory_path)
-    await asyncio.gather(
-        _generate(app),
-        app.dispatcher.dispatch(Generator)(),
-    )
-    os.chmod(app.project.configuration.output_directory_path, 0o755)
-    for directory_path_str, subdirectory_names, file_names in os.walk(app.project.configuration.output_directory_path):
-        directory_path = Path(directory_path_str)
-        for subdirectory_name in subdirectory_names:
-            os.chmod(directory_path / subdirectory_name, 0o755)
-        for file_name in file_names:
-            os.chmod(directory_path / file_name, 0o644)
-    app.wait()
+async def generate(app: App, incremental: bool = False, processes: int = 1, profile: bool = False) -> None:
+    """
+    Generate a static site.
 
+    In incremental mode, the entities each entity page reads while it is rendered are recorded in a build manifest. The
+    manifest from the previous incremental run is used to only regenerate the pages for which any of these entities
+    changed, and to remove the pages and files of entities that no longer exist. If the configuration or any of the
+    assets changed, or if there is no (valid) previous build manifest, the site is regenerated in full.
 
-async def _generate(app: App) -> None:
-    logger = getLogger()
-    await app.assets.copytree(Path('public') / 'static', app.project.configuration.www_directory_path)
-    await app.renderer.render_tree(app.project.configuration.www_directory_path)
-    entity_types = [
+    If more than one process is requested, entity pages are rendered by a pool of worker processes, each of which
+    builds its own application from the project configuration and loads the ancestry itself.
+
+    If profiling is enabled, the time spent and the output produced are recorded per stage, locale, entity type, media
+    type, template, and generator, and written to a report in the output directory. Output is counted as pages are
+    written, so it does not include static assets or the files written by generators. Generators still run concurrently
+    with page generation, so their measurements overlap.
+    """
+    output_directory_path = app.project.configuration.output_directory_path
+    generation_profile = _Profile(profile)
+    manifest = None
+    previous_manifest = None
+    if incremental:
+        with generation_profile.measure(('stages', 'manifest')):
+            manifest = _Manifest.build(app)
+            previous_manifest = _Manifest.read(output_directory_path)
+    if manifest is None or previous_manifest is None or not previous_manifest.is_compatible(manifest):
+        previous_manifest = None
+        shutil.rmtree(output_directory_path, ignore_errors=True)
+        await aiofiles_os.makedirs(output_directory_path)
+    else:
+        _remove_entities(app, previous_manifest.removed(app))
+    generation = _Generation(app, manifest, previous_manifest, generation_profile)
+    if generation_profile.enabled:
+        await asyncio.gather(
+            _generate(generation, processes),
+            _generate_with_generators(generation),
+        )
+    else:
+        await asyncio.gather(
+            _generate(generation, processes),
+            app.dispatcher.dispatch(Generator)(),
+        )
+    if manifest is not None:
+        with generation_profile.measure(('stages', 'manifest')):
+            generation.update_manifest()
+            manifest.write(output_directory_path)
+    with generation_profile.measure(('stages', 'permissions')):
+        os.chmod(app.project.configuration.output_directory_path, 0o755)
+        for directory_path_str, subdirectory_names, file_names in os.walk(app.project.configuration.output_directory_path):
+            directory_path = Path(directory_path_str)
+            for subdirectory_name in subdirectory_names:
+                os.chmod(directory_path / subdirectory_name, 0o755)
+            for file_name in file_names:
+                os.chmod(directory_path / file_name, 0o644)
+    with generation_profile.measure(('stages', 'background tasks')):
+        app.wait()
+    if generation_profile.enabled:
+        generation_profile_file_path = output_directory_path / 'generate-profile.json'
+        generation_profile.write(generation_profile_file_path)
+        getLogger().info(_('Generation profile, also written to {file_path}:').format(file_path=str(generation_profile_file_path)) + '\n' + generation_profile.summarize())
+
+
+async def _generate_with_generators(generation: _Generation) -> None:
+    """
+    Run the generators like the extension dispatcher does, but measure each of them.
+    """
+    with generation.profile.measure(('stages', 'generators')):
+        for extension_batch in generation.app.extensions:
+            await asyncio.gather(*[
+                _generate_with_generator(generation, extension)
+                for extension in extension_batch
+                if isinstance(extension, Generator)
+            ])
+
+
+async def _generate_with_generator(generation: _Generation, extension: Extension) -> None:
+    with generation.profile.measure(('generators', extension.name())):
+        await cast(Generator, extension).generate()
+
+
+class _Measurement:
+    def __init__(self, enabled: bool):
+        self._enabled = enabled
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+        self.bytes = 0
+        self.count = 0
+
+    def add(self, other: _Measurement) -> None:
+        self.wall_time += other.wall_time
+        self.cpu_time += other.cpu_time
+        self.bytes += other.bytes
+        self.count += other.count
+
+    def bytes_from_output(self, output: str) -> None:
+        """
+        Count the bytes of output that is written.
+        """
+        if self._enabled:
+            self.bytes += len(output.encode('utf-8'))
+
+    def dump(self) -> Dict[str, Any]:
+        return {
+            'wall_time': self.wall_time,
+            'cpu_time': self.cpu_time,
+            'bytes': self.bytes,
+            'count': self.count,
+        }
+
+
+class _Profile:
+    """
+    Record the time spent and the output produced while generating a site.
+
+    Measurements are grouped by section, and then by a key within that section, such as a template name. Page
+    measurements cover rendering, and use the CPU time of the rendering thread, in whichever process rendered the
+    page. Stage, locale, and generator measurements use the CPU time of the main process, including any background
+    threads.
+    """
+
+    _SECTIONS = ('stages', 'locales', 'entity_types', 'media_types', 'templates', 'generators')
+
+    def __init__(self, enabled: bool = True):
+        self._enabled = enabled
+        self._measurements: Dict[str, Dict[str, _Measurement]] = {section: {} for section in self._SECTIONS}
+
+    @property
+    def enabled(self) -> bool:
+        return self._enabled
+
+    @contextmanager
+    def measure(self, *keys: Tuple[str, str], cpu_clock: Callable[[], float] = time.process_time) -> Iterator[_Measurement]:
+        """
+        Measure a single unit of work, and record it for each of the given (section, key) pairs.
+        """
+        measurement = _Measurement(self._enabled)
+        if not self._enabled:
+            yield measurement
+            return
+        wall_time_start = time.perf_counter()
+        cpu_time_start = cpu_clock()
+        yield measurement
+        measurement.wall_time = time.perf_counter() - wall_time_start
+        measurement.cpu_time = cpu_clock() - cpu_time_start
+        measurement.count = 1
+        self._record(keys, measurement)
+
+    def _record(self, keys: Iterable[Tuple[str, str]], measurement: _Measurement) -> None:
+        for section, key in keys:
+            self._measurements[section].setdefault(key, _Measurement(True)).add(measurement)
+
+    @property
+    def measurements(self) -> Dict[str, Dict[str, _Measurement]]:
+        return self._measurements
+
+    def add(self, measurements: Dict[str, Dict[str, _Measurement]]) -> None:
+        """
+        Add measurements recorded by another profile, such as one in a worker process.
+        """
+        for section, section_measurements in measurements.items():
+            for key, measurement in section_measurements.items():
+                self._record([(section, key)], measurement)
+
+    @property
+    def page_bytes(self) -> int:
+        return sum(measurement.bytes for measurement in self._measurements['media_types'].values())
+
+    def dump(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        return {
+            section: {
+                key: measurement.dump()
+                for key, measurement
+                in sorted(measurements.items(), key=lambda item: item[1].wall_time, reverse=True)
+            }
+            for section, measurements
+            in self._measurements.items()
+        }
+
+    def write(self, file_path: Path) -> None:
+        with open(file_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'betty': about.version(),
+                'measurements': self.dump(),
+            }, f, indent=4)
+
+    def summarize(self) -> str:
+        rows = [('', 'wall (s)', 'CPU (s)', 'bytes', 'count')]
+        for section, measurements in self.dump().items():
+            for key, measurement in measurements.items():
+                rows.append((
+                    f'{section}: {key}',
+                    f'{measurement["wall_time"]:.3f}',
+                    f'{measurement["cpu_time"]:.3f}',
+                    str(measurement['bytes']),
+                    str(measurement['count']),
+                ))
+        widths = [max(len(row[column]) for row in rows) for column in range(len(rows[0]))]
+        return '\n'.join(
+            '  '.join([row[0].ljust(widths[0]), *[cell.rjust(width) for cell, width in zip(row[1:], widths[1:])]])
+            for row in rows
+        )
+
+
+class _Generation:
+    """
+    Hold the state of a single site generation.
+    """
+
+    def __init__(self, app: App, manifest: Optional[_Manifest], previous_manifest: Optional[_Manifest], profile: _Profile):
+        self.app = app
+        self.manifest = manifest
+        self.previous_manifest = previous_manifest
+        self.profile = profile
+        self.render_pool: Optional[_EntityRenderPool] = None
+        self._fingerprinter = _EntityFingerprinter()
+        self._entity_index = _EntityIndex(app)
+        self._stale_entities: Dict[Type[UserFacingEntity], List[UserFacingEntity]] = {}
+        self._dependencies: Dict[str, Dict[str, Set[str]]] = {}
+
+    def get_stale_entities(self, entity_type: Type[UserFacingEntity]) -> List[UserFacingEntity]:
+        """
+        Get the entities of the given type whose pages must be generated.
+
+        The manifest entries of all other entities are carried over from the previous manifest.
+        """
+        with suppress(KeyError):
+            return self._stale_entities[entity_type]
+        entities = self.app.project.ancestry.entities[entity_type]
+        if self.manifest is None or self.previous_manifest is None:
+            stale_entities = list(entities)
+        else:
+            stale_entities = []
+            for entity in entities:
+                if self.previous_manifest.is_stale(entity, self._entity_index, self._fingerprinter):
+                    stale_entities.append(entity)
+                else:
+                    self.manifest.carry_over(entity, self.previous_manifest)
+        self._stale_entities[entity_type] = stale_entities
+        return stale_entities
+
+    def get_dependencies(self, entity_type: Type[UserFacingEntity]) -> Optional[Dict[str, Set[str]]]:
+        """
+        Get the keys of the entities read by the pages of the given entity type, keyed by entity ID.
+
+        These are only recorded if there is a manifest to record them in.
+        """
+        if self.manifest is None:
+            return None
+        return self._dependencies.setdefault(get_entity_type_name(entity_type), {})
+
+    def update_manifest(self) -> None:
+        """
+        Add the entity pages generated by this generation to the manifest.
+        """
+        if self.manifest is None:
+            return
+        for entity_type_name, entity_type_dependencies in self._dependencies.items():
+            entities = self.app.project.ancestry.entities[entity_type_name]
+            for entity_id, dependency_keys in entity_type_dependencies.items():
+                dependencies = self._entity_index.get_all(dependency_keys)
+                if dependencies is not None:
+                    self.manifest.add(
+                        entity_type_name,
+                        entity_id,
+                        self._fingerprinter.fingerprint(entities[entity_id], dependencies),
+                        dependency_keys,
+                    )
+
+
+def _get_entity_key(entity: Entity) -> str:
+    return f'{get_entity_type_name(entity)}:{entity.id}'
+
+
+class _EntityIndex:
+    """
+    Find entities by their keys.
+
+    Entities are looked up in the ancestry first. Not all loaders add every entity to the ancestry, so the first time an
+    entity cannot be found there, all entities that can be reached through associations are indexed as well.
+    """
+
+    def __init__(self, app: App):
+        self._app = app
+        self._associates: Optional[Dict[str, Entity]] = None
+
+    def get_all(self, entity_keys: Iterable[str]) -> Optional[List[Entity]]:
+        """
+        Get the entities with the given keys, or None if any of them do not exist.
+        """
+        try:
+            return [self._get(entity_key) for entity_key in entity_keys]
+        except KeyError:
+            return None
+
+    def _get(self, entity_key: str) -> Entity:
+        entity_type_name, __, entity_id = entity_key.partition(':')
+        with suppress(KeyError, EntityTypeError):
+            return self._app.project.ancestry.entities[entity_type_name][entity_id]
+        if self._associates is None:
+            self._associates = self._index_associates()
+        return self._associates[entity_key]
+
+    def _index_associates(self) -> Dict[str, Entity]:
+        associates = {}
+        entities = [*self._app.project.ancestry.entities]
+        seen = set(map(id, entities))
+        while entities:
+            entity = entities.pop()
+            for association_registration in _EntityTypeAssociationRegistry.get_associations(type(entity)):
+                association_value = getattr(entity, association_registration.attr_name)
+                if association_value is None:
+                    continue
+                for associate in association_value if isinstance(association_value, EntityCollection) else [association_value]:
+                    if id(associate) not in seen:
+                        seen.add(id(associate))
+                        associates[_get_entity_key(associate)] = associate
+                        entities.append(associate)
+        return associates
+
+
+@contextmanager
+def _record_dependencies(dependency_keys: Optional[Set[str]]) -> Iterator[None]:
+    """
+    Record the keys of the entities that are read, if a set to record them in is given.
+    """
+    if dependency_keys is None:
+        yield
+        return
+    with _record_reads() as dependencies:
+        yield
+    dependency_keys.update(map(_get_entity_key, dependencies.entities))
+
+
+class _EntityFingerprinter:
+    """
+    Compute content fingerprints for entities.
+
+    An entity's own fingerprint covers its own attributes and the identities of its associates. An entity's page
+    fingerprint additionally covers the own fingerprints of the entities its page read, so that a page is regenerated
+    if anything it renders changes, no matter how far the templates followed associations to get there.
+    """
+
+    def __init__(self):
+        self._own_fingerprints: Dict[int, str] = {}
+
+    def fingerprint(self, entity: Entity, dependencies: Iterable[Entity]) -> str:
+        fingerprint = hashlib.md5(self._own_fingerprint(entity).encode('utf-8'))
+        for dependency_fingerprint in sorted(set(map(self._own_fingerprint, dependencies))):
+            fingerprint.update(dependency_fingerprint.encode('utf-8'))
+        return fingerprint.hexdigest()
+
+    def _own_fingerprint(self, entity: Entity) -> str:
+        try:
+            return self._own_fingerprints[id(entity)]
+        except KeyError:
+            fingerprint = hashlib.md5(repr(self._fingerprint_value(entity, True)).encode('utf-8')).hexdigest()
+            self._own_fingerprints[id(entity)] = fingerprint
+            return fingerprint
+
+    def _fingerprint_value(self, value: Any, expand: bool = False) -> Any:
+        if isinstance(value, Entity) and not expand:
+            return f'{get_entity_type_name(value)}:{value.id}'
+        if isinstance(value, EntityCollection):
+            return [self._fingerprint_value(entity) for entity in value]
+        if value is None or isinstance(value, (str, int, float, bool, Enum)):
+            return value
+        if isinstance(value, type) or callable(value) and hasattr(value, '__qualname__'):
+            return f'{value.__module__}.{value.__qualname__}'
+        if isinstance(value, Path):
+            return str(value)
+        if isinstance(value, (list, tuple)):
+            return [self._fingerprint_value(item) for item in value]
+        if isinstance(value, (set, frozenset)):
+            return sorted(map(repr, map(self._fingerprint_value, value)))
+        if isinstance(value, dict):
+            return sorted((repr(self._fingerprint_value(key)), self._fingerprint_value(item)) for key, item in value.items())
+        with suppress(TypeError):
+            attrs = vars(value)
+            if isinstance(value, Entity):
+                # Derived property values are caches of associations, which are fingerprinted already.
+                attrs = {name: attr for name, attr in attrs.items() if name != _DERIVED_VALUES_ATTR_NAME}
+            return f'{type(value).__module__}.{type(value).__qualname__}', self._fingerprint_value(attrs)
+        # Default representations contain memory addresses, which differ between runs.
+        if type(value).__repr__ is object.__repr__:
+            return f'{type(value).__module__}.{type(value).__qualname__}'
+        return repr(value)
+
+
+class _Manifest:
+    """
+    Describe the inputs a generated site was built from.
+
+    For every entity page, the manifest holds a fingerprint, and the keys of the entities the page read when it was
+    generated. The keys are stored once, and entity pages refer to them by index.
+    """
+
+    _FILE_NAME = 'generate-manifest.json'
+
+    def __init__(self, configuration_fingerprint: str, assets_fingerprint: str, entities: Optional[Dict[str, Dict[str, Tuple[str, Iterable[str]]]]] = None):
+        self._configuration_fingerprint = configuration_fingerprint
+        self._assets_fingerprint = assets_fingerprint
+        self._entities = {} if entities is None else entities
+
+    @classmethod
+    def build(cls, app: App) -> _Manifest:
+        """
+        Build a manifest without any entity pages, which are added as they are generated.
+        """
+        configuration_fingerprint = hashlib.md5(json.dumps(
+            [about.version(), app.project.configuration.dump()],
+            sort_keys=True,
+        ).encode('utf-8')).hexdigest()
+
+        assets_fingerprint = hashlib.md5()
+        for assets_directory_path, __ in app.assets.paths:
+            for directory_path_str, subdirectory_names, file_names in os.walk(assets_directory_path):
+                subdirectory_names.sort()
+                for file_name in sorted(file_names):
+                    file_path = Path(directory_path_str) / file_name
+                    file_stat = file_path.stat()
+                    assets_fingerprint.update(f'{file_path}:{file_stat.st_size}:{file_stat.st_mtime_ns}'.encode('utf-8'))
+
+        return cls(configuration_fingerprint, assets_fingerprint.hexdigest())
+
+    @classmethod
+    def read(cls, output_directory_path: Path) -> Optional[_Manifest]:
+        try:
+            with open(output_directory_path / cls._FILE_NAME, encoding='utf-8') as f:
+                dumped_manifest = json.load(f)
+            dependency_keys = dumped_manifest['dependencies']
+            return cls(
+                dumped_manifest['configuration'],
+                dumped_manifest['assets'],
+                {
+                    entity_type_name: {
+                        entity_id: (fingerprint, [dependency_keys[dependency_index] for dependency_index in dependency_indices])
+                        for entity_id, (fingerprint, dependency_indices) in entities.items()
+                    }
+                    for entity_type_name, entities in dumped_manifest['entities'].items()
+                },
+            )
+        except (OSError, ValueError, LookupError, TypeError):
+            return None
+
+    def write(self, output_directory_path: Path) -> None:
+        dependency_indices: Dict[str, int] = {}
+        dumped_entities = {
+            entity_type_name: {
+                entity_id: [
+                    fingerprint,
+                    [dependency_indices.setdefault(dependency_key, len(dependency_indices)) for dependency_key in dependency_keys],
+                ]
+                for entity_id, (fingerprint, dependency_keys) in entities.items()
+            }
+            for entity_type_name, entities in self._entities.items()
+        }
+        with open(output_directory_path / self._FILE_NAME, 'w', encoding='utf-8') as f:
+            json.dump({
+                'configuration': self._configuration_fingerprint,
+                'assets': self._assets_fingerprint,
+                'entities': dumped_entities,
+                'dependencies': list(dependency_indices),
+            }, f)
+
+    def add(self, entity_type_name: str, entity_id: str, fingerprint: str, dependency_keys: Iterable[str]) -> None:
+        self._entities.setdefault(entity_type_name, {})[entity_id] = fingerprint, dependency_keys
+
+    def carry_over(self, entity: Entity, other: _Manifest) -> None:
+        """
+        Copy an entity page's entry from the other manifest.
+        """
+        entity_type_name = get_entity_type_name(entity)
+        self._entities.setdefault(entity_type_name, {})[entity.id] = other._entities[entity_type_name][entity.id]
+
+    def is_compatible(self, other: _Manifest) -> bool:
+        """
+        Check if a site built from this manifest can be updated incrementally to the other manifest.
+        """
+        return self._configuration_fingerprint == other._configuration_fingerprint and self._assets_fingerprint == other._assets_fingerprint
+
+    def is_stale(self, entity: Entity, entity_index: _EntityIndex, fingerprinter: _EntityFingerprinter) -> bool:
+        """
+        Check if an entity's pages built from this manifest are out of date.
+
+        Pages are out of date if the entity or any of the entities they read changed, or no longer exist.
+        """
+        try:
+            fingerprint, dependency_keys = self._entities[get_entity_type_name(entity)][entity.id]
+        except KeyError:
+            return True
+        dependencies = entity_index.get_all(dependency_keys)
+        return dependencies is None or fingerprint != fingerprinter.fingerprint(entity, dependencies)
+
+    def removed(self, app: App) -> Dict[str, List[str]]:
+        """
+        Get the IDs of the entities in this manifest that no longer exist in the ancestry, keyed by entity type name.
+        """
+        removed_entity_ids = {}
+        for entity_type_name, entities in self._entities.items():
+            try:
+                entity_ids = {entity.id for entity in app.project.ancestry.entities[entity_type_name]}
+            except EntityTypeError:
+                entity_ids = set()
+            removed_entity_ids[entity_type_name] = [
+                entity_id
+                for entity_id
+                in entities
+                if entity_id not in entity_ids
+            ]
+        return removed_entity_ids
+
+
+def _get_user_facing_entity_types(app: App) -> List[Type[UserFacingEntity]]:
+    return [
         entity_type
         for entity_type
         in app.entity_types
         if issubclass(entity_type, UserFacingEntity)
     ]
+
+
+def _get_www_directory_paths(app: App) -> List[Path]:
+    if app.project.configuration.multilingual:
+        return [
+            app.project.configuration.www_directory_path / locale_configuration.alias
+            for locale_configuration in app.project.configuration.locales
+        ]
+    return [app.project.configuration.www_directory_path]
+
+
+# The names of the images resized by the image filter, after the file ID.
+_RESIZED_IMAGE_FILE_NAME_SUFFIX_PATTERN = r'-(-x\d+|\d+x-|\d+x\d+)(\.[^.]+)?'
+
+
+def _remove_entities(app: App, removed_entity_ids: Dict[str, List[str]]) -> None:
+    # Entity files, such as copied files and resized images, are not localized.
+    www_directory_paths = {app.project.configuration.www_directory_path, *_get_www_directory_paths(app)}
+    for entity_type_name, entity_ids in removed_entity_ids.items():
+        entity_type_name_fs = camel_case_to_kebab_case(entity_type_name)
+        for entity_id in entity_ids:
+            for www_directory_path in www_directory_paths:
+                shutil.rmtree(www_directory_path / entity_type_name_fs / entity_id, ignore_errors=True)
+    _remove_resized_images(app, removed_entity_ids.get(get_entity_type_name(File), []))
+
+
+def _remove_resized_images(app: App, file_ids: List[str]) -> None:
+    if not file_ids:
+        return
+    resized_image_file_name_pattern = re.compile(
+        f'({"|".join(map(re.escape, file_ids))}){_RESIZED_IMAGE_FILE_NAME_SUFFIX_PATTERN}'
+    )
+    with suppress(FileNotFoundError):
+        for resized_image_file_path in (app.project.configuration.www_directory_path / 'file').iterdir():
+            if resized_image_file_name_pattern.fullmatch(resized_image_file_path.name):
+                resized_image_file_path.unlink()
+
+
+async def _generate(generation: _Generation, processes: int) -> None:
+    if processes > 1:
+        with _EntityRenderPool(generation, processes) as render_pool:
+            generation.render_pool = render_pool
+            await _generate_localized(generation)
+    else:
+        await _generate_localized(generation)
+
+
+async def _generate_localized(generation: _Generation) -> None:
+    app = generation.app
+    logger = getLogger()
+    with generation.profile.measure(('stages', 'static assets')):
+        await app.assets.copytree(Path('public') / 'static', app.project.configuration.www_directory_path)
+        await app.renderer.render_tree(app.project.configuration.www_directory_path)
+    entity_types = _get_user_facing_entity_types(app)
     for locale_configuration in app.project.configuration.locales:
         locale = locale_configuration.locale
         with app.acquire_locale(locale):
@@ -74,35 +636,68 @@ async def _generate(app: App) -> None:
             else:
                 www_directory_path = app.project.configuration.www_directory_path
 
-            await app.assets.copytree(Path('public') / 'localized', www_directory_path)
-            await app.renderer.render_tree(www_directory_path)
-
-            coroutines = [
-                *[
-                    coroutine
-                    for entity_type in entity_types
-                    async for coroutine in _generate_entity_type(
-                        www_directory_path,
-                        entity_type,
-                        app,
+            with generation.profile.measure(('locales', locale)) as locale_measurement:
+                locale_page_bytes = generation.profile.page_bytes
+                with generation.profile.measure(('stages', 'static assets')):
+                    await app.assets.copytree(Path('public') / 'localized', www_directory_path)
+                    await app.renderer.render_tree(www_directory_path)
+
+                with generation.profile.measure(('stages', 'pages')):
+                    await _generate_concurrently(
+                        _generate_locale(www_directory_path, entity_types, generation),
+                        _GENERATE_CONCURRENCY,
                     )
-                ],
-                _generate_openapi(www_directory_path, app)
-            ]
-            # Batch all coroutines to reduce the risk of "too many open files" errors.
-            for i in range(0, len(coroutines), _GENERATE_CONCURRENCY):
-                await asyncio.gather(*coroutines[i:i + _GENERATE_CONCURRENCY])
+                locale_measurement.bytes = generation.profile.page_bytes - locale_page_bytes
 
         # Log the generated pages.
         locale_label = Locale.parse(bcp_47_to_rfc_1766(locale)).get_display_name(locale=bcp_47_to_rfc_1766(app.configuration.locale or 'en-US'))
         for entity_type in entity_types:
             logger.info(_('Generated pages for {count} {entity_type} in {locale}.').format(
-                count=len(app.project.ancestry.entities[entity_type]),
+                count=len(generation.get_stale_entities(entity_type)),
                 entity_type=entity_type.entity_type_label_plural(),
                 locale=locale_label,
             ))
 
 
+async def _generate_locale(
+    www_directory_path: Path,
+    entity_types: List[Type[UserFacingEntity]],
+    generation: _Generation,
+) -> AsyncIterator[Awaitable[None]]:
+    for entity_type in entity_types:
+        async for coroutine in _generate_entity_type(
+            www_directory_path,
+            entity_type,
+            generation,
+        ):
+            yield coroutine
+    yield _generate_openapi(www_directory_path, generation.app, generation.profile)
+
+
+async def _generate_concurrently(awaitables: AsyncIterator[Awaitable[None]], concurrency: int) -> None:
+    """
+    Await awaitables as they are produced, keeping at most the given number in flight.
+
+    This reduces the risk of "too many open files" errors, and keeps memory usage flat regardless of the number of
+    pages, because awaitables are only created once there is room for them.
+    """
+    in_flight: Set[asyncio.Future[None]] = set()
+    try:
+        async for awaitable in awaitables:
+            if len(in_flight) >= concurrency:
+                done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    future.result()
+            in_flight.add(asyncio.ensure_future(awaitable))
+        while in_flight:
+            done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_EXCEPTION)
+            for future in done:
+                future.result()
+    finally:
+        for future in in_flight:
+            future.cancel()
+
+
 def _create_file(path: Path) -> AsyncContextManager[AsyncTextIOWrapper]:
     path.parent.mkdir(exist_ok=True, parents=True)
     return cast(AsyncContextManager[AsyncTextIOWrapper], aiofiles.open(path, 'w', encoding='utf-8'))
@@ -116,39 +711,54 @@ def _create_json_resource(path: Path) -> AsyncContextManager[AsyncTextIOWrapper]
     return _create_file(path / 'index.json')
 
 
-async def _generate_entity_type(www_directory_path: Path, entity_type: Type[UserFacingEntity], app: App):
+async def _generate_entity_type(
+    www_directory_path: Path,
+    entity_type: Type[UserFacingEntity],
+    generation: _Generation,
+):
+    app = generation.app
     if entity_type in app.project.configuration.entity_types and app.project.configuration.entity_types[entity_type].generate_html_list:
         yield _generate_entity_type_list_html(
             www_directory_path,
             entity_type,
             app,
+            generation.profile,
         )
     yield _generate_entity_type_list_json(
         www_directory_path,
         entity_type,
         app,
+        generation.profile,
     )
-    for entity in app.project.ancestry.entities[entity_type]:
-        async for coroutine in _generate_entity(
-            www_directory_path,
-            entity,
-            app,
-        ):
+    entities = generation.get_stale_entities(entity_type)
+    if generation.render_pool is None:
+        async for coroutine in _generate_entities(www_directory_path, entities, app, generation.profile, generation.get_dependencies(entity_type)):
             yield coroutine
+    else:
+        for awaitable in generation.render_pool.render(www_directory_path, entity_type, entities, app.locale):
+            yield awaitable
 
 
-async def _generate_entity_type_list_html(www_directory_path: Path, entity_type: Type[UserFacingEntity], app: App) -> None:
-    entity_type_name_fs = camel_case_to_kebab_case(get_entity_type_name(entity_type))
+async def _generate_entity_type_list_html(www_directory_path: Path, entity_type: Type[UserFacingEntity], app: App, profile: _Profile) -> None:
+    entity_type_name = get_entity_type_name(entity_type)
+    entity_type_name_fs = camel_case_to_kebab_case(entity_type_name)
     entity_type_path = www_directory_path / entity_type_name_fs
     template = app.jinja2_environment.negotiate_template([
         f'entity/page-list--{entity_type_name_fs}.html.j2',
         'entity/page-list.html.j2',
     ])
-    rendered_html = template.render({
-        'page_resource': f'/{entity_type_name_fs}/index.html',
-        'entity_type': entity_type,
-        'entities': app.project.ancestry.entities[entity_type],
-    })
+    with profile.measure(
+        ('entity_types', entity_type_name),
+        ('media_types', 'text/html'),
+        ('templates', str(template.name)),
+        cpu_clock=time.thread_time,
+    ) as measurement:
+        rendered_html = template.render({
+            'page_resource': f'/{entity_type_name_fs}/index.html',
+            'entity_type': entity_type,
+            'entities': app.project.ancestry.entities[entity_type],
+        })
+        measurement.bytes_from_output(rendered_html)
     async with _create_html_resource(entity_type_path) as f:
         await f.write(rendered_html)
     locale_label = Locale.parse(bcp_47_to_rfc_1766(app.locale)).get_display_name(locale=bcp_47_to_rfc_1766(app.configuration.locale or 'en-US'))
@@ -158,57 +768,262 @@ async def _generate_entity_type_list_html(www_directory_path: Path, entity_type:
     ))
 
 
-async def _generate_entity_type_list_json(www_directory_path: Path, entity_type: Type[UserFacingEntity], app: App) -> None:
+async def _generate_entity_type_list_json(www_directory_path: Path, entity_type: Type[UserFacingEntity], app: App, profile: _Profile) -> None:
     entity_type_name = get_entity_type_name(entity_type)
     entity_type_name_fs = camel_case_to_kebab_case(get_entity_type_name(entity_type))
     entity_type_path = www_directory_path / entity_type_name_fs
-    data = {
-        '$schema': app.static_url_generator.generate('schema.json#/definitions/%sCollection' % entity_type_name, absolute=True),
-        'collection': []
-    }
-    for entity in app.project.ancestry.entities[entity_type]:
-        cast(List[str], data['collection']).append(
-            app.url_generator.generate(
-                entity,
-                'application/json',
-                absolute=True,
-            ))
-    rendered_json = json.dumps(data)
+    with profile.measure(
+        ('entity_types', entity_type_name),
+        ('media_types', 'application/json'),
+        cpu_clock=time.thread_time,
+    ) as measurement:
+        data = {
+            '$schema': app.static_url_generator.generate('schema.json#/definitions/%sCollection' % entity_type_name, absolute=True),
+            'collection': []
+        }
+        for entity in app.project.ancestry.entities[entity_type]:
+            cast(List[str], data['collection']).append(
+                app.url_generator.generate(
+                    entity,
+                    'application/json',
+                    absolute=True,
+                ))
+        rendered_json = json.dumps(data)
+        measurement.bytes_from_output(rendered_json)
     async with _create_json_resource(entity_type_path) as f:
         await f.write(rendered_json)
 
 
-async def _generate_entity(www_directory_path: Path, entity: UserFacingEntity, app: App):
-    yield _generate_entity_html(www_directory_path, entity, app)
-    yield _generate_entity_json(www_directory_path, entity, app)
+async def _generate_entities(
+    www_directory_path: Path,
+    entities: Iterable[UserFacingEntity],
+    app: App,
+    profile: _Profile,
+    dependencies: Optional[Dict[str, Set[str]]] = None,
+) -> AsyncIterator[Awaitable[None]]:
+    """
+    Generate entity pages, and record the keys of the entities they read per entity ID, if dependencies are given.
+    """
+    for entity in entities:
+        async for coroutine in _generate_entity(
+            www_directory_path,
+            entity,
+            app,
+            profile,
+            None if dependencies is None else dependencies.setdefault(entity.id, set()),
+        ):
+            yield coroutine
+
+
+async def _generate_entity(www_directory_path: Path, entity: UserFacingEntity, app: App, profile: _Profile, dependency_keys: Optional[Set[str]] = None):
+    yield _generate_entity_html(www_directory_path, entity, app, profile, dependency_keys)
+    yield _generate_entity_json(www_directory_path, entity, app, profile, dependency_keys)
 
 
-async def _generate_entity_html(www_directory_path: Path, entity: UserFacingEntity, app: App) -> None:
-    entity_type_name_fs = camel_case_to_kebab_case(get_entity_type_name(entity))
-    entity_path = www_directory_path / entity_type_name_fs / entity.id
-    rendered_html = app.jinja2_environment.negotiate_template([
-        f'entity/page--{entity_type_name_fs}.html.j2',
-        'entity/page.html.j2',
-    ]).render({
-        'page_resource': entity,
-        'entity_type': get_entity_type(entity),
-        'entity': entity,
-    })
+async def _generate_entity_html(www_directory_path: Path, entity: UserFacingEntity, app: App, profile: _Profile, dependency_keys: Optional[Set[str]] = None) -> None:
+    entity_path = www_directory_path / camel_case_to_kebab_case(get_entity_type_name(entity)) / entity.id
+    with _record_dependencies(dependency_keys):
+        rendered_html = _render_entity_html(entity, app, profile)
     async with _create_html_resource(entity_path) as f:
         await f.write(rendered_html)
 
 
-async def _generate_entity_json(www_directory_path: Path, entity: UserFacingEntity, app: App) -> None:
-    entity_type_name_fs = camel_case_to_kebab_case(get_entity_type_name(entity))
-    entity_path = www_directory_path / entity_type_name_fs / entity.id
-    rendered_json = json.dumps(entity, cls=JSONEncoder.get_factory(app))
+async def _generate_entity_json(www_directory_path: Path, entity: UserFacingEntity, app: App, profile: _Profile, dependency_keys: Optional[Set[str]] = None) -> None:
+    entity_path = www_directory_path / camel_case_to_kebab_case(get_entity_type_name(entity)) / entity.id
+    with _record_dependencies(dependency_keys):
+        rendered_json = _render_entity_json(entity, app, profile)
     async with _create_json_resource(entity_path) as f:
         await f.write(rendered_json)
 
 
-async def _generate_openapi(www_directory_path: Path, app: App) -> None:
+def _render_entity_html(entity: UserFacingEntity, app: App, profile: _Profile) -> str:
+    entity_type_name = get_entity_type_name(entity)
+    entity_type_name_fs = camel_case_to_kebab_case(entity_type_name)
+    template = app.jinja2_environment.negotiate_template([
+        f'entity/page--{entity_type_name_fs}.html.j2',
+        'entity/page.html.j2',
+    ])
+    with profile.measure(
+        ('entity_types', entity_type_name),
+        ('media_types', 'text/html'),
+        ('templates', str(template.name)),
+        cpu_clock=time.thread_time,
+    ) as measurement:
+        rendered_html = template.render({
+            'page_resource': entity,
+            'entity_type': get_entity_type(entity),
+            'entity': entity,
+        })
+        measurement.bytes_from_output(rendered_html)
+    return rendered_html
+
+
+def _render_entity_json(entity: UserFacingEntity, app: App, profile: _Profile) -> str:
+    with profile.measure(
+        ('entity_types', get_entity_type_name(entity)),
+        ('media_types', 'application/json'),
+        cpu_clock=time.thread_time,
+    ) as measurement:
+        rendered_json = json.dumps(entity, cls=JSONEncoder.get_factory(app))
+        measurement.bytes_from_output(rendered_json)
+    return rendered_json
+
+
+def _get_entity_ids_digest(app: App) -> str:
+    """
+    Compute a digest of the IDs of all entities in the ancestry, to tell if two processes loaded the same entities.
+    """
+    entity_ids_digest = hashlib.md5()
+    for entity_type in sorted(app.entity_types, key=get_entity_type_name):
+        entity_ids_digest.update(f'{get_entity_type_name(entity_type)}\0'.encode('utf-8'))
+        for entity in app.project.ancestry.entities[entity_type]:
+            entity_ids_digest.update(f'{entity.id}\0'.encode('utf-8'))
+    return entity_ids_digest.hexdigest()
+
+
+class _AncestryMismatchError(RuntimeError):
+    pass
+
+
+class _EntityRenderPool:
+    """
+    Render entity pages in worker processes.
+
+    Workers are spawned, and each of them builds its own application from the project configuration, and loads the
+    ancestry itself. Entities are sharded per entity type and per locale, and workers write the pages they render
+    straight to disk.
+
+    Workers only receive entity IDs, so if a worker loaded different entities than this process has, for instance
+    because the ancestry was changed after it was loaded, its shards are rendered by this process instead.
+    """
+
+    # The number of shards per process, so that workers that finish early can pick up remaining work.
+    _SHARDS_PER_PROCESS = 4
+
+    def __init__(self, generation: _Generation, processes: int):
+        app = generation.app
+        self._generation = generation
+        self._processes = processes
+        self._entity_ids_digest = _get_entity_ids_digest(app)
+        self._mismatch_logged = False
+        project_configuration_file_path = app.project.configuration.configuration_file_path
+        with ChDir(project_configuration_file_path.parent):
+            dumped_project_configuration = app.project.configuration.dump()
+        self._executor = ProcessPoolExecutor(
+            processes,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_render_worker,
+            initargs=(
+                fs.CACHE_DIRECTORY_PATH,
+                app.configuration.locale,
+                project_configuration_file_path,
+                dumped_project_configuration,
+                generation.profile.enabled,
+            ),
+        )
+
+    def __enter__(self) -> _EntityRenderPool:
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self._executor.shutdown()
+
+    def render(self, www_directory_path: Path, entity_type: Type[UserFacingEntity], entities: List[UserFacingEntity], locale: str) -> Iterable[Awaitable[None]]:
+        shard_size = max(1, math.ceil(len(entities) / (self._processes * self._SHARDS_PER_PROCESS)))
+        for i in range(0, len(entities), shard_size):
+            yield self._render_shard(www_directory_path, entity_type, entities[i:i + shard_size], locale)
+
+    async def _render_shard(self, www_directory_path: Path, entity_type: Type[UserFacingEntity], entities: List[UserFacingEntity], locale: str) -> None:
+        generation = self._generation
+        entity_type_dependencies = generation.get_dependencies(entity_type)
+        try:
+            measurements, shard_dependencies = await asyncio.wrap_future(self._executor.submit(
+                _render_entities,
+                www_directory_path,
+                entity_type,
+                [entity.id for entity in entities],
+                locale,
+                self._entity_ids_digest,
+                entity_type_dependencies is not None,
+            ))
+        except _AncestryMismatchError:
+            if not self._mismatch_logged:
+                self._mismatch_logged = True
+                getLogger().warning(_('The worker processes loaded different entities than the ones to generate pages for, so these pages are generated by the main process instead.'))
+            async for coroutine in _generate_entities(www_directory_path, entities, generation.app, generation.profile, entity_type_dependencies):
+                await coroutine
+        else:
+            generation.profile.add(measurements)
+            if entity_type_dependencies is not None and shard_dependencies is not None:
+                for entity_id, dependency_keys in shard_dependencies.items():
+                    entity_type_dependencies.setdefault(entity_id, set()).update(dependency_keys)
+
+
+class _RenderWorker:
+    def __init__(self, app: App, loop: asyncio.AbstractEventLoop, profile_enabled: bool):
+        self.app = app
+        self.loop = loop
+        self.profile_enabled = profile_enabled
+        self.entity_ids_digest = _get_entity_ids_digest(app)
+
+
+_render_worker: Optional[_RenderWorker] = None
+
+
+def _init_render_worker(
+    cache_directory_path: Path,
+    locale: Optional[str],
+    project_configuration_file_path: Path,
+    dumped_project_configuration: Any,
+    profile_enabled: bool,
+) -> None:
+    global _render_worker
+    fs.CACHE_DIRECTORY_PATH = cache_directory_path
+    app = App()
+    if locale is not None:
+        app.configuration.locale = locale
+    app.project.configuration.configuration_file_path = project_configuration_file_path
+    loader = Loader()
+    with ChDir(project_configuration_file_path.parent):
+        app.project.configuration.load(dumped_project_configuration, loader)
+    loader.commit()
+    app.acquire()
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    loop.run_until_complete(load.load(app))
+    _render_worker = _RenderWorker(app, loop, profile_enabled)
+
+
+def _render_entities(
+    www_directory_path: Path,
+    entity_type: Type[UserFacingEntity],
+    entity_ids: List[str],
+    locale: str,
+    entity_ids_digest: str,
+    record_dependencies: bool,
+) -> Tuple[Dict[str, Dict[str, _Measurement]], Optional[Dict[str, Set[str]]]]:
+    worker = cast(_RenderWorker, _render_worker)
+    if worker.entity_ids_digest != entity_ids_digest:
+        raise _AncestryMismatchError()
+    app = worker.app
+    profile = _Profile(worker.profile_enabled)
+    dependencies: Optional[Dict[str, Set[str]]] = {} if record_dependencies else None
+    entities = app.project.ancestry.entities[entity_type]
+    with app.acquire_locale(locale):
+        worker.loop.run_until_complete(_generate_concurrently(
+            _generate_entities(www_directory_path, [entities[entity_id] for entity_id in entity_ids], app, profile, dependencies),
+            _GENERATE_CONCURRENCY,
+        ))
+    # Wait for any files the templates may have scheduled for copying or resizing.
+    app.wait()
+    return profile.measurements, dependencies
+
+
+async def _generate_openapi(www_directory_path: Path, app: App, profile: _Profile) -> None:
     api_directory_path = www_directory_path / 'api'
     api_directory_path.mkdir(exist_ok=True, parents=True)
-    rendered_json = json.dumps(build_specification(app))
+    with profile.measure(('media_types', 'application/json'), cpu_clock=time.thread_time) as measurement:
+        rendered_json = json.dumps(build_specification(app))
+        measurement.bytes_from_output(rendered_json)
     async with _create_json_resource(api_directory_path) as f:
         await f.write(rendered_json)
@@ -21,7 +21,7 @@ class Gramps(ConfigurableExtension[GrampsConfiguration], UserFacingExtension, Lo
 
     async def load(self) -> None:
         for family_tree in self.configuration.family_trees:
-            await load_file(self._app.project.ancestry, family_tree.file_path)
+            await load_file(self._app.project.ancestry, family_tree.file_path, self.cache_directory_path)
 
     @classmethod
     def label(cls) -> str:
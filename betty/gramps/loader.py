@@ -1,21 +1,27 @@
+from __future__ import annotations
+
 import gzip
+import hashlib
+import io
+import os
+import pickle
 import re
 import tarfile
 from collections import defaultdict
 from contextlib import suppress
 from tempfile import TemporaryDirectory
-from typing import Optional, List, Union, Iterable, Dict, Type, Tuple
+from typing import Optional, List, Union, Iterable, Dict, Type, Tuple, IO, Any, Callable, cast
 from xml.etree import ElementTree
 
-import aiofiles
 from geopy import Point
 
+from betty import about
 from betty.config import Path
 from betty.gramps.error import GrampsError
 from betty.load import getLogger
 from betty.locale import DateRange, Datey, Date
 from betty.media_type import MediaType
-from betty.model import Entity, FlattenedEntityCollection, FlattenedEntity, unflatten, get_entity_type
+from betty.model import Entity, FlattenedEntityCollection, FlattenedEntity, unflatten, get_entity_type, GeneratedEntityId
 from betty.model.ancestry import Ancestry, Note, File, Source, Citation, Place, Event, Person, PersonName, Subject, \
     Witness, Beneficiary, Attendee, Presence, PlaceName, Enclosure, HasLinks, Link, HasPrivacy
 from betty.model.event_type import Birth, Baptism, Adoption, Cremation, Death, Funeral, Burial, Will, Engagement, \
@@ -40,46 +46,64 @@ class XPathError(GrampsError, RuntimeError):
         super().__init__(*args, **kwargs)
 
 
-async def load_file(ancestry: Ancestry, file_path: PathLike) -> None:
+async def load_file(ancestry: Ancestry, file_path: PathLike, cache_directory_path: Optional[PathLike] = None) -> None:
+    """
+    Load a *.gpkg, *.gramps, or *.xml family tree.
+
+    If a cache directory is given, the parsed family tree is stored there as a snapshot, which is used instead of
+    parsing the family tree again until the file changes.
+    """
     file_path = Path(file_path).resolve()
     logger = getLogger()
     logger.info('Loading %s...' % str(file_path))
 
+    snapshot = None if cache_directory_path is None else _Snapshot(Path(cache_directory_path), file_path)
+    loader = None if snapshot is None else snapshot.restore(ancestry)
+    if loader is None:
+        last_generated_entity_id = GeneratedEntityId._last_id
+        loader = _parse_file(ancestry, file_path)
+        if snapshot is not None:
+            snapshot.store(loader, last_generated_entity_id)
+    else:
+        logger.info('Loaded %s from the cache.' % str(file_path))
+    loader.load()
+
+
+def _parse_file(ancestry: Ancestry, file_path: Path) -> _Loader:
     with suppress(GrampsLoadFileError):
-        load_gpkg(ancestry, file_path)
-        return
+        return _parse_gpkg(ancestry, file_path)
 
     with suppress(GrampsLoadFileError):
-        load_gramps(ancestry, file_path)
-        return
+        return _parse_gramps(ancestry, file_path)
 
-    try:
-        async with aiofiles.open(file_path) as f:
-            xml = await f.read()
-    except FileNotFoundError:
-        raise GrampsFileNotFoundError(f'Could not find the file "{file_path}".') from None
     with suppress(GrampsLoadFileError):
-        load_xml(ancestry, xml, file_path.anchor)
-        return
+        return _parse_xml(ancestry, file_path, file_path.anchor)
 
     raise GrampsLoadFileError('Could not load "%s" as a *.gpkg, a *.gramps, or an *.xml family tree.' % file_path)
 
 
 def load_gramps(ancestry: Ancestry, gramps_path: PathLike) -> None:
+    _parse_gramps(ancestry, gramps_path).load()
+
+
+def _parse_gramps(ancestry: Ancestry, gramps_path: PathLike) -> _Loader:
     gramps_path = Path(gramps_path).resolve()
     try:
-        with gzip.open(gramps_path, mode='r') as f:
-            xml = f.read()
-        load_xml(
-            ancestry,
-            xml,  # type: ignore
-            rootname(gramps_path),
-        )
+        with gzip.open(gramps_path, mode='rb') as f:
+            return _parse_xml(
+                ancestry,
+                f,
+                rootname(gramps_path),
+            )
     except OSError:
         raise GrampsLoadFileError()
 
 
 def load_gpkg(ancestry: Ancestry, gpkg_path: PathLike) -> None:
+    _parse_gpkg(ancestry, gpkg_path).load()
+
+
+def _parse_gpkg(ancestry: Ancestry, gpkg_path: PathLike) -> _Loader:
     gpkg_path = Path(gpkg_path).resolve()
     try:
         tar_file = gzip.open(gpkg_path)
@@ -88,75 +112,199 @@ def load_gpkg(ancestry: Ancestry, gpkg_path: PathLike) -> None:
                 tarfile.open(
                     fileobj=tar_file,  # type: ignore
                 ).extractall(cache_directory_path)
-                load_gramps(ancestry, Path(cache_directory_path) / 'data.gramps')
+                return _parse_gramps(ancestry, Path(cache_directory_path) / 'data.gramps')
         except tarfile.ReadError:
             raise GrampsLoadFileError('Could not read "%s" as a *.tar file after un-gzipping it.' % gpkg_path)
     except OSError:
         raise GrampsLoadFileError('Could not un-gzip "%s".' % gpkg_path)
 
 
-def load_xml(ancestry: Ancestry, xml: Union[str, PathLike], gramps_tree_directory_path: PathLike) -> None:
-    gramps_tree_directory_path = Path(gramps_tree_directory_path).resolve()
-    with suppress(FileNotFoundError, OSError):
-        with open(xml) as f:
-            xml = f.read()
-    try:
-        tree = ElementTree.ElementTree(ElementTree.fromstring(
-            xml,  # type: ignore
-        ))
-    except ElementTree.ParseError as e:
-        raise GrampsLoadFileError(e)
-    _Loader(ancestry, tree, gramps_tree_directory_path).load()
+def load_xml(ancestry: Ancestry, xml: Union[str, PathLike, IO, io.IOBase], gramps_tree_directory_path: PathLike) -> None:
+    """
+    Load Gramps XML from a string, a file path, or a file object.
+
+    The XML is parsed incrementally, and elements are discarded as soon as they have been loaded, so the entire
+    document is never held in memory.
+    """
+    _parse_xml(ancestry, xml, gramps_tree_directory_path).load()
+
+
+def _parse_xml(ancestry: Ancestry, xml: Union[str, PathLike, IO, io.IOBase], gramps_tree_directory_path: PathLike) -> _Loader:
+    loader = _Loader(ancestry, Path(gramps_tree_directory_path).resolve())
+    if isinstance(xml, str) and xml.lstrip().startswith('<'):
+        loader.parse(io.StringIO(xml))
+    elif isinstance(xml, (str, os.PathLike)):
+        try:
+            with open(xml, 'rb') as f:
+                loader.parse(f)
+        except FileNotFoundError:
+            raise GrampsFileNotFoundError(f'Could not find the file "{xml}".') from None
+    else:
+        loader.parse(xml)
+    return loader
+
+
+class _Snapshot:
+    """
+    Store parsed family trees in the cache, so unchanged family trees do not have to be parsed again.
+
+    A snapshot is keyed on the family tree's file path, modification time, and size, and on the Betty version.
+    Generated entity IDs are kept when a snapshot is restored in the same position in the sequence of generated IDs as
+    it was parsed in, so that separate processes loading the same project end up with the same IDs. Otherwise they are
+    replaced with new ones, so they never clash with the generated IDs of other entities.
+    """
+
+    def __init__(self, cache_directory_path: Path, file_path: Path):
+        self._file_path = file_path
+        self._snapshot_file_path = cache_directory_path / f'{hashlib.md5(str(file_path).encode("utf-8")).hexdigest()}.pickle'
+
+    def _key(self) -> str:
+        file_stat = self._file_path.stat()
+        return ':'.join([str(self._file_path), str(file_stat.st_mtime_ns), str(file_stat.st_size), about.version()])
+
+    def restore(self, ancestry: Ancestry) -> Optional[_Loader]:
+        try:
+            with open(self._snapshot_file_path, 'rb') as f:
+                if pickle.load(f) != self._key():
+                    return None
+                first_generated_entity_id, last_generated_entity_id = pickle.load(f)
+                keep_generated_entity_ids = GeneratedEntityId._last_id == first_generated_entity_id
+                loader = _Loader(ancestry, self._file_path.parent)
+                loader.restore(_SnapshotUnpickler(f, keep_generated_entity_ids).load())
+                if keep_generated_entity_ids:
+                    GeneratedEntityId._last_id = last_generated_entity_id
+                return loader
+        except FileNotFoundError:
+            return None
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError, TypeError, ValueError) as e:
+            getLogger().warning('Could not restore %s from the cache: %s' % (str(self._file_path), e))
+            return None
+
+    def store(self, loader: _Loader, first_generated_entity_id: int) -> None:
+        """
+        Store a freshly parsed family tree, whose generated entity IDs follow the given generated entity ID.
+        """
+        snapshot_file_path_tmp = self._snapshot_file_path.with_suffix('.tmp')
+        try:
+            self._snapshot_file_path.parent.mkdir(exist_ok=True, parents=True)
+            with open(snapshot_file_path_tmp, 'wb') as f:
+                pickle.dump(self._key(), f, pickle.HIGHEST_PROTOCOL)
+                pickle.dump((first_generated_entity_id, GeneratedEntityId._last_id), f, pickle.HIGHEST_PROTOCOL)
+                _SnapshotPickler(f, pickle.HIGHEST_PROTOCOL).dump(loader.dump())
+            # Replace any previous snapshot atomically, so concurrent builds never read a partial snapshot.
+            os.replace(snapshot_file_path_tmp, self._snapshot_file_path)
+        except (OSError, pickle.PicklingError, TypeError, AttributeError) as e:
+            getLogger().warning('Could not store %s in the cache: %s' % (str(self._file_path), e))
+            with suppress(OSError):
+                snapshot_file_path_tmp.unlink()
+
+
+class _SnapshotPickler(pickle.Pickler):
+    def persistent_id(self, obj: Any) -> Optional[str]:
+        if isinstance(obj, GeneratedEntityId):
+            return str(obj)
+        return None
+
+
+class _SnapshotUnpickler(pickle.Unpickler):
+    def __init__(self, file: IO[bytes], keep_generated_entity_ids: bool):
+        super().__init__(file)
+        self._keep_generated_entity_ids = keep_generated_entity_ids
+        self._generated_entity_ids: Dict[str, GeneratedEntityId] = {}
+
+    def persistent_load(self, pid: str) -> GeneratedEntityId:
+        if self._keep_generated_entity_ids:
+            return GeneratedEntityId(pid)
+        try:
+            return self._generated_entity_ids[pid]
+        except KeyError:
+            self._generated_entity_ids[pid] = GeneratedEntityId()
+            return self._generated_entity_ids[pid]
 
 
 class _Loader:
-    def __init__(self, ancestry: Ancestry, tree: ElementTree.ElementTree, gramps_tree_directory_path: Path):
+    def __init__(self, ancestry: Ancestry, gramps_tree_directory_path: Path):
         self._ancestry = ancestry
         self._flattened_entities = FlattenedEntityCollection()
         self._added_entity_counts: Dict[Type[Entity], int] = defaultdict(lambda: 0)
-        self._tree = tree
         self._gramps_tree_directory_path = gramps_tree_directory_path
+        # Gramps XML sections may appear in any order, but they must be loaded in a fixed order, so entities and
+        # associations are buffered per section.
+        self._section: Optional[str] = None
+        self._section_entities: Dict[str, List[Entity]] = defaultdict(list)
+        self._section_associations: Dict[str, List[Tuple[Tuple[Any, ...], Dict[str, Any]]]] = defaultdict(list)
+
+    def parse(self, xml: Union[IO, io.IOBase]) -> None:
+        # The ancestors of the current element.
+        element_stack: List[ElementTree.Element] = []
+        try:
+            for event, element in ElementTree.iterparse(xml, events=('start', 'end')):
+                if event == 'start':
+                    element_stack.append(element)
+                    continue
+                element_stack.pop()
+                # Load each element within a section, such as <people>, and discard it afterwards.
+                if len(element_stack) == 2:
+                    section_element = element_stack[1]
+                    with suppress(KeyError):
+                        self._section, element_loader = _ELEMENT_LOADERS[section_element.tag, element.tag]
+                        element_loader(self, element)
+                    section_element.remove(element)
+        except ElementTree.ParseError as e:
+            raise GrampsLoadFileError(e)
+
+    def dump(self) -> Tuple[Dict[str, List[Entity]], Dict[str, List[Tuple[Tuple[Any, ...], Dict[str, Any]]]]]:
+        return dict(self._section_entities), dict(self._section_associations)
+
+    def restore(self, dumped_loader: Tuple[Dict[str, List[Entity]], Dict[str, List[Tuple[Tuple[Any, ...], Dict[str, Any]]]]]) -> None:
+        section_entities, section_associations = dumped_loader
+        self._section_entities.update(section_entities)
+        self._section_associations.update(section_associations)
 
     def load(self) -> None:
         logger = getLogger()
 
-        database = self._tree.getroot()
-
-        _load_notes(self, database)
+        self._load_section('notes')
         logger.info(f'Loaded {self._added_entity_counts[Note]} notes.')
 
-        _load_objects(self, database, self._gramps_tree_directory_path)
+        self._load_section('objects')
         logger.info(f'Loaded {self._added_entity_counts[File]} files.')
 
-        _load_repositories(self, database)
+        self._load_section('repositories')
         repository_count = self._added_entity_counts[Source]
         logger.info(f'Loaded {repository_count} repositories as sources.')
 
-        _load_sources(self, database)
+        self._load_section('sources')
         logger.info(f'Loaded {self._added_entity_counts[Source] - repository_count} sources.')
 
-        _load_citations(self, database)
+        self._load_section('citations')
         logger.info(f'Loaded {self._added_entity_counts[Citation]} citations.')
 
-        _load_places(self, database)
+        self._load_section('places')
         logger.info(f'Loaded {self._added_entity_counts[Place]} places.')
 
-        _load_events(self, database)
+        self._load_section('events')
         logger.info(f'Loaded {self._added_entity_counts[Event]} events.')
 
-        _load_people(self, database)
+        self._load_section('people')
         logger.info(f'Loaded {self._added_entity_counts[Person]} people.')
 
-        _load_families(self, database)
+        self._load_section('families')
 
         self._ancestry.entities.append(*self._flattened_entities.unflatten())
 
+    def _load_section(self, section: str) -> None:
+        for entity in self._section_entities.pop(section, []):
+            self._flattened_entities.add_entity(entity)
+            self._added_entity_counts[get_entity_type(unflatten(entity))] += 1
+        for args, kwargs in self._section_associations.pop(section, []):
+            self._flattened_entities.add_association(*args, **kwargs)
+
     def add_entity(self, entity: Entity) -> None:
-        self._flattened_entities.add_entity(entity)
-        self._added_entity_counts[get_entity_type(unflatten(entity))] += 1
+        self._section_entities[cast(str, self._section)].append(entity)
 
     def add_association(self, *args, **kwargs) -> None:
-        self._flattened_entities.add_association(*args, **kwargs)
+        self._section_associations[cast(str, self._section)].append((args, kwargs))
 
 
 _NS = {
@@ -226,11 +374,6 @@ def _load_dateval(element: ElementTree.Element, value_attribute_name: str) -> Op
     return None
 
 
-def _load_notes(loader: _Loader, database: ElementTree.Element) -> None:
-    for element in _xpath(database, './ns:notes/ns:note'):
-        _load_note(loader, element)
-
-
 def _load_note(loader: _Loader, element: ElementTree.Element) -> None:
     handle = element.get('handle')
     note_id = element.get('id')
@@ -241,11 +384,6 @@ def _load_note(loader: _Loader, element: ElementTree.Element) -> None:
     loader.add_entity(FlattenedEntity(Note(note_id, text), handle))
 
 
-def _load_objects(loader: _Loader, database: ElementTree.Element, gramps_tree_directory_path: Path) -> None:
-    for element in _xpath(database, './ns:objects/ns:object'):
-        _load_object(loader, element, gramps_tree_directory_path)
-
-
 def _load_object(loader: _Loader, element: ElementTree.Element, gramps_tree_directory_path: Path) -> None:
     file_handle = element.get('handle')
     file_id = element.get('id')
@@ -268,11 +406,6 @@ def _load_object(loader: _Loader, element: ElementTree.Element, gramps_tree_dire
         loader.add_association(File, file_handle, 'notes', Note, note_handle)
 
 
-def _load_people(loader: _Loader, database: ElementTree.Element) -> None:
-    for element in _xpath(database, './ns:people/ns:person'):
-        _load_person(loader, element)
-
-
 def _load_person(loader: _Loader, element: ElementTree.Element) -> None:
     person_handle = element.get('handle')
     assert person_handle is not None
@@ -327,11 +460,6 @@ def _load_person(loader: _Loader, element: ElementTree.Element) -> None:
     loader.add_entity(flattened_person)
 
 
-def _load_families(loader: _Loader, database: ElementTree.Element) -> None:
-    for element in _xpath(database, './ns:families/ns:family'):
-        _load_family(loader, element)
-
-
 def _load_family(loader: _Loader, element: ElementTree.Element) -> None:
     parent_handles = []
 
@@ -380,11 +508,6 @@ def _load_eventref(loader: _Loader, person_id: str, eventref: ElementTree.Elemen
     loader.add_association(Presence, identifiable_presence.id, 'event', Event, event_handle)
 
 
-def _load_places(loader: _Loader, database: ElementTree.Element):
-    for element in _xpath(database, './ns:places/ns:placeobj'):
-        _load_place(loader, element)
-
-
 def _load_place(loader: _Loader, element: ElementTree.Element) -> None:
     place_handle = element.get('handle')
     names = []
@@ -423,11 +546,6 @@ def _load_coordinates(element: ElementTree.Element) -> Optional[Point]:
     return None
 
 
-def _load_events(loader: _Loader, database: ElementTree.Element) -> None:
-    for element in _xpath(database, './ns:events/ns:event'):
-        _load_event(loader, element)
-
-
 _EVENT_TYPE_MAP = {
     'Birth': Birth(),
     'Baptism': Baptism(),
@@ -487,11 +605,6 @@ def _load_event(loader: _Loader, element: ElementTree.Element) -> None:
     loader.add_entity(flattened_event)
 
 
-def _load_repositories(loader: _Loader, database: ElementTree.Element) -> None:
-    for element in _xpath(database, './ns:repositories/ns:repository'):
-        _load_repository(loader, element)
-
-
 def _load_repository(loader: _Loader, element: ElementTree.Element) -> None:
     repository_source_handle = element.get('handle')
 
@@ -505,11 +618,6 @@ def _load_repository(loader: _Loader, element: ElementTree.Element) -> None:
     loader.add_entity(FlattenedEntity(source, repository_source_handle))
 
 
-def _load_sources(loader: _Loader, database: ElementTree.Element) -> None:
-    for element in _xpath(database, './ns:sources/ns:source'):
-        _load_source(loader, element)
-
-
 def _load_source(loader: _Loader, element: ElementTree.Element) -> None:
     source_handle = element.get('handle')
     try:
@@ -541,11 +649,6 @@ def _load_source(loader: _Loader, element: ElementTree.Element) -> None:
     loader.add_entity(flattened_source)
 
 
-def _load_citations(loader: _Loader, database: ElementTree.Element) -> None:
-    for element in _xpath(database, './ns:citations/ns:citation'):
-        _load_citation(loader, element)
-
-
 def _load_citation(loader: _Loader, element: ElementTree.Element) -> None:
     citation_handle = element.get('handle')
     source_handle = _xpath1(element, './ns:sourceref').get('hlink')
@@ -614,3 +717,20 @@ def _load_attribute(name: str, element: ElementTree.Element, tag: str) -> Option
     with suppress(XPathError):
         return _xpath1(element, './ns:%s[@type="betty:%s"]' % (tag, name)).get('value')
     return None
+
+
+def _ns(tag: str) -> str:
+    return f'{{{_NS["ns"]}}}{tag}'
+
+
+_ELEMENT_LOADERS: Dict[Tuple[str, str], Tuple[str, Callable[[_Loader, ElementTree.Element], None]]] = {
+    (_ns('notes'), _ns('note')): ('notes', _load_note),
+    (_ns('objects'), _ns('object')): ('objects', lambda loader, element: _load_object(loader, element, loader._gramps_tree_directory_path)),
+    (_ns('repositories'), _ns('repository')): ('repositories', _load_repository),
+    (_ns('sources'), _ns('source')): ('sources', _load_source),
+    (_ns('citations'), _ns('citation')): ('citations', _load_citation),
+    (_ns('places'), _ns('placeobj')): ('places', _load_place),
+    (_ns('events'), _ns('event')): ('events', _load_event),
+    (_ns('people'), _ns('person')): ('people', _load_person),
+    (_ns('families'), _ns('family')): ('families', _load_family),
+}
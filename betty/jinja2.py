@@ -284,8 +284,8 @@ def _filter_flatten(items: Union[Iterable, Iterable]) -> Iterable:
             yield child
 
 
-def _filter_walk(item: Any, attribute_name: str) -> Iterable[Any]:
-    return walk(item, attribute_name)
+def _filter_walk(item: Any, attribute_name: str, max_depth: Optional[int] = None) -> Iterable[Any]:
+    return walk(item, attribute_name, max_depth)
 
 
 _paragraph_re = re.compile(r'(?:\r\n|\r|\n){2,}')
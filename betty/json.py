@@ -1,14 +1,13 @@
 import json as stdjson
 from os import path
 from pathlib import Path
-from typing import Dict, Any, Type, Callable
+from typing import Dict, Any, Type, Callable, Optional
 
 import jsonschema
 from geopy import Point
 from jsonschema import RefResolver
 
 from betty.app import App
-from betty.asyncio import sync
 from betty.locale import Date, DateRange, Localized
 from betty.media_type import MediaType
 from betty.model import Entity, get_entity_type_name, GeneratedEntityId
@@ -29,6 +28,11 @@ def validate(data: Any, schema_definition: str, app: App) -> None:
         data, schema['definitions'][schema_definition], resolver=ref_resolver)
 
 
+# Media types are immutable, and parsing them is relatively expensive, so these are shared by all encoded entities.
+_JSON_MEDIA_TYPE = MediaType('application/json')
+_HTML_MEDIA_TYPE = MediaType('text/html')
+
+
 class JSONEncoder(stdjson.JSONEncoder):
     def __init__(self, app: App, *args, **kwargs):
         stdjson.JSONEncoder.__init__(self, *args, **kwargs)
@@ -63,15 +67,14 @@ class JSONEncoder(stdjson.JSONEncoder):
                 return self._mappers[mapper_type](o)
         stdjson.JSONEncoder.default(self, o)
 
-    def _generate_url(self, resource: Any, media_type='application/json'):
-        return self._app.url_generator.generate(resource, media_type)
+    def _generate_url(self, resource: Any, media_type='application/json', locale: Optional[str] = None):
+        return self._app.url_generator.generate(resource, media_type, locale=locale)
 
     def _encode_schema(self, encoded: Dict, defintion: str) -> None:
         encoded['$schema'] = self._app.static_url_generator.generate(
             'schema.json#/definitions/%s' % defintion)
 
-    @sync
-    async def _encode_entity(self, encoded: Dict, entity: Entity) -> None:
+    def _encode_entity(self, encoded: Dict, entity: Entity) -> None:
         self._encode_schema(encoded, upper_camel_case_to_lower_camel_case(get_entity_type_name(entity)))
 
         if 'links' not in encoded:
@@ -82,26 +85,25 @@ class JSONEncoder(stdjson.JSONEncoder):
 
             canonical = Link(self._generate_url(entity))
             canonical.relationship = 'canonical'
-            canonical.media_type = MediaType('application/json')
+            canonical.media_type = _JSON_MEDIA_TYPE
             encoded['links'].append(canonical)
 
             link_urls = [link.url for link in encoded['links']]
             for locale_configuration in self._app.project.configuration.locales:
                 if locale_configuration.locale == self._app.locale:
                     continue
-                with self._app.acquire_locale(locale_configuration.locale):
-                    link_url = self._generate_url(entity)
-                    if link_url in link_urls:
-                        continue
-                    link_urls.append(link_url)
-                    translation = Link(link_url)
+                link_url = self._generate_url(entity, locale=locale_configuration.locale)
+                if link_url in link_urls:
+                    continue
+                link_urls.append(link_url)
+                translation = Link(link_url)
                 translation.relationship = 'alternate'
                 translation.locale = locale_configuration.locale
                 encoded['links'].append(translation)
 
             html = Link(self._generate_url(entity, media_type='text/html'))
             html.relationship = 'alternate'
-            html.media_type = MediaType('text/html')
+            html.media_type = _HTML_MEDIA_TYPE
             encoded['links'].append(html)
 
     def _encode_described(self, encoded: Dict, described: Described) -> None:
@@ -1,6 +1,9 @@
+import asyncio
 import logging
+import time
 
 from betty.app import App
+from betty.app.extension import Extension
 
 
 def getLogger() -> logging.Logger:
@@ -19,5 +22,22 @@ class PostLoader:
 
 async def load(app: App) -> None:
     await app.dispatcher.dispatch(Loader)()
-    await app.dispatcher.dispatch(PostLoader)()
+    await _post_load(app)
     app.wait()
+
+
+async def _post_load(app: App) -> None:
+    # Post-load like the extension dispatcher does, but time each post-loader.
+    for extensions_batch in app.extensions:
+        await asyncio.gather(*[
+            _post_load_extension(extension)
+            for extension
+            in extensions_batch
+            if isinstance(extension, PostLoader)
+        ])
+
+
+async def _post_load_extension(post_loader: Extension) -> None:
+    start = time.perf_counter()
+    await post_loader.post_load()  # type: ignore
+    getLogger().info('Post-loaded %s in %.2f seconds.' % (post_loader.name(), time.perf_counter() - start))
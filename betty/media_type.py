@@ -52,6 +52,10 @@ class MediaType:
     def __str__(self):
         return self._str
 
+    def __reduce__(self):
+        # The parsed parameters are a mappingproxy, which cannot be pickled, so the media type is parsed again instead.
+        return MediaType, (self._str,)
+
     def __eq__(self, other):
         if not isinstance(other, MediaType):
             return NotImplemented
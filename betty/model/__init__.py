@@ -2,12 +2,13 @@ from __future__ import annotations
 
 import copy
 import functools
-import operator
+import threading
 from dataclasses import dataclass
 from enum import Enum
-from functools import reduce
+from contextlib import suppress, contextmanager
+from itertools import chain
 from typing import TypeVar, Generic, Callable, List, Optional, Iterable, Any, Type, Union, Set, overload, cast, \
-    Iterator, TYPE_CHECKING
+    Iterator, TYPE_CHECKING, Dict, FrozenSet, Tuple
 
 try:
     from typing_extensions import Self
@@ -17,7 +18,6 @@ except ModuleNotFoundError:
 if TYPE_CHECKING:
     from betty.builtins import _
 
-from betty.functools import slice_to_range
 from betty.importlib import import_any
 
 T = TypeVar('T')
@@ -42,11 +42,25 @@ class GeneratedEntityId(str):
 
 
 class Entity:
+    # The version of this entity's own associations, which is increased whenever they change.
+    _associations_version = 0
+
     def __init__(self, entity_id: Optional[str] = None, *args, **kwargs):
-        get_entity_type(self)
+        get_entity_type_by_entity(self)
         self._id = GeneratedEntityId() if entity_id is None else entity_id
         super().__init__(*args, **kwargs)
 
+    def __getstate__(self) -> Dict[str, Any]:
+        # Derived values are cached per entity, and are not shared with pickled or copied entities.
+        state = self.__dict__.copy()
+        state.pop(_DERIVED_VALUES_ATTR_NAME, None)
+        return state
+
+    def __copy__(self) -> Self:
+        copied = self.__class__.__new__(self.__class__)
+        copied.__dict__.update(self.__getstate__())
+        return copied
+
     @property
     def id(self) -> str:
         return self._id
@@ -90,11 +104,25 @@ EntityT = TypeVar('EntityT', bound=Entity)
 EntityU = TypeVar('EntityU', bound=Entity)
 
 
+# Entity types are static once their classes have been defined, so entity type resolutions are cached. Failed
+# resolutions are not cached, so they raise errors every time.
+_entity_type_names: Dict[Type[Entity], str] = {}
+_entity_types_by_name: Dict[str, Type[Entity]] = {}
+_entity_types_by_type: Dict[type, Type[Entity]] = {}
+
+
 def get_entity_type_name(entity_type_definition: Union[str, Type[Entity], Entity]) -> str:
     entity_type = get_entity_type(entity_type_definition)
+    try:
+        return _entity_type_names[entity_type]
+    except KeyError:
+        pass
     if entity_type.__module__.startswith('betty.model.ancestry'):
-        return entity_type.__name__
-    return f'{entity_type.__module__}.{entity_type.__name__}'
+        entity_type_name = entity_type.__name__
+    else:
+        entity_type_name = f'{entity_type.__module__}.{entity_type.__name__}'
+    _entity_type_names[entity_type] = entity_type_name
+    return entity_type_name
 
 
 class EntityTypeError(ValueError):
@@ -124,6 +152,10 @@ def get_entity_type(entity_type_definition: Union[str, Type[Entity], Entity, Any
 
 @get_entity_type.register(str)
 def get_entity_type_by_name(entity_type_name: str) -> Type[Entity]:
+    try:
+        return _entity_types_by_name[entity_type_name]
+    except KeyError:
+        pass
     try:
         entity_type = import_any(entity_type_name)
     except ImportError:
@@ -131,20 +163,146 @@ def get_entity_type_by_name(entity_type_name: str) -> Type[Entity]:
             entity_type = import_any(f'betty.model.ancestry.{entity_type_name}')
         except ImportError:
             raise EntityTypeImportError(entity_type_name) from None
-    return get_entity_type(entity_type)
+    _entity_types_by_name[entity_type_name] = get_entity_type(entity_type)
+    return _entity_types_by_name[entity_type_name]
 
 
 @get_entity_type.register(type)
 def get_entity_type_by_type(entity_type: type) -> Type[Entity]:
+    try:
+        return _entity_types_by_type[entity_type]
+    except KeyError:
+        pass
     for ancestor_cls in entity_type.__mro__:
         if ancestor_cls not in (Entity, EntityVariation) and Entity in ancestor_cls.__bases__ and EntityVariation not in ancestor_cls.__bases__:
+            _entity_types_by_type[entity_type] = ancestor_cls
             return ancestor_cls
     raise EntityTypeInvalidError(entity_type)
 
 
 @get_entity_type.register(object)
 def get_entity_type_by_entity(entity: Entity) -> Type[Entity]:
-    return get_entity_type(type(entity))
+    return get_entity_type_by_type(type(entity))
+
+
+class _Dependencies:
+    """
+    Describe the entities that were read while deriving a property value, or while recording reads.
+    """
+
+    def __init__(self):
+        # The entities whose associations were read, keyed by their identities, with the versions of their associations
+        # at the time.
+        self.owners: Dict[int, Tuple[Entity, int]] = {}
+        # The entities and entity collections that were read from associations, keyed by their identities.
+        self.associates: Dict[int, Union[Entity, EntityCollection]] = {}
+
+    def update(self, other: _Dependencies) -> None:
+        self.owners.update(other.owners)
+        self.associates.update(other.associates)
+
+    @property
+    def entities(self) -> Iterator[Entity]:
+        """
+        Get the entities that were read, which may include duplicates.
+        """
+        for owner, __ in self.owners.values():
+            yield owner
+        for associates in self.associates.values():
+            if isinstance(associates, EntityCollection):
+                yield from associates
+            else:
+                yield associates
+
+
+class _Derivations(threading.local):
+    """
+    Track the entities that are read while deriving property values, or while recording reads.
+    """
+
+    def __init__(self):
+        # For every derivation or recording in progress, the entities that were read.
+        self.dependencies: List[_Dependencies] = []
+
+
+_derivations = _Derivations()
+
+
+def _read_associations(owner: Entity, associates: Union[Entity, EntityCollection, None]) -> None:
+    dependencies = _derivations.dependencies
+    if dependencies:
+        if id(owner) not in dependencies[-1].owners:
+            dependencies[-1].owners[id(owner)] = owner, owner._associations_version
+        if associates is not None:
+            dependencies[-1].associates[id(associates)] = associates
+
+
+@contextmanager
+def _record_reads() -> Iterator[_Dependencies]:
+    """
+    Record the entities that are read through associations, including those read to derive property values.
+    """
+    dependencies = _Dependencies()
+    _derivations.dependencies.append(dependencies)
+    try:
+        yield dependencies
+    finally:
+        _derivations.dependencies.pop()
+
+
+def _change_associations(owner: Entity) -> None:
+    owner._associations_version += 1
+
+
+# The name of the entity attribute that caches derived property values, keyed by property name.
+_DERIVED_VALUES_ATTR_NAME = '_derived_values'
+
+
+class _DerivedProperty(Generic[EntityT, T]):
+    """
+    A read-only property whose value is derived from entity associations.
+
+    Values are cached until the associations of any of the entities they were derived from change. Cached values are
+    shared between all callers, so they must not be changed.
+    """
+
+    def __init__(self, getter: Callable[[EntityT], T]):
+        self._getter = getter
+        self._name = getter.__name__
+        functools.update_wrapper(self, getter)  # type: ignore[arg-type]
+
+    @overload
+    def __get__(self, owner: None, owner_type: Optional[type] = None) -> Self:
+        pass  # pragma: no cover
+
+    @overload
+    def __get__(self, owner: EntityT, owner_type: Optional[type] = None) -> T:
+        pass  # pragma: no cover
+
+    def __get__(self, owner: Optional[EntityT], owner_type: Optional[type] = None) -> Union[Self, T]:
+        if owner is None:
+            return self
+        try:
+            derived_values = getattr(owner, _DERIVED_VALUES_ATTR_NAME)
+        except AttributeError:
+            derived_values = {}
+            setattr(owner, _DERIVED_VALUES_ATTR_NAME, derived_values)
+        dependencies = _derivations.dependencies
+        with suppress(KeyError):
+            value, value_dependencies = derived_values[self._name]
+            if all(entity._associations_version == version for entity, version in value_dependencies.owners.values()):
+                if dependencies:
+                    dependencies[-1].update(value_dependencies)
+                return value
+        dependencies.append(_Dependencies())
+        try:
+            value = self._getter(owner)
+        finally:
+            value_dependencies = dependencies.pop()
+        derived_values[self._name] = value, value_dependencies
+        if dependencies:
+            dependencies[-1].update(value_dependencies)
+        return value
 
 
 class EntityCollection(Generic[EntityT]):
@@ -161,6 +319,18 @@ class EntityCollection(Generic[EntityT]):
     def remove(self, *entities: EntityT) -> None:
         raise NotImplementedError
 
+    def remove_many(self, entities: Iterable[EntityT]) -> None:
+        """
+        Remove many entities at once.
+        """
+        raise NotImplementedError
+
+    def remove_where(self, predicate: Callable[[EntityT], bool]) -> None:
+        """
+        Remove all entities for which the predicate returns True.
+        """
+        raise NotImplementedError
+
     def replace(self, *entities: EntityT) -> None:
         raise NotImplementedError
 
@@ -212,29 +382,81 @@ class _EntityTypeAssociation(Generic[EntityT]):
 
 class _EntityTypeAssociationRegistry:
     _registrations: Set[_EntityTypeAssociation] = set()
+    # The associations per owner class, which are built when needed, and cleared whenever the registrations change.
+    _associations: Dict[Type[Entity], FrozenSet[_EntityTypeAssociation]] = {}
+
+    @classmethod
+    def get_associations(cls, owner_cls: Type[Entity]) -> FrozenSet[_EntityTypeAssociation]:
+        try:
+            return cls._associations[owner_cls]
+        except KeyError:
+            associations = cls._associations[owner_cls] = cls._build_associations(owner_cls)
+            return associations
 
     @classmethod
-    def get_associations(cls, owner_cls: Type[Entity]) -> Set[_EntityTypeAssociation]:
-        return {registration for registration in cls._registrations if registration.cls in owner_cls.__mro__}
+    def _build_associations(cls, owner_cls: Type[Entity]) -> FrozenSet[_EntityTypeAssociation]:
+        return frozenset(registration for registration in cls._registrations if registration.cls in owner_cls.__mro__)
 
     @classmethod
     def register(cls, registration: _EntityTypeAssociation) -> None:
         if registration not in cls._registrations:
             cls._registrations.add(registration)
+            cls._associations.clear()
+
+    @classmethod
+    def unregister(cls, registration: _EntityTypeAssociation) -> None:
+        cls._registrations.remove(registration)
+        cls._associations.clear()
 
 
 class SingleTypeEntityCollection(Generic[EntityT], EntityCollection[EntityT]):
+    """
+    A collection of entities of a single type.
+
+    Entities are indexed by identity and by ID, so that adding, removing, and looking up entities take constant time.
+    """
+
     def __init__(self, entity_type: Type[EntityT]):
-        self._entities: List[EntityT] = []
         self._entity_type: Type[EntityT] = entity_type
+        self._init_entities()
+
+    def _init_entities(self, entities: Iterable[EntityT] = ()) -> None:
+        # Appended entities, keyed by their identities, in order.
+        self._entities: Dict[int, EntityT] = {id(entity): entity for entity in entities}
+        # Prepended entities, keyed by their identities, in reverse order, so that prepending takes constant time.
+        self._prepended_entities: Dict[int, EntityT] = {}
+        # All entities, keyed by their IDs, and then by their identities, in order, which is built when needed.
+        self._entities_by_id: Optional[Dict[str, Dict[int, EntityT]]] = None
+        # Lists of the appended and prepended entities, in the same orders as their dictionaries, which are built when
+        # needed, and added to for as long as no iterator uses them.
+        self._entities_list: Optional[List[EntityT]] = None
+        self._prepended_entities_list: Optional[List[EntityT]] = None
+        self._entities_lists_iterated = False
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Entity identities are not retained when unpickling, so the indexes must be rebuilt.
+        state = self.__dict__.copy()
+        state['_entities'] = list(self._values())
+        del state['_prepended_entities']
+        del state['_entities_by_id']
+        del state['_entities_list']
+        del state['_prepended_entities_list']
+        del state['_entities_lists_iterated']
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        entities = state.pop('_entities')
+        self.__dict__.update(state)
+        # Unpickled entities may not have their state yet, so their IDs cannot be indexed until later.
+        self._init_entities(entities)
 
     def __repr__(self) -> str:
         return f'{object.__repr__(self)}(entity_type={self._entity_type}, length={len(self)})'
 
     def __copy__(self, copy_entities: bool = True):
         copied = self.__class__.__new__(self.__class__)
-        copied._entities = []
         copied._entity_type = self._entity_type
+        copied._init_entities()
         if copy_entities:
             self._copy_entities(copied)
         return copied
@@ -244,54 +466,155 @@ class SingleTypeEntityCollection(Generic[EntityT], EntityCollection[EntityT]):
             copied.append(entity)
 
     def _assert_entity(self, entity) -> None:
-        message = f'{entity} is not a {self._entity_type}.'
+        # The message is only built when the assertion fails, because entity representations can be expensive.
         assert (
             isinstance(entity, self._entity_type)
             or  # noqa: W503 W504
-            isinstance(entity, FlattenedEntity) and self._entity_type == get_entity_type(entity.unflatten())
-        ), message
+            isinstance(entity, FlattenedEntity) and self._entity_type == get_entity_type_by_entity(entity.unflatten())
+        ), f'{entity} is not a {self._entity_type}.'
+
+    def _on_change(self) -> None:
+        pass
+
+    def _has(self, entity_key: int) -> bool:
+        return entity_key in self._entities or entity_key in self._prepended_entities
+
+    def _values(self) -> Iterator[EntityT]:
+        return chain(reversed(self._prepended_entities.values()), self._entities.values())
+
+    def _list(self) -> List[EntityT]:
+        return list(self._values())
+
+    def _get_lists(self) -> Tuple[List[EntityT], List[EntityT]]:
+        if self._prepended_entities_list is None:
+            self._prepended_entities_list = list(self._prepended_entities.values())
+        if self._entities_list is None:
+            self._entities_list = list(self._entities.values())
+        return self._prepended_entities_list, self._entities_list
+
+    def _reset_lists(self) -> None:
+        self._entities_list = None
+        self._prepended_entities_list = None
+        self._entities_lists_iterated = False
+
+    def _get_entities_by_id(self) -> Dict[str, Dict[int, EntityT]]:
+        if self._entities_by_id is None:
+            self._entities_by_id = {}
+            for entity in self._values():
+                self._entities_by_id.setdefault(entity.id, {})[id(entity)] = entity
+        return self._entities_by_id
 
     def prepend(self, *entities: EntityT) -> None:
         for entity in reversed(entities):
             self._assert_entity(entity)
-            if entity in self:
+            if self._has(id(entity)):
                 continue
             self._prepend_one(entity)
 
     def _prepend_one(self, entity: EntityT) -> None:
-        self._entities.insert(0, entity)
+        self._prepended_entities[id(entity)] = entity
+        if self._entities_by_id is not None:
+            self._entities_by_id[entity.id] = {id(entity): entity, **self._entities_by_id.get(entity.id, {})}
+        # Lists that are being iterated over must not change.
+        if self._entities_lists_iterated:
+            self._reset_lists()
+        elif self._prepended_entities_list is not None:
+            self._prepended_entities_list.append(entity)
+        self._on_change()
 
     def append(self, *entities: EntityT) -> None:
         for entity in entities:
             self._assert_entity(entity)
-            if entity in self:
+            if self._has(id(entity)):
                 continue
             self._append_one(entity)
 
     def _append_one(self, entity: EntityT) -> None:
-        self._entities.append(entity)
+        self._entities[id(entity)] = entity
+        if self._entities_by_id is not None:
+            self._entities_by_id.setdefault(entity.id, {})[id(entity)] = entity
+        # Lists that are being iterated over must not change.
+        if self._entities_lists_iterated:
+            self._reset_lists()
+        elif self._entities_list is not None:
+            self._entities_list.append(entity)
+        self._on_change()
 
     def remove(self, *entities: EntityT) -> None:
         for entity in entities:
-            if entity not in self:
+            if not self._has(id(entity)):
                 continue
             self._remove_one(entity)
 
     def _remove_one(self, entity: EntityT) -> None:
-        self._entities.remove(entity)
+        self._unindex(entity)
+
+    def _unindex(self, entity: EntityT) -> None:
+        if id(entity) in self._entities:
+            del self._entities[id(entity)]
+        else:
+            del self._prepended_entities[id(entity)]
+        if self._entities_by_id is not None:
+            entities_by_id = self._entities_by_id[entity.id]
+            del entities_by_id[id(entity)]
+            if not entities_by_id:
+                del self._entities_by_id[entity.id]
+        self._reset_lists()
+        self._on_change()
+
+    def remove_many(self, entities: Iterable[EntityT]) -> None:
+        self._remove_many({
+            id(entity): entity
+            for entity
+            in entities
+            if self._has(id(entity))
+        })
+
+    def remove_where(self, predicate: Callable[[EntityT], bool]) -> None:
+        self._remove_many({
+            id(entity): entity
+            for entity
+            in self._values()
+            if predicate(entity)
+        })
+
+    def _remove_many(self, entities: Dict[int, EntityT]) -> None:
+        """
+        Remove many entities, keyed by their identities, which must all be in this collection.
+        """
+        if not entities:
+            return
+        # When removing most entities, compacting the remaining entities into new indexes in a single pass is cheaper
+        # than removing entities from the existing indexes one by one.
+        if len(entities) > len(self) // 2:
+            self._init_entities(
+                entity
+                for entity
+                in self._values()
+                if id(entity) not in entities
+            )
+            self._on_change()
+            return
+        for entity in entities.values():
+            self._unindex(entity)
 
     def replace(self, *entities: EntityT) -> None:
-        self._entities = []
+        self._init_entities()
+        self._on_change()
         self.append(*entities)
 
     def clear(self) -> None:
-        self._entities = []
+        self._init_entities()
+        self._on_change()
 
     def __iter__(self) -> Iterator[EntityT]:
-        return self._entities.__iter__()
+        # Iterate over lists, so entities can be added or removed while iterating.
+        prepended_entities, entities = self._get_lists()
+        self._entities_lists_iterated = True
+        return chain(reversed(prepended_entities), entities)
 
     def __len__(self) -> int:
-        return len(self._entities)
+        return len(self._prepended_entities) + len(self._entities)
 
     @overload
     def __getitem__(self, key: int) -> EntityT:
@@ -315,19 +638,26 @@ class SingleTypeEntityCollection(Generic[EntityT], EntityCollection[EntityT]):
         raise TypeError(f'Cannot find entities by {type(key)}.')
 
     def _getitem_by_index(self, index: int) -> EntityT:
-        return self._entities[index]
+        prepended_entities, entities = self._get_lists()
+        prepended_length = len(prepended_entities)
+        if index < 0:
+            index += prepended_length + len(entities)
+            if index < 0:
+                raise IndexError('Entity collection index out of range.')
+        if index < prepended_length:
+            return prepended_entities[prepended_length - 1 - index]
+        return entities[index - prepended_length]
 
     def _getitem_by_indices(self, indices: slice) -> SingleTypeEntityCollection[EntityT]:
         entities: SingleTypeEntityCollection = SingleTypeEntityCollection(self._entity_type)
-        for index in slice_to_range(indices, self._entities):
-            entities.append(self._entities[index])
+        entities.append(*self._list()[indices])
         return entities
 
     def _getitem_by_entity_id(self, entity_id: str) -> EntityT:
-        for entity in self._entities:
-            if entity_id == entity.id:
-                return entity
-        raise KeyError(f'Cannot find a {self._entity_type} entity with ID "{entity_id}".')
+        try:
+            return next(iter(self._get_entities_by_id()[entity_id].values()))
+        except KeyError:
+            raise KeyError(f'Cannot find a {self._entity_type} entity with ID "{entity_id}".') from None
 
     def __delitem__(self, key: Union[int, slice, str, EntityT]) -> None:
         if isinstance(key, self._entity_type):
@@ -344,17 +674,14 @@ class SingleTypeEntityCollection(Generic[EntityT], EntityCollection[EntityT]):
         self.remove(entity)
 
     def _delitem_by_index(self, index: int) -> None:
-        del self._entities[index]
+        self._unindex(self._getitem_by_index(index))
 
     def _delitem_by_indices(self, indices: slice) -> None:
-        for n, index in enumerate(slice_to_range(indices, self)):
-            del self[index - n]
+        self.remove_many(self._list()[indices])
 
     def _delitem_by_entity_id(self, entity_id: str) -> None:
-        for entity in self._entities:
-            if entity_id == entity.id:
-                self.remove(entity)
-                return
+        with suppress(KeyError):
+            self.remove(self._getitem_by_entity_id(entity_id))
 
     def __contains__(self, value: Union[EntityT, str, Any]) -> bool:
         if isinstance(value, self._entity_type):
@@ -364,16 +691,10 @@ class SingleTypeEntityCollection(Generic[EntityT], EntityCollection[EntityT]):
         return False
 
     def _contains_by_entity(self, other_entity: EntityT) -> bool:
-        for entity in self._entities:
-            if other_entity is entity:
-                return True
-        return False
+        return self._has(id(other_entity))
 
     def _contains_by_entity_id(self, entity_id: str) -> bool:
-        for entity in self._entities:
-            if entity.id == entity_id:
-                return True
-        return False
+        return entity_id in self._get_entities_by_id()
 
     def __add__(self, other) -> Self:  # type: ignore
         if not isinstance(other, EntityCollection):
@@ -398,6 +719,9 @@ class _AssociateCollection(SingleTypeEntityCollection[EntityT], Generic[EntityT,
             self._copy_entities(copied)
         return copied
 
+    def _on_change(self) -> None:
+        _change_associations(self._owner)
+
     def _on_add(self, associate: EntityT) -> None:
         raise NotImplementedError
 
@@ -425,8 +749,15 @@ class _AssociateCollection(SingleTypeEntityCollection[EntityT], Generic[EntityT,
         super()._remove_one(associate)
         self._on_remove(associate)
 
+    def _remove_many(self, associates: Dict[int, EntityT]) -> None:
+        # Update the associates only after the collection has been compacted, so that any updates that remove the
+        # owner from this collection again find nothing left to do.
+        super()._remove_many(associates)
+        for associate in associates.values():
+            self._on_remove(associate)
+
     def replace(self, *associates: EntityT) -> None:
-        self.remove(*list(self._entities))
+        self._remove_many({id(associate): associate for associate in self._values()})
         self.append(*associates)
 
     def clear(self) -> None:
@@ -487,10 +818,20 @@ class MultipleTypesEntityCollection(EntityCollection[Entity]):
         return self._get_collection(get_entity_type(entity_type_name))
 
     def _getitem_by_index(self, index: int) -> Entity:
-        return reduce(operator.add, self._collections.values(), SingleTypeEntityCollection(Entity))[index]
+        if index < 0:
+            index += len(self)
+        if index >= 0:
+            for collection in self._collections.values():
+                collection_length = len(collection)
+                if collection_length > index:
+                    return collection[index]
+                index -= collection_length
+        raise IndexError
 
     def _getitem_by_indices(self, indices: slice) -> SingleTypeEntityCollection[Entity]:
-        return reduce(operator.add, self._collections.values(), SingleTypeEntityCollection(Entity))[indices]
+        entities: SingleTypeEntityCollection[Entity] = SingleTypeEntityCollection(Entity)
+        entities.append(*[*self][indices])
+        return entities
 
     def __delitem__(self, key: Union[int, slice, str, Type[Entity], Entity]) -> None:
         if isinstance(key, type) and issubclass(key, Entity):
@@ -521,8 +862,7 @@ class MultipleTypesEntityCollection(EntityCollection[Entity]):
         raise IndexError
 
     def _delitem_by_indices(self, indices: slice) -> None:
-        for n, index in enumerate(slice_to_range(indices, self)):
-            del self[index - n]
+        self.remove_many(self._getitem_by_indices(indices))
 
     def _delitem_by_entity_type_name(self, entity_type_name: str) -> None:
         self._delitem_by_entity_type(get_entity_type(entity_type_name))
@@ -541,22 +881,34 @@ class MultipleTypesEntityCollection(EntityCollection[Entity]):
         return False
 
     def _contains_by_entity(self, other_entity: EntityT) -> bool:
-        for entity in self:  # type: ignore
-            if other_entity is entity:
-                return True
-        return False
+        try:
+            collection = self._collections[get_entity_type_by_entity(unflatten(other_entity))]
+        except KeyError:
+            return False
+        return collection._contains_by_entity(other_entity)
 
     def prepend(self, *entities: EntityT) -> None:
         for entity in entities:
-            self[get_entity_type(unflatten(entity))].prepend(entity)
+            self[get_entity_type_by_entity(unflatten(entity))].prepend(entity)
 
     def append(self, *entities: EntityT) -> None:
         for entity in entities:
-            self[get_entity_type(unflatten(entity))].append(entity)
+            self[get_entity_type_by_entity(unflatten(entity))].append(entity)
 
     def remove(self, *entities: EntityT) -> None:
         for entity in entities:
-            self[get_entity_type(unflatten(entity))].remove(entity)
+            self[get_entity_type_by_entity(unflatten(entity))].remove(entity)
+
+    def remove_many(self, entities: Iterable[EntityT]) -> None:
+        entities_by_type: Dict[Type[Entity], List[Entity]] = {}
+        for entity in entities:
+            entities_by_type.setdefault(get_entity_type_by_entity(unflatten(entity)), []).append(entity)
+        for entity_type, entity_type_entities in entities_by_type.items():
+            self[entity_type].remove_many(entity_type_entities)
+
+    def remove_where(self, predicate: Callable[[Entity], bool]) -> None:
+        for collection in self._collections.values():
+            collection.remove_where(predicate)
 
     def replace(self, *entities: EntityT) -> None:
         self.clear()
@@ -564,7 +916,7 @@ class MultipleTypesEntityCollection(EntityCollection[Entity]):
             self.append(entity)
 
     def clear(self) -> None:
-        for collection in self._collections:
+        for collection in self._collections.values():
             collection.clear()
 
     def __add__(self, other) -> MultipleTypesEntityCollection:
@@ -599,10 +951,13 @@ class _ToOne:
         return cls
 
     def _get(self, owner: Entity) -> Entity:
-        return getattr(owner, self._owner_private_attr_name)
+        entity = getattr(owner, self._owner_private_attr_name)
+        _read_associations(owner, entity)
+        return entity
 
     def _set(self, owner: Entity, entity: Optional[Entity]) -> None:
         setattr(owner, self._owner_private_attr_name, entity)
+        _change_associations(owner)
 
     def _delete(self, owner: Entity) -> None:
         self._set(owner, None)
@@ -618,6 +973,7 @@ class _OneToOne(_ToOne):
         if previous_entity == entity:
             return
         setattr(owner, self._owner_private_attr_name, entity)
+        _change_associations(owner)
         if previous_entity is not None:
             setattr(previous_entity, self._associate_attr_name, None)
         if entity is not None:
@@ -635,6 +991,7 @@ class _ManyToOne(_ToOne):
         if previous_entity == entity:
             return
         setattr(owner, self._owner_private_attr_name, entity)
+        _change_associations(owner)
         if previous_entity is not None:
             getattr(previous_entity, self._associate_attr_name).remove(owner)
             if entity is None and self._on_remove is not None:
@@ -669,7 +1026,9 @@ class _ToMany:
         return cls
 
     def _get(self, owner: Entity) -> EntityCollection:
-        return getattr(owner, self._owner_private_attr_name)
+        entities = getattr(owner, self._owner_private_attr_name)
+        _read_associations(owner, entities)
+        return entities
 
     def _set(self, owner: Entity, entities: Iterable[Entity]) -> None:
         self._get(owner).replace(*entities)
@@ -678,7 +1037,15 @@ class _ToMany:
         self._get(owner).clear()
 
     def _create_entity_collection(self, owner: Entity) -> EntityCollection:
-        return SingleTypeEntityCollection(Entity)
+        return _ToManyAssociateCollection(owner, Entity)
+
+
+class _ToManyAssociateCollection(_AssociateCollection):
+    def _on_add(self, associate: EntityT) -> None:
+        pass
+
+    def _on_remove(self, associate: EntityT) -> None:
+        pass
 
 
 class _BidirectionalToMany(_ToMany):
@@ -753,6 +1120,7 @@ many_to_one = _ManyToOne
 to_many = _ToMany
 one_to_many = _OneToMany
 many_to_many = _ManyToMany
+derived_property = _DerivedProperty
 
 
 class FlattenedEntity(Entity):
@@ -797,7 +1165,7 @@ class FlattenedEntityCollection:
         copied = copy.copy(entity)
 
         # Copy any associate collections because they belong to a single owning entity.
-        for association_registration in _EntityTypeAssociationRegistry.get_associations(get_entity_type(entity)):
+        for association_registration in _EntityTypeAssociationRegistry.get_associations(get_entity_type_by_entity(entity)):
             private_association_attr_name = f'_{association_registration.attr_name}'
             associates = getattr(entity, private_association_attr_name)
             if isinstance(associates, _AssociateCollection):
@@ -815,15 +1183,49 @@ class FlattenedEntityCollection:
                     association_registration.init_value(entity),
                 )
 
+    def _get_unflattened_entities_by_id(self) -> Dict[Type[Entity], Dict[str, Entity]]:
+        unflattened_entities_by_id: Dict[Type[Entity], Dict[str, Entity]] = {}
+        for entity_type, entities in self._entities._collections.items():
+            unflattened_entities: Dict[str, Entity] = {}
+            unflattened_entities_by_id[entity_type] = unflattened_entities
+            for entity in entities:
+                # Like entity collections, resolve duplicate IDs to the first entity.
+                unflattened_entities.setdefault(entity.id, unflatten(entity))
+        return unflattened_entities_by_id
+
     def _unflatten_associations(self) -> None:
+        unflattened_entities_by_id = self._get_unflattened_entities_by_id()
+
+        def _get_entity(entity_type: Type[Entity], entity_id: str) -> Entity:
+            try:
+                return unflattened_entities_by_id[entity_type][entity_id]
+            except KeyError:
+                raise KeyError(f'Cannot find a {entity_type} entity with ID "{entity_id}".') from None
+
+        # Consecutive associations for the same owner and attribute are added in bulk. Associations are never
+        # reordered, because adding an associate also updates the other side of the association.
+        owner: Optional[Entity] = None
+        owner_association_attr_name: Optional[str] = None
+        associates: List[Entity] = []
         for association in self._associations:
-            owner = unflatten(self._entities[association.owner_type][association.owner_id])
-            associate = unflatten(self._entities[association.associate_type][association.associate_id])
-            owner_association_attr_value = getattr(owner, association.owner_association_attr_name)
-            if isinstance(owner_association_attr_value, EntityCollection):
-                owner_association_attr_value.append(associate)
-            else:
-                setattr(owner, association.owner_association_attr_name, associate)
+            association_owner = _get_entity(association.owner_type, association.owner_id)
+            if association_owner is not owner or association.owner_association_attr_name != owner_association_attr_name:
+                self._unflatten_association(owner, owner_association_attr_name, associates)
+                owner = association_owner
+                owner_association_attr_name = association.owner_association_attr_name
+                associates = []
+            associates.append(_get_entity(association.associate_type, association.associate_id))
+        self._unflatten_association(owner, owner_association_attr_name, associates)
+
+    def _unflatten_association(self, owner: Optional[Entity], owner_association_attr_name: Optional[str], associates: List[Entity]) -> None:
+        if owner is None or owner_association_attr_name is None:
+            return
+        owner_association_attr_value = getattr(owner, owner_association_attr_name)
+        if isinstance(owner_association_attr_value, EntityCollection):
+            owner_association_attr_value.append(*associates)
+        else:
+            for associate in associates:
+                setattr(owner, owner_association_attr_name, associate)
 
     def unflatten(self) -> MultipleTypesEntityCollection:
         self._assert_unflattened()
@@ -833,7 +1235,9 @@ class FlattenedEntityCollection:
         self._unflatten_associations()
 
         unflattened_entities = MultipleTypesEntityCollection()
-        unflattened_entities.append(*map(unflatten, self._entities))
+        for entity_type, entities in self._entities._collections.items():
+            if len(entities):
+                unflattened_entities[entity_type].append(*map(unflatten, entities))
 
         return unflattened_entities
 
@@ -842,9 +1246,9 @@ class FlattenedEntityCollection:
 
         for entity in entities:
             if isinstance(entity, FlattenedEntity):
-                entity_type = get_entity_type(entity.unflatten())
+                entity_type = get_entity_type_by_entity(entity.unflatten())
             else:
-                entity_type = get_entity_type(entity)
+                entity_type = get_entity_type_by_entity(entity)
                 entity = self._copy_entity(entity)
             self._entities.append(entity)
 
@@ -860,7 +1264,7 @@ class FlattenedEntityCollection:
                         entity_type,
                         entity.id,
                         association_registration.attr_name,
-                        get_entity_type(associate.unflatten()) if isinstance(associate, FlattenedEntity) else get_entity_type(associate),
+                        get_entity_type_by_entity(unflatten(associate)),
                         associate.id,
                     )
                 setattr(unflatten(entity), f'_{association_registration.attr_name}', None)
@@ -871,9 +1275,9 @@ class FlattenedEntityCollection:
         assert not issubclass(associate_type, FlattenedEntity)
 
         self._associations.append(_FlattenedAssociation(
-            get_entity_type(owner_type),
+            get_entity_type_by_type(owner_type),
             owner_id,
             owner_association_attr_name,
-            get_entity_type(associate_type),
+            get_entity_type_by_type(associate_type),
             associate_id,
         ))
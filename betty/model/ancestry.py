@@ -3,14 +3,14 @@ from __future__ import annotations
 from contextlib import suppress
 from functools import total_ordering
 from pathlib import Path
-from typing import List, Optional, Set, TYPE_CHECKING, Iterable, Any
+from typing import List, Optional, Set, TYPE_CHECKING, Iterable, Any, Dict, Tuple, Iterator
 
 from geopy import Point
 
 from betty.locale import Localized, Datey
 from betty.media_type import MediaType
 from betty.model import many_to_many, Entity, one_to_many, many_to_one, many_to_one_to_many, \
-    MultipleTypesEntityCollection, EntityCollection, UserFacingEntity, EntityVariation
+    MultipleTypesEntityCollection, EntityCollection, UserFacingEntity, EntityVariation, derived_property
 from betty.model.event_type import EventType, StartOfLifeEventType, EndOfLifeEventType
 from betty.os import PathLike
 
@@ -492,17 +492,14 @@ class Event(Dated, HasFiles, HasCitations, Described, HasPrivacy, UserFacingEnti
 
     @property
     def associated_files(self) -> Iterable[File]:
-        files = [
+        yield from self._associated_files
+
+    @derived_property
+    def _associated_files(self) -> Tuple[File, ...]:
+        return tuple(_unique_files([
             *self.files,
             *[file for citation in self.citations for file in citation.associated_files],
-        ]
-        # Preserve the original order.
-        seen = set()
-        for file in files:
-            if file in seen:
-                continue
-            seen.add(file)
-            yield file
+        ]))
 
 
 @total_ordering
@@ -647,47 +644,55 @@ class Person(HasFiles, HasCitations, HasLinks, HasPrivacy, UserFacingEntity, Ent
     def alternative_names(self) -> EntityCollection[PersonName]:
         return self.names[1:]
 
-    @property
+    @derived_property
     def start(self) -> Optional[Event]:
         with suppress(StopIteration):
             return next((presence.event for presence in self.presences if isinstance(presence.event.type, StartOfLifeEventType)))
         return None
 
-    @property
+    @derived_property
     def end(self) -> Optional[Event]:
         with suppress(StopIteration):
             return next((presence.event for presence in self.presences if isinstance(presence.event.type, EndOfLifeEventType)))
         return None
 
-    @property
+    @derived_property
     def siblings(self) -> List[Person]:
-        siblings = []
+        # People are equal if their IDs are, and cannot be hashed, so they are deduplicated by ID.
+        siblings: Dict[str, Person] = {}
         for parent in self.parents:
             for sibling in parent.children:
-                if sibling != self and sibling not in siblings:
-                    siblings.append(sibling)
-        return siblings
+                if sibling.id != self.id:
+                    siblings.setdefault(sibling.id, sibling)
+        return list(siblings.values())
 
     @property
     def associated_files(self) -> Iterable[File]:
-        files = [
+        yield from self._associated_files
+
+    @derived_property
+    def _associated_files(self) -> Tuple[File, ...]:
+        return tuple(_unique_files([
             *self.files,
             *[file for name in self.names for citation in name.citations for file in citation.associated_files],
             *[file for presence in self.presences for file in presence.event.associated_files]
-        ]
-        # Preserve the original order.
-        seen = set()
-        for file in files:
-            if file in seen:
-                continue
-            seen.add(file)
-            yield file
+        ]))
 
     @property
     def label(self) -> str:
         return self.name.label if self.name else self._default_label()
 
 
+def _unique_files(files: Iterable[File]) -> Iterator[File]:
+    # Preserve the original order.
+    seen = set()
+    for file in files:
+        if file in seen:
+            continue
+        seen.add(file)
+        yield file
+
+
 class Ancestry:
     def __init__(self):
         self._entities = MultipleTypesEntityCollection()
@@ -1,14 +1,14 @@
+from __future__ import annotations
+
 import logging
+from collections import deque
 from datetime import datetime
-from typing import Optional, List, TYPE_CHECKING
-
-from betty.model import Entity
+from typing import Optional, TYPE_CHECKING, Dict, Callable, TypeVar, Set, Deque, Iterator, Tuple
 
 if TYPE_CHECKING:
     from betty.builtins import _
 
 from betty.app.extension import UserFacingExtension
-from betty.functools import walk
 from betty.load import PostLoader
 from betty.locale import DateRange, Date
 from betty.model.ancestry import Ancestry, Person, Event, Citation, Source, HasPrivacy, Subject, File, HasFiles, \
@@ -29,28 +29,24 @@ class Privatizer(UserFacingExtension, PostLoader):
 
 
 def privatize(ancestry: Ancestry, lifetime_threshold: int = 125) -> None:
-    seen: List[Entity] = []
+    person_privacy = _PersonPrivacy(lifetime_threshold)
+    # Entities whose associates must be privatized if the entities themselves are private.
+    queue: Deque[HasPrivacy] = deque()
 
     privatized = 0
     for person in ancestry.entities[Person]:
         private = person.private
-        _privatize_person(person, seen, lifetime_threshold)
+        _privatize_person(person, person_privacy, queue)
         if private is None and person.private is True:
             privatized += 1
     logger = logging.getLogger()
     logger.info('Privatized %d people because they are likely still alive.' % privatized)
 
-    for citation in ancestry.entities[Citation]:
-        _privatize_citation(citation, seen)
-
-    for source in ancestry.entities[Source]:
-        _privatize_source(source, seen)
-
-    for event in ancestry.entities[Event]:
-        _privatize_event(event, seen)
-
-    for file in ancestry.entities[File]:
-        _privatize_file(file, seen)
+    queue.extend(ancestry.entities[Citation])
+    queue.extend(ancestry.entities[Source])
+    queue.extend(ancestry.entities[Event])
+    queue.extend(ancestry.entities[File])
+    _privatize_associates(queue)
 
 
 def _mark_private(has_privacy: HasPrivacy) -> None:
@@ -59,10 +55,10 @@ def _mark_private(has_privacy: HasPrivacy) -> None:
         has_privacy.private = True
 
 
-def _privatize_person(person: Person, seen: List[Entity], lifetime_threshold: int) -> None:
+def _privatize_person(person: Person, person_privacy: _PersonPrivacy, queue: Deque[HasPrivacy]) -> None:
     # Do not change existing explicit privacy declarations.
     if person.private is None:
-        person.private = _person_is_private(person, lifetime_threshold)
+        person.private = person_privacy.is_private(person)
 
     if not person.private:
         return
@@ -70,109 +66,214 @@ def _privatize_person(person: Person, seen: List[Entity], lifetime_threshold: in
     for presence in person.presences:
         if isinstance(presence.role, Subject):
             _mark_private(presence.event)
-            _privatize_event(presence.event, seen)
-
-    _privatize_has_citations(person, seen)
-    _privatize_has_files(person, seen)
-
-
-def _privatize_event(event: Event, seen: List[Entity]) -> None:
-    if not event.private:
-        return
-
-    if event in seen:
-        return
-    seen.append(event)
-
-    _privatize_has_citations(event, seen)
-    _privatize_has_files(event, seen)
-
-
-def _privatize_has_citations(has_citations: HasCitations, seen: List[Entity]) -> None:
-    for citation in has_citations.citations:
-        _mark_private(citation)
-        _privatize_citation(citation, seen)
-
-
-def _privatize_citation(citation: Citation, seen: List[Entity]) -> None:
-    if not citation.private:
-        return
-
-    if citation in seen:
-        return
-    seen.append(citation)
-
-    _mark_private(citation.source)
-    _privatize_source(citation.source, seen)
-    _privatize_has_files(citation, seen)
-
-
-def _privatize_source(source: Source, seen: List[Entity]) -> None:
-    if not source.private:
-        return
-
-    if source in seen:
-        return
-    seen.append(source)
-
-    _privatize_has_files(source, seen)
-
-
-def _privatize_has_files(has_files: HasFiles, seen: List[Entity]) -> None:
-    for file in has_files.files:
-        _mark_private(file)
-        _privatize_file(file, seen)
-
-
-def _privatize_file(file: File, seen: List[Entity]) -> None:
-    if not file.private:
-        return
-
-    if file in seen:
-        return
-    seen.append(file)
-
-    _privatize_has_citations(file, seen)
-
-
-def _person_is_private(person: Person, lifetime_threshold: int) -> bool:
-    # A dead person is not private, regardless of when they died.
-    if person.end is not None:
-        if person.end.date is None:
+            queue.append(presence.event)
+
+    for associate in _get_privatizable_associates(person):
+        _mark_private(associate)
+        queue.append(associate)
+
+
+def _privatize_associates(queue: Deque[HasPrivacy]) -> None:
+    """
+    Privatize the associates of all private entities in the queue, and theirs, and so on.
+
+    Entities are privatized iteratively rather than recursively, and each entity's associates are privatized once only.
+    """
+    seen: Set[int] = set()
+    while queue:
+        entity = queue.popleft()
+        if not entity.private:
+            continue
+        if id(entity) in seen:
+            continue
+        seen.add(id(entity))
+        for associate in _get_privatizable_associates(entity):
+            _mark_private(associate)
+            queue.append(associate)
+
+
+def _get_privatizable_associates(entity: HasPrivacy) -> Iterator[HasPrivacy]:
+    if isinstance(entity, Citation):
+        yield entity.source
+    if isinstance(entity, HasCitations):
+        yield from entity.citations
+    if isinstance(entity, HasFiles):
+        yield from entity.files
+
+
+_T = TypeVar('_T')
+
+
+class _PersonPrivacy:
+    """
+    Determine whether people are private.
+
+    People are not private if they or any of their relatives can be proven to have died. Rather than checking all
+    ancestors and descendants for each person, the relevant facts are computed once per person and shared with their
+    relatives, so that determining the privacy of everyone in a family tree takes linear time.
+    """
+
+    # Expiry is checked for generations up to this multiplier of the lifetime threshold only, which far exceeds the
+    # number of generations in any family tree.
+    _MAX_MULTIPLIER = 2 ** 31
+
+    def __init__(self, lifetime_threshold: int):
+        self._lifetime_threshold = lifetime_threshold
+        self._now = datetime.now()
+        # The comparable threshold dates, keyed by lifetime threshold multiplier.
+        self._thresholds: Dict[int, _ComparableDate] = {}
+        # All other caches are keyed by person identity.
+        self._earliest_dates: Dict[int, Optional[_ComparableDate]] = {}
+        self._expired_multipliers: Dict[int, int] = {}
+        self._expired_ancestor_margins: Dict[int, int] = {}
+        self._expired_descendants: Dict[int, bool] = {}
+
+    def is_private(self, person: Person) -> bool:
+        # A dead person is not private, regardless of when they died.
+        if person.end is not None:
+            if person.end.date is None:
+                return False
+            if self._has_expired(_get_comparable_event_date(person.end), 0):
+                return False
+
+        if self._get_expired_multiplier(person) >= 1:
             return False
-        if _event_has_expired(person.end, lifetime_threshold, 0):
-            return False
-
-    if _person_has_expired(person, lifetime_threshold, 1):
-        return False
 
-    def ancestors(person: Person, generation: int = -1):
-        for parent in person.parents:
-            yield generation, parent
-            yield from ancestors(parent, generation - 1)
-
-    for generation, ancestor in ancestors(person):
-        if _person_has_expired(ancestor, lifetime_threshold, abs(generation) + 1):
+        if self._get_expired_ancestor_margin(person) >= 0:
             return False
 
-    # If any descendant has any expired event, the person is considered not private.
-    for descendant in walk(person, 'children'):
-        if _person_has_expired(descendant, lifetime_threshold, 1):
+        # If any descendant has any expired event, the person is considered not private.
+        if self._has_expired_descendant(person):
             return False
 
-    return True
-
+        return True
 
-def _person_has_expired(person: Person, lifetime_threshold: int, multiplier: int) -> bool:
-    for presence in person.presences:
-        if _event_has_expired(presence.event, lifetime_threshold, multiplier):
-            return True
-    return False
+    def _get_threshold(self, multiplier: int) -> _ComparableDate:
+        try:
+            return self._thresholds[multiplier]
+        except KeyError:
+            threshold = self._thresholds[multiplier] = (
+                self._now.year - self._lifetime_threshold * multiplier,
+                self._now.month,
+                self._now.day,
+                0,
+            )
+            return threshold
 
+    def _has_expired(self, date: Optional[_ComparableDate], multiplier: int) -> bool:
+        assert multiplier >= 0
 
-def _event_has_expired(event: Event, lifetime_threshold: int, multiplier: int) -> bool:
-    assert multiplier >= 0
+        if date is None:
+            return False
 
+        return date <= self._get_threshold(multiplier)
+
+    def _get_earliest_date(self, person: Person) -> Optional[_ComparableDate]:
+        """
+        Get the earliest comparable date of any of a person's events.
+
+        The earliest date determines whether any of the events have expired.
+        """
+        try:
+            return self._earliest_dates[id(person)]
+        except KeyError:
+            pass
+        earliest_date = min(
+            filter(None, (_get_comparable_event_date(presence.event) for presence in person.presences)),
+            default=None,
+        )
+        self._earliest_dates[id(person)] = earliest_date
+        return earliest_date
+
+    def _get_expired_multiplier(self, person: Person) -> int:
+        """
+        Get the greatest lifetime threshold multiplier for which any of a person's events has expired, or 0.
+
+        Events that have expired for a multiplier have expired for all smaller multipliers as well, so the greatest
+        multiplier is found by doubling it, and then by bisecting the last interval.
+        """
+        try:
+            return self._expired_multipliers[id(person)]
+        except KeyError:
+            pass
+        earliest_date = self._get_earliest_date(person)
+        expired_multiplier = 0
+        unexpired_multiplier = 1
+        while unexpired_multiplier <= self._MAX_MULTIPLIER and self._has_expired(earliest_date, unexpired_multiplier):
+            expired_multiplier = unexpired_multiplier
+            unexpired_multiplier *= 2
+        while unexpired_multiplier - expired_multiplier > 1:
+            multiplier = (expired_multiplier + unexpired_multiplier) // 2
+            if self._has_expired(earliest_date, multiplier):
+                expired_multiplier = multiplier
+            else:
+                unexpired_multiplier = multiplier
+        self._expired_multipliers[id(person)] = expired_multiplier
+        return expired_multiplier
+
+    def _get_expired_ancestor_margin(self, person: Person) -> int:
+        """
+        Get by how many generations a person's ancestors expired before they had to, or a negative number.
+
+        An ancestor N generations up has expired if any of their events expired for a multiplier of N + 1. The margin
+        is the greatest difference between any ancestor's expired multiplier and N + 1, so a person has an expired
+        ancestor if the margin is zero or greater. Through a parent, a person's margin is one less than the parent's own
+        margin.
+        """
+        return self._resolve(
+            person,
+            'parents',
+            self._expired_ancestor_margins,
+            -1,
+            lambda margin, parent, parent_margin: max(margin, self._get_expired_multiplier(parent) - 2, parent_margin - 1),
+        )
+
+    def _has_expired_descendant(self, person: Person) -> bool:
+        return self._resolve(
+            person,
+            'children',
+            self._expired_descendants,
+            False,
+            lambda expired, child, child_expired: expired or child_expired or self._get_expired_multiplier(child) >= 1,
+        )
+
+    def _resolve(self, person: Person, relatives_attr_name: str, results: Dict[int, _T], default: _T, combine: Callable[[_T, Person, _T], _T]) -> _T:
+        """
+        Resolve a value for a person from the values of their relatives, and cache it for all of them.
+
+        This traverses the relatives depth-first without recursion, so it supports family trees of any depth. Any
+        relationship cycles are broken by using the default value for the relative that closes the cycle.
+        """
+        stack = [person]
+        in_progress: Set[int] = set()
+        while stack:
+            current = stack[-1]
+            if id(current) in results:
+                stack.pop()
+                continue
+            relatives = getattr(current, relatives_attr_name)
+            if id(current) not in in_progress:
+                in_progress.add(id(current))
+                stack.extend(
+                    relative
+                    for relative in relatives
+                    if id(relative) not in results and id(relative) not in in_progress
+                )
+                continue
+            stack.pop()
+            result = default
+            for relative in relatives:
+                result = combine(result, relative, results.get(id(relative), default))
+            results[id(current)] = result
+        return results[id(person)]
+
+
+# A date's year, month, and day, followed by 0 for complete dates, or 1 for incomplete dates. Incomplete dates are
+# represented by their earliest possible day, and must come before any date they are compared to, rather than on it.
+_ComparableDate = Tuple[int, int, int, int]
+
+
+def _get_comparable_event_date(event: Event) -> Optional[_ComparableDate]:
     date = event.date
 
     if isinstance(date, DateRange):
@@ -181,16 +282,16 @@ def _event_has_expired(event: Event, lifetime_threshold: int, multiplier: int) -
         # expiration.
         date = date.end
 
-    return _date_has_expired(date, lifetime_threshold, multiplier)
-
+    return _get_comparable_date(date)
 
-def _date_has_expired(date: Optional[Date], lifetime_threshold: int, multiplier: int) -> bool:
-    assert multiplier >= 0
 
+def _get_comparable_date(date: Optional[Date]) -> Optional[_ComparableDate]:
     if date is None:
-        return False
+        return None
 
     if not date.comparable:
-        return False
+        return None
 
-    return date <= Date(datetime.now().year - lifetime_threshold * multiplier, datetime.now().month, datetime.now().day)
+    if date.complete:
+        return date.year, date.month, date.day, 0  # type: ignore[return-value]
+    return date.year, 1 if date.month is None else date.month, 1 if date.day is None else date.day, 1  # type: ignore[return-value]
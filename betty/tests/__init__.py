@@ -1,9 +1,11 @@
 import functools
+import gc
 import inspect
+import time
 from contextlib import contextmanager, ExitStack
 from pathlib import Path
 from tempfile import TemporaryDirectory
-from typing import Optional, Dict, Callable, ContextManager, Iterator, Tuple, TypeVar, Set, Type
+from typing import Optional, Dict, Callable, ContextManager, Iterator, Tuple, TypeVar, Set, Type, Any
 
 from jinja2.environment import Template
 
@@ -32,6 +34,33 @@ def patch_cache(f):
     return _patch_cache
 
 
+def _time(subject: Callable[[], Any]) -> float:
+    # Like timeit, disable garbage collection so it does not skew the duration.
+    gc.collect()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        subject()
+        return time.perf_counter() - start
+    finally:
+        gc.enable()
+
+
+def assert_scales_linearly(build: Callable[[int], Callable[[], Any]], size: int) -> None:
+    """
+    Assert that a benchmark subject scales linearly.
+
+    :param build: Builds a benchmark subject of the given size.
+    :param size: The size of the largest benchmark subject.
+
+    The subject is benchmarked at a quarter of its size and at its full size. Quadrupling the size must take roughly
+    four times as long, and not sixteen times, regardless of how fast the machine is.
+    """
+    small_duration = _time(build(size // 4))
+    large_duration = _time(build(size))
+    assert large_duration < small_duration * 10, f'Size {size} took {large_duration:.2f} seconds, but size {size // 4} took {small_duration:.2f} seconds.'
+
+
 class TemplateTestCase:
     template_string: Optional[str] = None
     template_file: Optional[str] = None
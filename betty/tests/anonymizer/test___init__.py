@@ -34,6 +34,36 @@ class TestAnonymousSource:
             assert files == list(sut.files)
             assert other not in ancestry.entities
 
+    def test_replace_in_bulk(self):
+        with App():
+            ancestry = Ancestry()
+            citation1 = Citation(None, Source(None))
+            citation2 = Citation(None, Source(None))
+            file = File('F1', __file__)
+            sut = AnonymousSource()
+            other1 = Source(None)
+            other1.citations = [citation1]  # type: ignore
+            other1.files = [file]  # type: ignore
+            other2 = Source(None)
+            other2.citations = [citation2]  # type: ignore
+            other2.files = [file]  # type: ignore
+            other2.contains = [other1]  # type: ignore
+            ancestry.entities.append(other1, other2)
+            with sut.replace_in_bulk(ancestry):
+                sut.replace(other1, ancestry)
+                sut.replace(other2, ancestry)
+                assert [] == list(other1.citations)
+                assert [] == list(sut.citations)
+                assert other1 in ancestry.entities
+            assert [citation1, citation2] == list(sut.citations)
+            assert sut is citation1.source
+            assert [file] == list(sut.files)
+            # Replaced sources lose their associations with each other.
+            assert [] == list(sut.contains)
+            assert other1.contained_by is None
+            assert other1 not in ancestry.entities
+            assert other2 not in ancestry.entities
+
 
 class TestAnonymousCitation:
     def test_location(self):
@@ -58,6 +88,33 @@ class TestAnonymousCitation:
         assert files == list(sut.files)
         assert other not in ancestry.entities
 
+    def test_replace_in_bulk(self):
+        class _HasCitations(HasCitations, Entity):
+            pass
+        ancestry = Ancestry()
+        fact1 = _HasCitations()
+        fact2 = _HasCitations()
+        file = File('F1', __file__)
+        source = Mock(Source)
+        sut = AnonymousCitation(source)
+        other1 = Citation(None, source)
+        other1.facts = [fact1, fact2]  # type: ignore
+        other1.files = [file]  # type: ignore
+        other2 = Citation(None, source)
+        other2.facts = [fact2]  # type: ignore
+        ancestry.entities.append(other1, other2)
+        with sut.replace_in_bulk(ancestry):
+            sut.replace(other1, ancestry)
+            sut.replace(other2, ancestry)
+            assert [] == list(other1.facts)
+            assert [] == list(sut.facts)
+            assert other1 in ancestry.entities
+        assert [fact1, fact2] == list(sut.facts)
+        assert [sut] == list(fact2.citations)
+        assert [file] == list(sut.files)
+        assert other1 not in ancestry.entities
+        assert other2 not in ancestry.entities
+
 
 class TestAnonymize:
     @patch('betty.anonymizer.anonymize_person')
@@ -337,3 +337,79 @@ class TestClean:
         assert file == ancestry.entities[File][file.id]
         assert citation in source.citations
         assert source == ancestry.entities[Source][source.id]
+
+    def test_clean_should_clean_enclosing_places_without_events(self) -> None:
+        ancestry = Ancestry()
+
+        enclosed_place = Place('P0', [PlaceName('The Place')])
+        places = [enclosed_place]
+        # Places may be enclosed by many generations of places, far beyond the recursion limit.
+        for generation in range(5000):
+            enclosing_place = Place(f'P{generation + 1}', [PlaceName('The Place')])
+            Enclosure(enclosed_place, enclosing_place)
+            places.append(enclosing_place)
+            enclosed_place = enclosing_place
+        ancestry.entities.append(*reversed(places))
+
+        clean(ancestry)
+
+        assert [] == list(ancestry.entities[Place])
+
+    def test_clean_should_not_clean_enclosing_places_with_events(self) -> None:
+        ancestry = Ancestry()
+
+        place = Place('P0', [PlaceName('The Place')])
+        ancestry.entities.append(place)
+        enclosing_place = Place('P1', [PlaceName('The Enclosing Place')])
+        Enclosure(place, enclosing_place)
+        ancestry.entities.append(enclosing_place)
+        other_enclosed_place = Place('P2', [PlaceName('The Other Place')])
+        Enclosure(other_enclosed_place, enclosing_place)
+        ancestry.entities.append(other_enclosed_place)
+        event = Event('E0', Birth())
+        event.place = other_enclosed_place
+        Presence(Person('P0'), Subject(), event)
+        ancestry.entities.append(event)
+
+        clean(ancestry)
+
+        assert [enclosing_place, other_enclosed_place] == list(ancestry.entities[Place])
+
+    def test_clean_should_clean_source_of_cleaned_citation(self) -> None:
+        ancestry = Ancestry()
+
+        source = Source('S0', 'The Source')
+        ancestry.entities.append(source)
+        citation = Citation('C0', source)
+        ancestry.entities.append(citation)
+        event = Event('E0', Birth())
+        event.citations.append(citation)
+        ancestry.entities.append(event)
+
+        clean(ancestry)
+
+        assert [] == list(ancestry.entities[Event])
+        assert [] == list(ancestry.entities[Citation])
+        assert citation not in source.citations
+        assert [] == list(ancestry.entities[Source])
+
+    def test_clean_should_not_clean_source_of_citation_with_files(self) -> None:
+        ancestry = Ancestry()
+
+        source = Source('S0', 'The Source')
+        ancestry.entities.append(source)
+        citation = Citation('C0', source)
+        ancestry.entities.append(citation)
+        file = File('F0', __file__)
+        citation.files.append(file)
+        ancestry.entities.append(file)
+        event = Event('E0', Birth())
+        event.citations.append(citation)
+        ancestry.entities.append(event)
+
+        clean(ancestry)
+
+        assert [] == list(ancestry.entities[Event])
+        assert [citation] == list(ancestry.entities[Citation])
+        assert [file] == list(ancestry.entities[File])
+        assert [source] == list(ancestry.entities[Source])
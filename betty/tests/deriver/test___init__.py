@@ -1,9 +1,10 @@
 from typing import Optional, Set, Type, Iterator
 
 import pytest
+from pytest_mock import MockerFixture
 
 from betty.app import App
-from betty.deriver import Deriver
+from betty.deriver import Deriver, _EventTypeIndex, _PersonEvents
 from betty.load import load
 from betty.locale import DateRange, Date, Datey
 from betty.model.ancestry import Person, Presence, Subject, EventType, Event
@@ -320,3 +321,61 @@ class TestDerive:
         assert expected_creations == created
         assert 0 == updated
         assert 2 + expected_creations == len(person.presences)
+
+
+class TestEventTypeIndex:
+    def test_comes_before(self) -> None:
+        sut = _EventTypeIndex([ComesAfterDerivable])
+        assert {ComesAfterDerivable} == set(sut.comes_before(ComesAfterReference))
+
+    def test_comes_before_should_include_own_declarations(self) -> None:
+        sut = _EventTypeIndex([])
+        assert {ComesBeforeReference} == set(sut.comes_before(ComesBeforeDerivable))
+
+    def test_comes_after(self) -> None:
+        sut = _EventTypeIndex([ComesBeforeDerivable])
+        assert {ComesBeforeDerivable} == set(sut.comes_after(ComesBeforeReference))
+
+    def test_comes_after_should_include_own_declarations(self) -> None:
+        sut = _EventTypeIndex([])
+        assert {ComesAfterReference} == set(sut.comes_after(ComesAfterDerivable))
+
+    def test_is_any(self) -> None:
+        sut = _EventTypeIndex([])
+        assert sut.is_any(ComesBeforeCreatableDerivable, (Ignored, ComesBeforeDerivable))
+        assert not sut.is_any(ComesBeforeDerivable, (Ignored, ComesBeforeCreatableDerivable))
+
+
+class TestPersonEvents:
+    def test_get_should_return_events_in_presence_order(self) -> None:
+        person = Person('P0')
+        event_1 = Event(None, ComesBeforeReference())
+        event_2 = Event(None, Ignored())
+        event_3 = Event(None, ComesAfterReference())
+        event_4 = Event(None, ComesBeforeReference())
+        for event in (event_1, event_2, event_3, event_4):
+            Presence(person, Subject(), event)
+        sut = _PersonEvents(person)
+        assert [event_1, event_3, event_4] == sut.get(_EventTypeIndex([]), (ComesAfterReference, ComesBeforeReference))
+
+    def test_add(self) -> None:
+        person = Person('P0')
+        event_1 = Event(None, ComesBeforeReference())
+        Presence(person, Subject(), event_1)
+        sut = _PersonEvents(person)
+        event_2 = Event(None, ComesBeforeReference())
+        sut.add(event_2)
+        assert [event_1, event_2] == sut.get(_EventTypeIndex([]), (ComesBeforeReference,))
+
+
+class TestDeriveAncestry:
+    async def test_derive_should_index_event_types_once(self, mocker: MockerFixture, test_derive_app: App) -> None:
+        for i in range(100):
+            person = Person(f'P{i}')
+            Presence(person, Subject(), Event(None, Residence(), Date(1970, 1, 1)))
+            test_derive_app.project.ancestry.entities.append(person)
+        comes_before = mocker.spy(Residence, 'comes_before')
+
+        await test_derive_app.extensions[Deriver].derive(test_derive_app.project.ancestry)
+
+        assert 1 == comes_before.call_count
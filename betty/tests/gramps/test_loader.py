@@ -1,17 +1,123 @@
+import os
+import shutil
 from pathlib import Path
 from tempfile import TemporaryDirectory
-from typing import Optional
+from typing import Optional, Set
 
 import pytest
+from pytest_mock import MockerFixture
 
 from betty.app import App
-from betty.gramps.loader import load_xml, load_gpkg, load_gramps
+from betty.gramps import loader
+from betty.gramps.loader import load_xml, load_gpkg, load_gramps, load_file, GrampsLoadFileError
 from betty.locale import Date, DateRange
+from betty.model import Entity, GeneratedEntityId
 from betty.model.ancestry import Ancestry, PersonName, Citation, Note, Source, File, Event, Person, Place
 from betty.model.event_type import Birth, Death, UnknownEventType
 from betty.path import rootname
 
 
+class TestLoadFile:
+    def _get_generated_entity_ids(self, ancestry: Ancestry) -> Set[str]:
+        generated_entity_ids: Set[str] = set()
+        entity: Entity
+        for entity in ancestry.entities:
+            if isinstance(entity.id, GeneratedEntityId):
+                generated_entity_ids.add(entity.id)
+        return generated_entity_ids
+
+    async def test_load_file(self):
+        with App() as app:
+            gramps_file_path = Path(__file__).parent / 'assets' / 'minimal.gpkg'
+            await load_file(app.project.ancestry, gramps_file_path)
+            assert 0 < len(app.project.ancestry.entities)
+
+    async def test_load_file_with_cache(self, mocker: MockerFixture):
+        with TemporaryDirectory() as working_directory_path_str:
+            working_directory_path = Path(working_directory_path_str)
+            gramps_file_path = working_directory_path / 'minimal.gramps'
+            shutil.copyfile(Path(__file__).parent / 'assets' / 'minimal.gramps', gramps_file_path)
+            cache_directory_path = working_directory_path / 'cache'
+
+            with App() as app:
+                await load_file(app.project.ancestry, gramps_file_path, cache_directory_path)
+                parsed_ancestry = app.project.ancestry
+
+            m_parse_file = mocker.patch('betty.gramps.loader._parse_file')
+            with App() as app:
+                await load_file(app.project.ancestry, gramps_file_path, cache_directory_path)
+                restored_ancestry = app.project.ancestry
+            m_parse_file.assert_not_called()
+
+            assert 0 < len(restored_ancestry.entities)
+            for entity_type in (Person, Event, Place, File):
+                assert [entity.id for entity in parsed_ancestry.entities[entity_type]] == [entity.id for entity in restored_ancestry.entities[entity_type]]
+            assert 'Janet' == restored_ancestry.entities[Person]['I0000'].names[0].individual
+
+    async def test_load_file_with_cache_should_generate_new_entity_ids(self):
+        with TemporaryDirectory() as working_directory_path_str:
+            cache_directory_path = Path(working_directory_path_str)
+            gramps_file_path = Path(__file__).parent / 'assets' / 'minimal.gramps'
+
+            with App() as app:
+                await load_file(app.project.ancestry, gramps_file_path, cache_directory_path)
+                parsed_generated_entity_ids = self._get_generated_entity_ids(app.project.ancestry)
+            with App() as app:
+                await load_file(app.project.ancestry, gramps_file_path, cache_directory_path)
+                restored_generated_entity_ids = self._get_generated_entity_ids(app.project.ancestry)
+            assert 0 < len(restored_generated_entity_ids)
+            assert not parsed_generated_entity_ids & restored_generated_entity_ids
+
+    async def test_load_file_with_cache_should_keep_entity_ids_generated_in_the_same_sequence(self, mocker: MockerFixture):
+        with TemporaryDirectory() as working_directory_path_str:
+            cache_directory_path = Path(working_directory_path_str)
+            gramps_file_path = Path(__file__).parent / 'assets' / 'minimal.gramps'
+
+            mocker.patch.object(GeneratedEntityId, '_last_id', 0)
+            with App() as app:
+                await load_file(app.project.ancestry, gramps_file_path, cache_directory_path)
+                parsed_entity_ids = [entity.id for entity in app.project.ancestry.entities]
+            last_generated_entity_id = GeneratedEntityId._last_id
+
+            # Like a separate process that loads the same project.
+            GeneratedEntityId._last_id = 0
+            with App() as app:
+                await load_file(app.project.ancestry, gramps_file_path, cache_directory_path)
+                restored_entity_ids = [entity.id for entity in app.project.ancestry.entities]
+            assert 0 < len(self._get_generated_entity_ids(app.project.ancestry))
+            assert parsed_entity_ids == restored_entity_ids
+            assert last_generated_entity_id == GeneratedEntityId._last_id
+
+    async def test_load_file_with_cache_should_be_invalidated_when_the_file_changes(self, mocker: MockerFixture):
+        with TemporaryDirectory() as working_directory_path_str:
+            working_directory_path = Path(working_directory_path_str)
+            gramps_file_path = working_directory_path / 'minimal.gramps'
+            shutil.copyfile(Path(__file__).parent / 'assets' / 'minimal.gramps', gramps_file_path)
+            cache_directory_path = working_directory_path / 'cache'
+
+            with App() as app:
+                await load_file(app.project.ancestry, gramps_file_path, cache_directory_path)
+
+            file_stat = gramps_file_path.stat()
+            os.utime(gramps_file_path, ns=(file_stat.st_atime_ns, file_stat.st_mtime_ns + 1000000000))
+            m_parse_file = mocker.patch('betty.gramps.loader._parse_file', wraps=loader._parse_file)
+            with App() as app:
+                await load_file(app.project.ancestry, gramps_file_path, cache_directory_path)
+            m_parse_file.assert_called_once()
+
+    async def test_load_file_with_corrupt_cache(self):
+        with TemporaryDirectory() as working_directory_path_str:
+            cache_directory_path = Path(working_directory_path_str)
+            gramps_file_path = Path(__file__).parent / 'assets' / 'minimal.gramps'
+            with App() as app:
+                await load_file(app.project.ancestry, gramps_file_path, cache_directory_path)
+            for snapshot_file_path in cache_directory_path.iterdir():
+                snapshot_file_path.write_bytes(snapshot_file_path.read_bytes()[:-16])
+            with App() as app:
+                await load_file(app.project.ancestry, gramps_file_path, cache_directory_path)
+                assert 0 < len(app.project.ancestry.entities)
+
+
 class TestLoadGramps:
     def test_load_gramps(self):
         with App() as app:
@@ -69,6 +175,35 @@ class TestLoadXml:
             gramps_file_path = Path(__file__).parent / 'assets' / 'minimal.xml'
             load_xml(app.project.ancestry, gramps_file_path, rootname(gramps_file_path))
 
+    def test_load_xml_with_file_object(self):
+        with App() as app:
+            gramps_file_path = Path(__file__).parent / 'assets' / 'minimal.xml'
+            with open(gramps_file_path, 'rb') as f:
+                load_xml(app.project.ancestry, f, rootname(gramps_file_path))
+
+    def test_load_xml_with_sections_in_any_order(self):
+        ancestry = self._load_partial("""
+<families>
+    <family handle="_F0000" id="F0000">
+        <father hlink="_I0000"/>
+        <childref hlink="_I0001"/>
+    </family>
+</families>
+<people>
+    <person handle="_I0000" id="I0000">
+    </person>
+    <person handle="_I0001" id="I0001">
+    </person>
+</people>
+""")
+        parent = ancestry.entities[Person]['I0000']
+        child = ancestry.entities[Person]['I0001']
+        assert [parent] == list(child.parents)
+
+    def test_load_xml_with_invalid_xml(self):
+        with pytest.raises(GrampsLoadFileError):
+            self.load('<database>')
+
     def test_place_should_include_name(self, test_load_xml_ancestry):
         place = test_load_xml_ancestry.entities[Place]['P0000']
         names = place.names
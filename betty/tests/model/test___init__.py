@@ -2,16 +2,18 @@ from __future__ import annotations
 
 import copy
 import pickle
-from typing import Optional, Any, Iterator, Tuple, List
+from typing import Optional, Any, Iterator, Tuple, List, Callable
 
 import pytest
+from pytest_mock import MockerFixture
 
 from betty.model import GeneratedEntityId, get_entity_type_name, Entity, get_entity_type, _EntityTypeAssociation, \
     _EntityTypeAssociationRegistry, SingleTypeEntityCollection, _AssociateCollection, MultipleTypesEntityCollection, \
     one_to_many, many_to_one_to_many, FlattenedEntityCollection, many_to_many, \
     EntityCollection, to_many, many_to_one, to_one, one_to_one, EntityVariation, EntityTypeInvalidError, \
-    EntityTypeImportError
+    EntityTypeImportError, derived_property, _record_reads
 from betty.model.ancestry import Person
+from betty.tests import assert_scales_linearly
 
 
 class TestGeneratedEntityid:
@@ -53,6 +55,15 @@ class TestGetEntityTypeName:
     def test_with_other_entity(self) -> None:
         assert 'betty.tests.model.test___init__.GetEntityTypeNameTestEntity' == get_entity_type_name(GetEntityTypeNameTestEntity)
 
+    def test_with_entity(self) -> None:
+        assert 'Person' == get_entity_type_name(Person('P0'))
+
+    def test_with_entity_type_name(self) -> None:
+        assert 'betty.tests.model.test___init__.GetEntityTypeNameTestEntity' == get_entity_type_name('betty.tests.model.test___init__.GetEntityTypeNameTestEntity')
+
+    def test_should_return_the_same_name_repeatedly(self) -> None:
+        assert get_entity_type_name(GetEntityTypeNameTestEntity) == get_entity_type_name(GetEntityTypeNameTestEntity)
+
 
 class GetEntityTypeTestEntity(Entity):
     pass
@@ -81,6 +92,18 @@ class TestGetEntityType:
         with pytest.raises(EntityTypeImportError):
             get_entity_type('betty_non_existent.UnknownEntity')
 
+    def test_with_unknown_entity_should_raise_error_repeatedly(self) -> None:
+        for __ in range(2):
+            with pytest.raises(EntityTypeImportError):
+                get_entity_type('betty_non_existent.UnknownEntity')
+
+    def test_with_entity(self) -> None:
+        assert GetEntityTypeTestEntityVariationEntity == get_entity_type(GetEntityTypeTestEntityVariationEntity())
+
+    def test_with_entity_type_name_should_return_the_same_type_repeatedly(self) -> None:
+        for __ in range(2):
+            assert Person is get_entity_type('Person')
+
     def test_without_subclass(self) -> None:
         with pytest.raises(EntityTypeInvalidError):
             get_entity_type(Entity)
@@ -99,6 +122,11 @@ class TestGetEntityType:
         with pytest.raises(EntityTypeInvalidError):
             get_entity_type(GetEntityTypeTestInvalidEntityAndEntityVariationSubclass)
 
+    def test_with_invalid_entity_type_should_raise_error_repeatedly(self) -> None:
+        for __ in range(2):
+            with pytest.raises(EntityTypeInvalidError):
+                get_entity_type(GetEntityTypeTestEntityVariation)
+
 
 class Test_EntityTypeAssociationRegistry:
     class _ParentEntity(Entity):
@@ -114,8 +142,8 @@ class Test_EntityTypeAssociationRegistry:
         child_registration = _EntityTypeAssociation(self._ChildEntity, 'child_associate', _EntityTypeAssociation.Cardinality.MANY)
         _EntityTypeAssociationRegistry.register(child_registration)
         yield parent_registration, child_registration
-        _EntityTypeAssociationRegistry._registrations.remove(parent_registration)
-        _EntityTypeAssociationRegistry._registrations.remove(child_registration)
+        _EntityTypeAssociationRegistry.unregister(parent_registration)
+        _EntityTypeAssociationRegistry.unregister(child_registration)
 
     def test_get_associations_with_parent_class_should_return_parent_associations(self, registrations) -> None:
         parent_registration, _ = registrations
@@ -125,6 +153,31 @@ class Test_EntityTypeAssociationRegistry:
         parent_registration, child_registration = registrations
         assert {parent_registration, child_registration} == _EntityTypeAssociationRegistry.get_associations(self._ChildEntity)
 
+    def test_get_associations_should_include_new_registrations(self, registrations) -> None:
+        parent_registration, child_registration = registrations
+        # Ensure the associations have been built before registering a new one.
+        assert {parent_registration, child_registration} == _EntityTypeAssociationRegistry.get_associations(self._ChildEntity)
+        new_registration = _EntityTypeAssociation(self._ParentEntity, 'new_associate', _EntityTypeAssociation.Cardinality.ONE)
+        _EntityTypeAssociationRegistry.register(new_registration)
+        try:
+            assert {parent_registration, child_registration, new_registration} == _EntityTypeAssociationRegistry.get_associations(self._ChildEntity)
+        finally:
+            _EntityTypeAssociationRegistry.unregister(new_registration)
+        assert {parent_registration, child_registration} == _EntityTypeAssociationRegistry.get_associations(self._ChildEntity)
+
+    def test_get_associations_should_build_associations_once_per_class(self, mocker: MockerFixture) -> None:
+        m_build_associations = mocker.patch.object(
+            _EntityTypeAssociationRegistry,
+            '_build_associations',
+            wraps=_EntityTypeAssociationRegistry._build_associations,
+        )
+        _EntityTypeAssociationRegistry._associations.clear()
+        flattened_entities = FlattenedEntityCollection()
+        # Person has associations, as well as associate collections that must be copied.
+        flattened_entities.add_entity(*[Person(f'P{i}') for i in range(1000)])
+        flattened_entities.unflatten()
+        assert 1 == m_build_associations.call_count
+
 
 class SingleTypeEntityCollectionTestEntity(Entity):
     pass
@@ -191,6 +244,42 @@ class TestSingleTypeEntityCollection:
         sut.remove(entity4, entity2)
         assert [entity1, entity3] == list(sut)
 
+    def test_remove_many(self) -> None:
+        sut = SingleTypeEntityCollection(Entity)
+        entity1 = SingleTypeEntityCollectionTestEntity()
+        entity2 = SingleTypeEntityCollectionTestEntity()
+        entity3 = SingleTypeEntityCollectionTestEntity()
+        entity4 = SingleTypeEntityCollectionTestEntity()
+        entity5 = SingleTypeEntityCollectionTestEntity()
+        sut.append(entity1, entity2, entity3, entity4)
+        sut.remove_many([entity4, entity2, entity4, entity5])
+        assert [entity1, entity3] == list(sut)
+        assert entity2.id not in sut
+        assert entity3 is sut[entity3.id]
+
+    def test_remove_many_should_compact(self) -> None:
+        sut = SingleTypeEntityCollection(Entity)
+        entity1 = SingleTypeEntityCollectionTestEntity('E1')
+        entity2 = SingleTypeEntityCollectionTestEntity('E2')
+        entity3 = SingleTypeEntityCollectionTestEntity('E3')
+        entity4 = SingleTypeEntityCollectionTestEntity('E4')
+        sut.append(entity1, entity2, entity3, entity4)
+        # Index the entities by ID before compacting.
+        assert entity1 is sut['E1']
+        sut.remove_many([entity1, entity2, entity4])
+        assert [entity3] == list(sut)
+        assert 'E1' not in sut
+        assert entity3 is sut['E3']
+
+    def test_remove_where(self) -> None:
+        sut = SingleTypeEntityCollection(Entity)
+        entity1 = SingleTypeEntityCollectionTestEntity('E1')
+        entity2 = SingleTypeEntityCollectionTestEntity('E2')
+        entity3 = SingleTypeEntityCollectionTestEntity('E3')
+        sut.append(entity1, entity2, entity3)
+        sut.remove_where(lambda entity: entity.id != 'E2')
+        assert [entity2] == list(sut)
+
     def test_replace(self) -> None:
         sut = SingleTypeEntityCollection(Entity)
         entity1 = SingleTypeEntityCollectionTestEntity()
@@ -270,6 +359,89 @@ class TestSingleTypeEntityCollection:
         with pytest.raises(KeyError):
             sut['4']
 
+    def test_getitem_by_entity_id_with_duplicate_ids(self) -> None:
+        sut = SingleTypeEntityCollection(Entity)
+        entity1 = SingleTypeEntityCollectionTestEntity('1')
+        entity2 = SingleTypeEntityCollectionTestEntity('1')
+        entity3 = SingleTypeEntityCollectionTestEntity('1')
+        sut.append(entity1, entity2)
+        assert entity1 is sut['1']
+        sut.prepend(entity3)
+        assert entity3 is sut['1']
+        sut.remove(entity3, entity1)
+        assert entity2 is sut['1']
+        sut.remove(entity2)
+        assert '1' not in sut
+
+    def test_pickle_should_retain_indexes(self) -> None:
+        sut = SingleTypeEntityCollection(Entity)
+        entity = SingleTypeEntityCollectionTestEntity('1')
+        sut.append(entity)
+        unpickled_sut = pickle.loads(pickle.dumps(sut))
+        unpickled_entity = unpickled_sut[0]
+        assert unpickled_entity in unpickled_sut
+        assert unpickled_entity is unpickled_sut['1']
+        unpickled_sut.append(unpickled_entity)
+        assert 1 == len(unpickled_sut)
+        unpickled_sut.remove(unpickled_entity)
+        assert 0 == len(unpickled_sut)
+
+    def test_iter_should_allow_removal(self) -> None:
+        sut = SingleTypeEntityCollection(Entity)
+        entity1 = SingleTypeEntityCollectionTestEntity()
+        entity2 = SingleTypeEntityCollectionTestEntity()
+        sut.append(entity1, entity2)
+        for entity in sut:
+            sut.remove(entity)
+        assert 0 == len(sut)
+
+    def test_iter_should_allow_addition(self) -> None:
+        sut = SingleTypeEntityCollection(Entity)
+        entity1 = SingleTypeEntityCollectionTestEntity()
+        entity2 = SingleTypeEntityCollectionTestEntity()
+        entity3 = SingleTypeEntityCollectionTestEntity()
+        sut.append(entity1)
+        assert [entity1] == list(sut)
+        for __ in sut:
+            sut.prepend(entity2)
+            sut.append(entity3)
+        assert [entity2, entity1, entity3] == list(sut)
+
+    def test_prepend_and_append(self) -> None:
+        sut = SingleTypeEntityCollection(Entity)
+        entities = [SingleTypeEntityCollectionTestEntity() for __ in range(6)]
+        sut.append(entities[3])
+        sut.prepend(entities[2])
+        sut.append(entities[4])
+        sut.prepend(entities[0], entities[1])
+        sut.append(entities[5])
+        assert entities == list(sut)
+        assert entities == [sut[index] for index in range(6)]
+        assert entities == [sut[index] for index in range(-6, 0)]
+        assert entities[1:5] == list(sut[1:5])
+        with pytest.raises(IndexError):
+            sut[6]
+        with pytest.raises(IndexError):
+            sut[-7]
+        del sut[1]
+        del sut[-1]
+        assert [entities[0], *entities[2:5]] == list(sut)
+
+    def test_getitem_by_index_should_not_rebuild_after_adding(self) -> None:
+        sut = SingleTypeEntityCollection(Entity)
+        entity1 = SingleTypeEntityCollectionTestEntity()
+        entity2 = SingleTypeEntityCollectionTestEntity()
+        entity3 = SingleTypeEntityCollectionTestEntity()
+        sut.append(entity2)
+        assert entity2 is sut[0]
+        prepended_entities, entities = sut._get_lists()
+        sut.prepend(entity1)
+        sut.append(entity3)
+        assert entity1 is sut[0]
+        assert entity3 is sut[2]
+        assert prepended_entities is sut._get_lists()[0]
+        assert entities is sut._get_lists()[1]
+
     def test_delitem_by_index(self) -> None:
         sut = SingleTypeEntityCollection(Entity)
         entity1 = SingleTypeEntityCollectionTestEntity()
@@ -292,6 +464,32 @@ class TestSingleTypeEntityCollection:
 
         assert [entity2] == list(sut)
 
+    def test_delitem_by_indices_should_remove_most_entities_in_a_single_pass(self, mocker: MockerFixture) -> None:
+        sut = SingleTypeEntityCollection(Entity)
+        entities = [SingleTypeEntityCollectionTestEntity() for __ in range(9)]
+        sut.append(*entities)
+        init_entities = mocker.spy(sut, '_init_entities')
+        unindex = mocker.spy(sut, '_unindex')
+
+        del sut[1::]
+
+        assert [entities[0]] == list(sut)
+        init_entities.assert_called_once()
+        unindex.assert_not_called()
+
+    def test_delitem_by_indices_should_remove_few_entities_one_by_one(self, mocker: MockerFixture) -> None:
+        sut = SingleTypeEntityCollection(Entity)
+        entities = [SingleTypeEntityCollectionTestEntity() for __ in range(9)]
+        sut.append(*entities)
+        init_entities = mocker.spy(sut, '_init_entities')
+        unindex = mocker.spy(sut, '_unindex')
+
+        del sut[::3]
+
+        assert [entity for index, entity in enumerate(entities) if index % 3] == list(sut)
+        init_entities.assert_not_called()
+        assert 3 == unindex.call_count
+
     def test_delitem_by_entity(self) -> None:
         sut = SingleTypeEntityCollection(Entity)
         entity1 = SingleTypeEntityCollectionTestEntity()
@@ -498,6 +696,30 @@ class TestAssociateCollection:
         assert [associate1, associate2, associate3, associate4] == list(sut.added)
         assert [associate4, associate2] == list(sut.removed)
 
+    def test_remove_many(self) -> None:
+        owner = self._SelfReferentialEntity()
+        sut = self._TrackingAssociateCollection(owner)
+        associate1 = self._SelfReferentialEntity()
+        associate2 = self._SelfReferentialEntity()
+        associate3 = self._SelfReferentialEntity()
+        associate4 = self._SelfReferentialEntity()
+        sut.append(associate1, associate2, associate3, associate4)
+        sut.remove_many([associate4, associate2, associate4])
+        assert [associate1, associate3] == list(sut)
+        assert [associate1, associate2, associate3, associate4] == list(sut.added)
+        assert [associate4, associate2] == list(sut.removed)
+
+    def test_remove_where(self) -> None:
+        owner = self._SelfReferentialEntity()
+        sut = self._TrackingAssociateCollection(owner)
+        associate1 = self._SelfReferentialEntity()
+        associate2 = self._SelfReferentialEntity()
+        associate3 = self._SelfReferentialEntity()
+        sut.append(associate1, associate2, associate3)
+        sut.remove_where(lambda associate: associate is not associate2)
+        assert [associate2] == list(sut)
+        assert [associate1, associate3] == list(sut.removed)
+
     def test_replace(self) -> None:
         owner = self._SelfReferentialEntity()
         sut = self._TrackingAssociateCollection(owner)
@@ -667,6 +889,24 @@ class TestMultipleTypesEntityCollection:
         sut.remove(entity_other)
         assert [] == list(list(sut))
 
+    def test_remove_many(self) -> None:
+        sut = MultipleTypesEntityCollection()
+        entity_one = MultipleTypesEntityCollectionTestEntityOne()
+        entity_other1 = MultipleTypesEntityCollectionTestEntityOther()
+        entity_other2 = MultipleTypesEntityCollectionTestEntityOther()
+        sut.append(entity_one, entity_other1, entity_other2)
+        sut.remove_many([entity_other2, entity_one])
+        assert [entity_other1] == list(sut)
+
+    def test_remove_where(self) -> None:
+        sut = MultipleTypesEntityCollection()
+        entity_one = MultipleTypesEntityCollectionTestEntityOne()
+        entity_other1 = MultipleTypesEntityCollectionTestEntityOther()
+        entity_other2 = MultipleTypesEntityCollectionTestEntityOther()
+        sut.append(entity_one, entity_other1, entity_other2)
+        sut.remove_where(lambda entity: entity is not entity_other1)
+        assert [entity_other1] == list(sut)
+
     def test_getitem_by_index(self) -> None:
         sut = MultipleTypesEntityCollection()
         entity_one = MultipleTypesEntityCollectionTestEntityOne()
@@ -786,6 +1026,15 @@ class TestMultipleTypesEntityCollection:
         assert entity_other1 in sut
         assert entity_other2 not in sut
 
+    def test_clear(self) -> None:
+        sut = MultipleTypesEntityCollection()
+        entity_one = MultipleTypesEntityCollectionTestEntityOne()
+        entity_other = MultipleTypesEntityCollectionTestEntityOther()
+        sut.append(entity_one, entity_other)
+        sut.clear()
+        assert 0 == len(sut)
+        assert entity_one not in sut
+
     @pytest.mark.parametrize('value', [
         True,
         False,
@@ -907,6 +1156,88 @@ class TestFlattenedEntityCollection:
         assert unflattened_entity_many is unflattened_entity_one.many
         assert unflattened_entity_other_many is unflattened_entity_one.other_many
 
+    def test_unflatten_should_retain_association_order(self) -> None:
+        flattened_entities = FlattenedEntityCollection()
+        flattened_entities.add_entity(
+            self._ManyToMany_Many('M1'),
+            self._ManyToMany_Many('M2'),
+            self._ManyToMany_OtherMany('O1'),
+            self._ManyToMany_OtherMany('O2'),
+        )
+        flattened_entities.add_association(self._ManyToMany_Many, 'M1', 'other_many', self._ManyToMany_OtherMany, 'O1')
+        flattened_entities.add_association(self._ManyToMany_Many, 'M2', 'other_many', self._ManyToMany_OtherMany, 'O2')
+        flattened_entities.add_association(self._ManyToMany_Many, 'M2', 'other_many', self._ManyToMany_OtherMany, 'O1')
+        flattened_entities.add_association(self._ManyToMany_Many, 'M1', 'other_many', self._ManyToMany_OtherMany, 'O2')
+
+        unflattened_entities = flattened_entities.unflatten()
+
+        assert ['O1', 'O2'] == [entity.id for entity in unflattened_entities[self._ManyToMany_Many]['M1'].other_many]
+        assert ['O2', 'O1'] == [entity.id for entity in unflattened_entities[self._ManyToMany_Many]['M2'].other_many]
+        assert ['M1', 'M2'] == [entity.id for entity in unflattened_entities[self._ManyToMany_OtherMany]['O1'].many]
+        assert ['M2', 'M1'] == [entity.id for entity in unflattened_entities[self._ManyToMany_OtherMany]['O2'].many]
+
+    def test_unflatten_with_unknown_associate_should_raise_key_error(self) -> None:
+        flattened_entities = FlattenedEntityCollection()
+        flattened_entities.add_entity(self._ManyToMany_Many('M1'))
+        flattened_entities.add_association(self._ManyToMany_Many, 'M1', 'other_many', self._ManyToMany_OtherMany, 'O1')
+
+        with pytest.raises(KeyError):
+            flattened_entities.unflatten()
+
+    def test_unflatten_with_many_associations(self) -> None:
+        entity_count = 10
+        associations_per_entity = 3
+        flattened_entities = FlattenedEntityCollection()
+        flattened_entities.add_entity(*[self._ManyToMany_Many(f'M{i}') for i in range(entity_count)])
+        flattened_entities.add_entity(*[self._ManyToMany_OtherMany(f'O{i}') for i in range(entity_count)])
+        expected_other_many = {
+            f'M{i}': [f'O{(i + j * 7) % entity_count}' for j in range(associations_per_entity)]
+            for i in range(entity_count)
+        }
+        for many_id, other_many_ids in expected_other_many.items():
+            for other_many_id in other_many_ids:
+                flattened_entities.add_association(
+                    self._ManyToMany_Many,
+                    many_id,
+                    'other_many',
+                    self._ManyToMany_OtherMany,
+                    other_many_id,
+                )
+
+        unflattened_entities = flattened_entities.unflatten()
+
+        for many_id, other_many_ids in expected_other_many.items():
+            assert other_many_ids == [entity.id for entity in unflattened_entities[self._ManyToMany_Many][many_id].other_many]
+        for other_many in unflattened_entities[self._ManyToMany_OtherMany]:
+            expected_many_ids = [
+                many_id
+                for many_id, other_many_ids
+                in expected_other_many.items()
+                if other_many.id in other_many_ids
+            ]
+            assert expected_many_ids == [entity.id for entity in other_many.many]
+
+    def _build_unflatten_benchmark(self, association_count: int) -> Callable[[], Any]:
+        associations_per_entity = 10
+        entity_count = association_count // associations_per_entity
+        flattened_entities = FlattenedEntityCollection()
+        flattened_entities.add_entity(*[self._ManyToMany_Many(f'M{i}') for i in range(entity_count)])
+        flattened_entities.add_entity(*[self._ManyToMany_OtherMany(f'O{i}') for i in range(entity_count)])
+        for i in range(entity_count):
+            for j in range(associations_per_entity):
+                flattened_entities.add_association(
+                    self._ManyToMany_Many,
+                    f'M{i}',
+                    'other_many',
+                    self._ManyToMany_OtherMany,
+                    f'O{(i + j * 7919) % entity_count}',
+                )
+        return flattened_entities.unflatten
+
+    @pytest.mark.benchmark
+    def test_unflatten_should_scale_linearly(self) -> None:
+        assert_scales_linearly(self._build_unflatten_benchmark, 1000000)
+
 
 class TestToOne:
     @to_one('one')
@@ -1166,3 +1497,131 @@ class TestManyToOneToMany:
         unpickled_entity_one = pickle.loads(pickle.dumps(entity_one))
         assert entity_left_many.id == unpickled_entity_one.left_many.id
         assert entity_right_many.id == unpickled_entity_one.right_many.id
+
+
+class TestDerivedProperty:
+    @to_one('one')
+    @to_many('many')
+    class _Some(Entity):
+        one: Optional[Entity]
+        many: EntityCollection[Entity]
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.derivations = 0
+            self.nested_derivations = 0
+
+        @derived_property
+        def derived(self) -> List[Entity]:
+            self.derivations += 1
+            return [*([self.one] if self.one else []), *self.many]
+
+        @derived_property
+        def nested_derived(self) -> List[Entity]:
+            self.nested_derivations += 1
+            return self.one.derived if isinstance(self.one, TestDerivedProperty._Some) else []
+
+    class _Other(Entity):
+        pass
+
+    def test_get_on_type(self) -> None:
+        assert isinstance(self._Some.derived, derived_property)
+
+    def test_get_should_cache(self) -> None:
+        sut = self._Some()
+        other = self._Other()
+        sut.many.append(other)
+        assert [other] == sut.derived
+        assert [other] == sut.derived
+        assert 1 == sut.derivations
+
+    def test_get_should_invalidate_when_appending(self) -> None:
+        sut = self._Some()
+        other = self._Other()
+        assert [] == sut.derived
+        sut.many.append(other)
+        assert [other] == sut.derived
+        assert 2 == sut.derivations
+
+    def test_get_should_invalidate_when_removing(self) -> None:
+        sut = self._Some()
+        other = self._Other()
+        sut.many.append(other)
+        assert [other] == sut.derived
+        sut.many.remove(other)
+        assert [] == sut.derived
+        assert 2 == sut.derivations
+
+    def test_get_should_invalidate_when_setting_to_one(self) -> None:
+        sut = self._Some()
+        other = self._Other()
+        assert [] == sut.derived
+        sut.one = other
+        assert [other] == sut.derived
+        del sut.one
+        assert [] == sut.derived
+        assert 3 == sut.derivations
+
+    def test_get_should_not_invalidate_when_changing_unrelated_entities(self) -> None:
+        sut = self._Some()
+        unrelated = self._Some()
+        assert [] == sut.derived
+        unrelated.many.append(self._Other())
+        SingleTypeEntityCollection(self._Other).append(self._Other())
+        assert [] == sut.derived
+        assert 1 == sut.derivations
+
+    def test_get_should_invalidate_when_changing_dependencies(self) -> None:
+        sut = self._Some()
+        dependency = self._Some()
+        sut.one = dependency
+        assert [] == dependency.derived
+        assert [] == sut.nested_derived
+        dependency.many.append(self._Other())
+        assert [*dependency.many] == sut.nested_derived
+        assert 2 == sut.nested_derivations
+
+    def test_get_should_not_share_with_copies(self) -> None:
+        sut = self._Some()
+        other = self._Other()
+        sut.many.append(other)
+        assert [other] == sut.derived
+        copied_sut = copy.copy(sut)
+        copied_sut.derivations = 0
+        assert [other] == copied_sut.derived
+        assert 1 == copied_sut.derivations
+
+    def test_get_after_pickling_should_derive_again(self) -> None:
+        sut = self._Some()
+        other = self._Other()
+        sut.many.append(other)
+        assert [other] == sut.derived
+        unpickled_sut = pickle.loads(pickle.dumps(sut))
+        assert [other.id] == [unpickled_other.id for unpickled_other in unpickled_sut.derived]
+        assert 2 == unpickled_sut.derivations
+
+
+class TestRecordReads:
+    def test_should_record_associates(self) -> None:
+        some = TestDerivedProperty._Some()
+        one = TestDerivedProperty._Some()
+        other = TestDerivedProperty._Other()
+        unread = TestDerivedProperty._Other()
+        some.one = one
+        one.many.append(other)
+        some.many.append(unread)
+        with _record_reads() as dependencies:
+            assert [other] == [*some.one.many]
+        assert {id(some), id(one), id(other)} == set(map(id, dependencies.entities))
+
+    def test_should_record_associates_of_cached_derived_properties(self) -> None:
+        some = TestDerivedProperty._Some()
+        one = TestDerivedProperty._Some()
+        other = TestDerivedProperty._Other()
+        some.one = one
+        one.many.append(other)
+        assert [other] == some.nested_derived
+        with _record_reads() as dependencies:
+            assert [other] == some.nested_derived
+        assert 1 == some.nested_derivations
+        assert {id(some), id(one), id(other)} == set(map(id, dependencies.entities))
@@ -724,6 +724,35 @@ class TestPerson:
         parent.children = [sut, sibling]  # type: ignore
         assert [sibling] == list(sut.siblings)
 
+    def test_start_should_be_updated_when_presences_change(self) -> None:
+        start = Event(None, Birth())
+        sut = Person('P1')
+        assert sut.start is None
+        presence = Presence(sut, Subject(), start)
+        assert start == sut.start
+        presence.person = None
+        assert sut.start is None
+
+    def test_siblings_should_be_updated_when_children_change(self) -> None:
+        sut = Person('1')
+        sibling = Person('2')
+        parent = Person('3')
+        parent.children = [sut]  # type: ignore
+        assert [] == sut.siblings
+        parent.children.append(sibling)
+        assert [sibling] == sut.siblings
+        parent.children.remove(sibling)
+        assert [] == sut.siblings
+
+    def test_associated_files_should_be_updated_when_files_change(self) -> None:
+        file = File(None, Path(__file__))
+        sut = Person('1')
+        assert [] == list(sut.associated_files)
+        sut.files.append(file)
+        assert [file] == list(sut.associated_files)
+        sut.files.remove(file)
+        assert [] == list(sut.associated_files)
+
     def test_associated_files(self) -> None:
         file1 = Mock(File)
         file2 = Mock(File)
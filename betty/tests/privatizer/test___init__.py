@@ -1,15 +1,18 @@
 from datetime import datetime
-from typing import Optional
+from functools import partial
+from typing import Optional, List, Callable
 
 import pytest
+from pytest_mock import MockerFixture
 
 from betty.app import App
 from betty.load import load
 from betty.locale import Date, DateRange
 from betty.model.ancestry import Person, Presence, Event, Source, File, Subject, Attendee, Citation, Ancestry
 from betty.model.event_type import Death, Birth, Marriage
-from betty.privatizer import Privatizer, privatize
+from betty.privatizer import Privatizer, privatize, _get_privatizable_associates
 from betty.project import ExtensionConfiguration
+from betty.tests import assert_scales_linearly
 
 
 def _expand_person(generation: int):
@@ -260,6 +263,52 @@ class TestPrivatizer:
         privatize(ancestry)
         assert expected == person.private
 
+    def test_privatize_person_with_event_on_lifetime_threshold(self):
+        now = datetime.now()
+        person = Person('P0')
+        Presence(person, Subject(), Event(None, Birth(), date=Date(now.year - 125, now.month, now.day)))
+        ancestry = Ancestry()
+        ancestry.entities.append(person)
+        privatize(ancestry)
+        assert not person.private
+
+    def test_privatize_person_with_parent_and_grandparent_through_the_same_ancestor(self):
+        lifetime_threshold_year = datetime.now().year - 125 * 2
+        person = Person('P0')
+        parent = Person('P1')
+        person.parents.append(parent)
+        ancestor = Person('P2')
+        # The ancestor is both a parent and a grandparent. Their event has expired for the former, but not the latter.
+        person.parents.append(ancestor)
+        parent.parents.append(ancestor)
+        Presence(ancestor, Subject(), Event(None, Birth(), date=Date(lifetime_threshold_year - 1, 1, 1)))
+        unrelated_person = Person('P3')
+        unrelated_person.parents.append(parent)
+        ancestry = Ancestry()
+        ancestry.entities.append(unrelated_person, person)
+        privatize(ancestry)
+        assert unrelated_person.private
+        assert not person.private
+
+    def test_privatize_person_with_many_generations_of_ancestors(self):
+        people = [Person(f'P{generation}') for generation in range(5000)]
+        for child, parent in zip(people, people[1:]):
+            child.parents.append(parent)
+        ancestry = Ancestry()
+        ancestry.entities.append(*people)
+        privatize(ancestry)
+        assert all(person.private for person in people)
+
+    def test_privatize_person_with_many_generations_of_descendants(self):
+        people = [Person(f'P{generation}') for generation in range(5000)]
+        for parent, child in zip(people, people[1:]):
+            parent.children.append(child)
+        Presence(people[-1], Subject(), Event(None, Death(), date=Date(datetime.now().year - 126, 1, 1)))
+        ancestry = Ancestry()
+        ancestry.entities.append(*people)
+        privatize(ancestry)
+        assert not any(person.private for person in people)
+
     def test_privatize_event_should_not_privatize_if_public(self):
         source_file = File('F0', __file__)
         source = Source('The Source')
@@ -387,3 +436,93 @@ class TestPrivatizer:
         privatize(ancestry)
         assert True, file.private
         assert citation.private
+
+    def test_privatize_citation_with_many_levels_of_associates(self):
+        citation = Citation('C0', Source('S0'))
+        citation.private = True
+        files = []
+        associate_citation = citation
+        for i in range(5000):
+            file = File(f'F{i}', __file__)
+            associate_citation.files.append(file)
+            files.append(file)
+            associate_citation = Citation(f'C{i + 1}', Source(f'S{i + 1}'))
+            file.citations.append(associate_citation)
+        ancestry = Ancestry()
+        ancestry.entities.append(citation)
+        privatize(ancestry)
+        assert all(file.private for file in files)
+        assert associate_citation.private
+        assert associate_citation.source.private
+
+    def test_privatize_should_visit_shared_associates_once(self, mocker: MockerFixture):
+        source = Source('S0')
+        ancestry = Ancestry()
+        citations = []
+        for i in range(10):
+            person = Person(f'P{i}')
+            person.private = True
+            person_citations = [Citation(None, source) for __ in range(10)]
+            person.citations.append(*person_citations)
+            citations.extend(person_citations)
+            ancestry.entities.append(person)
+        m_get_privatizable_associates = mocker.patch(
+            'betty.privatizer._get_privatizable_associates',
+            side_effect=_get_privatizable_associates,
+        )
+        privatize(ancestry)
+        assert all(citation.private for citation in citations)
+        assert source.private
+        visited = [call.args[0] for call in m_get_privatizable_associates.call_args_list]
+        for entity in [source, *citations]:
+            assert 1 == len([visited_entity for visited_entity in visited if visited_entity is entity])
+
+    def _build_privatize_citations_benchmark(self, citation_count: int) -> Callable[[], None]:
+        source = Source('S0')
+        ancestry = Ancestry()
+        for i in range(citation_count // 10):
+            person = Person(f'P{i}')
+            person.private = True
+            person.citations.append(*[Citation(None, source) for __ in range(10)])
+            ancestry.entities.append(person)
+        return partial(privatize, ancestry)
+
+    @pytest.mark.benchmark
+    def test_privatize_citations_should_scale_linearly(self) -> None:
+        assert_scales_linearly(self._build_privatize_citations_benchmark, 1000000)
+
+    def _generate_family_tree(self, generations: int, people_per_generation: int) -> Ancestry:
+        now = datetime.now()
+        ancestry = Ancestry()
+        previous_generation: List[Person] = []
+        for generation in range(generations):
+            year = now.year - 25 * (generations - generation)
+            current_generation = []
+            for i in range(people_per_generation):
+                person = Person(f'P{generation}-{i}')
+                for parent in previous_generation[i:i + 2]:
+                    person.parents.append(parent)
+                Presence(person, Subject(), Event(None, Birth(), date=Date(year + i % 10, i % 12 + 1, i % 28 + 1)))
+                Presence(person, Subject(), Event(None, Marriage(), date=DateRange(None, Date(year + 20))))
+                current_generation.append(person)
+            ancestry.entities.append(*current_generation)
+            previous_generation = current_generation
+        return ancestry
+
+    def test_privatize_generated_family_tree(self, mocker: MockerFixture):
+        ancestry = self._generate_family_tree(10, 3)
+        # The current date and time is retrieved once, and dates are not compared through Date.
+        m_datetime = mocker.patch('betty.privatizer.datetime', wraps=datetime)
+        m_compare = mocker.patch.object(Date, '_compare', autospec=True, side_effect=Date._compare)
+        privatize(ancestry)
+        assert any(person.private for person in ancestry.entities[Person])
+        assert not all(person.private for person in ancestry.entities[Person])
+        assert 1 == m_datetime.now.call_count
+        m_compare.assert_not_called()
+
+    def _build_privatize_generated_family_tree_benchmark(self, person_count: int) -> Callable[[], None]:
+        return partial(privatize, self._generate_family_tree(10, person_count // 10))
+
+    @pytest.mark.benchmark
+    def test_privatize_generated_family_tree_should_scale_linearly(self) -> None:
+        assert_scales_linearly(self._build_privatize_generated_family_tree_benchmark, 40000)
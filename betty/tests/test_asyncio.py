@@ -1,4 +1,7 @@
+from threading import Thread
+
 import pytest
+from pytest_mock import MockerFixture
 
 from betty.asyncio import sync
 
@@ -87,3 +90,49 @@ class TestSync:
     def test_unsychronizable(self) -> None:
         with pytest.raises(ValueError):
             sync(True)
+
+    async def test_call_coroutine_in_running_loop_should_return_result(self) -> None:
+        expected = 'Hello, oh asynchronous, world!'
+
+        async def _async():
+            return expected
+        actual = sync(_async())
+        assert expected == actual
+
+    async def test_call_coroutine_in_running_loop_should_raise_error(self) -> None:
+        async def _async():
+            raise RuntimeError('Goodbye, oh asynchronous, world!')
+        with pytest.raises(RuntimeError):
+            sync(_async())
+
+    async def test_call_nested_sync_and_async_in_running_loop(self) -> None:
+        expected = 'Hello, oh asynchronous, world!'
+
+        @sync
+        async def _async_one():
+            return _sync()
+
+        def _sync():
+            return _async_two()
+
+        @sync
+        async def _async_two():
+            return expected
+
+        assert expected == _async_one()
+
+    async def test_call_in_running_loop_should_reuse_threads(self, mocker: MockerFixture) -> None:
+        @sync
+        async def _async():
+            return _sync()
+
+        @sync
+        async def _sync():
+            pass
+
+        # Start any threads the first call needs.
+        _async()
+        start = mocker.spy(Thread, 'start')
+        for __ in range(9):
+            _async()
+        start.assert_not_called()
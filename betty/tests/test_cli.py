@@ -172,7 +172,46 @@ class TestGenerate:
         render_args, render_kwargs = m_generate.call_args
         assert 1 == len(render_args)
         assert isinstance(render_args[0], App)
-        assert {} == render_kwargs
+        assert {'incremental': False, 'processes': 1, 'profile': False} == render_kwargs
+
+    @patch('betty.generate.generate', new_callable=AsyncMock)
+    @patch('betty.load.load', new_callable=AsyncMock)
+    def test_incremental(self, m_load, m_generate):
+        configuration = ProjectConfiguration()
+        configuration.write()
+        runner = CliRunner()
+        result = runner.invoke(main, ('-c', str(configuration.configuration_file_path), 'generate', '--incremental'), catch_exceptions=False)
+        assert 0 == result.exit_code
+
+        m_generate.assert_called_once()
+        render_args, render_kwargs = m_generate.call_args
+        assert {'incremental': True, 'processes': 1, 'profile': False} == render_kwargs
+
+    @patch('betty.generate.generate', new_callable=AsyncMock)
+    @patch('betty.load.load', new_callable=AsyncMock)
+    def test_processes(self, m_load, m_generate):
+        configuration = ProjectConfiguration()
+        configuration.write()
+        runner = CliRunner()
+        result = runner.invoke(main, ('-c', str(configuration.configuration_file_path), 'generate', '--processes', '4'), catch_exceptions=False)
+        assert 0 == result.exit_code
+
+        m_generate.assert_called_once()
+        render_args, render_kwargs = m_generate.call_args
+        assert {'incremental': False, 'processes': 4, 'profile': False} == render_kwargs
+
+    @patch('betty.generate.generate', new_callable=AsyncMock)
+    @patch('betty.load.load', new_callable=AsyncMock)
+    def test_profile(self, m_load, m_generate):
+        configuration = ProjectConfiguration()
+        configuration.write()
+        runner = CliRunner()
+        result = runner.invoke(main, ('-c', str(configuration.configuration_file_path), 'generate', '--profile'), catch_exceptions=False)
+        assert 0 == result.exit_code
+
+        m_generate.assert_called_once()
+        render_args, render_kwargs = m_generate.call_args
+        assert {'incremental': False, 'processes': 1, 'profile': True} == render_kwargs
 
 
 class _KeyboardInterruptedServer(Server):
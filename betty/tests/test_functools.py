@@ -56,6 +56,82 @@ class TestWalk:
         expected = [child, grandchild]
         assert expected == list(actual)
 
+    def test_with_shared_descendants(self) -> None:
+        grandchild = self._Item([])
+        child1 = self._Item([grandchild])
+        child2 = self._Item([grandchild])
+        item = self._Item([child1, child2])
+        actual = walk(item, 'child')
+        expected = [child1, grandchild, child2]
+        assert expected == list(actual)
+
+    def test_with_pedigree_collapse(self) -> None:
+        # Both items in each generation share the same children, so there are 2 ** 100 paths to the last generation.
+        item = self._Item([])
+        children = item.child
+        descendants = []
+        for __ in range(100):
+            shared_children: List[TestWalk._Item] = []
+            generation = [self._Item(shared_children), self._Item(shared_children)]
+            children.extend(generation)
+            descendants.extend(generation)
+            children = shared_children
+        actual = walk(item, 'child')
+        assert descendants == sorted(actual, key=descendants.index)
+
+    def test_with_cycle(self) -> None:
+        child: TestWalk._Item = self._Item(None)
+        item = self._Item(child)
+        child.child = item
+        actual = walk(item, 'child')
+        expected = [child]
+        assert expected == list(actual)
+
+    def test_with_deep_descendants(self) -> None:
+        item = self._Item(None)
+        descendant = item
+        for __ in range(10000):
+            descendant.child = self._Item(None)
+            descendant = descendant.child
+        actual = walk(item, 'child')
+        assert 10000 == len(list(actual))
+
+    def test_with_max_depth_0(self) -> None:
+        child = self._Item([])
+        item = self._Item([child])
+        actual = walk(item, 'child', 0)
+        assert [] == list(actual)
+
+    def test_with_max_depth_1(self) -> None:
+        grandchild = self._Item([])
+        child1 = self._Item([grandchild])
+        child2 = self._Item([])
+        item = self._Item([child1, child2])
+        actual = walk(item, 'child', 1)
+        expected = [child1, child2]
+        assert expected == list(actual)
+
+    def test_with_max_depth_should_walk_shorter_paths(self) -> None:
+        # The grandchild is first reached at the maximum depth, and later as a child, so its own child is in reach.
+        great_grandchild = self._Item([])
+        grandchild = self._Item([great_grandchild])
+        child = self._Item([grandchild])
+        item = self._Item([child, grandchild])
+        actual = walk(item, 'child', 2)
+        expected = [child, grandchild, great_grandchild]
+        assert expected == list(actual)
+
+    def test_should_walk_lazily(self) -> None:
+        child = self._Item([])
+        invalid_child = object()
+        item = self._Item([child, invalid_child])
+        actual = iter(walk(item, 'child'))
+        assert child is next(actual)
+        assert invalid_child is next(actual)
+        # The invalid child cannot be walked, which only fails once the walk continues.
+        with pytest.raises(AttributeError):
+            next(actual)
+
 
 class TestSliceToRange:
     @pytest.mark.parametrize('expected_range_items, ranged_slice', [
@@ -1,17 +1,25 @@
+import asyncio
 import json as stdjson
+import logging
 import sys
 from pathlib import Path
 from tempfile import NamedTemporaryFile
+from typing import Tuple
 
 import html5lib
 import pytest
+from pytest_mock import MockerFixture
 
 from betty import json
 from betty.app import App
-from betty.generate import generate
-from betty.model.ancestry import Person, Place, Source, PlaceName, File, Event, Citation
+from betty.app.extension import Extension
+from betty.generate import generate, _generate_concurrently, Generator, _Manifest, _EntityFingerprinter
+from betty.load import Loader, load
+from betty.locale import Date
+from betty.model import GeneratedEntityId
+from betty.model.ancestry import Person, Place, Source, PlaceName, File, Event, Citation, Presence, Subject
 from betty.model.event_type import Birth
-from betty.project import LocaleConfiguration, EntityTypeConfiguration
+from betty.project import LocaleConfiguration, EntityTypeConfiguration, ExtensionConfiguration
 
 
 def assert_betty_html(app: App, url_path: str) -> Path:
@@ -202,3 +210,280 @@ class TestSitemapGenerate:
         with open(app.project.configuration.www_directory_path / 'sitemap.xml') as f:
             sitemap_doc = etree.parse(f)
         schema.validate(sitemap_doc)
+
+
+class TestGenerateIncremental:
+    async def test_without_incremental_should_not_build_manifest(self, mocker: MockerFixture):
+        m_build = mocker.spy(_Manifest, 'build')
+        with App() as app:
+            await generate(app)
+        m_build.assert_not_called()
+        assert not (app.project.configuration.output_directory_path / 'generate-manifest.json').exists()
+
+    async def test_without_previous_generation(self):
+        with App() as app:
+            person = Person('PERSON1')
+            app.project.ancestry.entities.append(person)
+            await generate(app, incremental=True)
+        assert_betty_html(app, '/person/%s/index.html' % person.id)
+        assert (app.project.configuration.output_directory_path / 'generate-manifest.json').exists()
+
+    async def test_should_skip_unchanged_entities(self):
+        with App() as app:
+            person = Person('PERSON1')
+            app.project.ancestry.entities.append(person)
+            await generate(app, incremental=True)
+            file_path = assert_betty_html(app, '/person/%s/index.html' % person.id)
+            with open(file_path, 'w') as f:
+                f.write('Betty was here')
+            await generate(app, incremental=True)
+        with open(file_path) as f:
+            assert 'Betty was here' == f.read()
+
+    async def test_should_regenerate_changed_entities(self):
+        with App() as app:
+            person = Person('PERSON1')
+            app.project.ancestry.entities.append(person)
+            await generate(app, incremental=True)
+            file_path = assert_betty_html(app, '/person/%s/index.html' % person.id)
+            with open(file_path, 'w') as f:
+                f.write('Betty was here')
+            person.private = True
+            await generate(app, incremental=True)
+        assert_betty_html(app, '/person/%s/index.html' % person.id)
+
+    async def test_should_regenerate_entities_with_changed_associates(self):
+        with App() as app:
+            person = Person('PERSON1')
+            event = Event('EVENT1', Birth())
+            event.date = Date(1970, 1, 1)
+            Presence(person, Subject(), event)
+            app.project.ancestry.entities.append(person, event)
+            await generate(app, incremental=True)
+            file_path = assert_betty_html(app, '/person/%s/index.html' % person.id)
+            with open(file_path, 'w') as f:
+                f.write('Betty was here')
+            event.date = Date(1971, 1, 1)
+            await generate(app, incremental=True)
+        assert_betty_html(app, '/person/%s/index.html' % person.id)
+
+    def _build_person_with_place(self, app: App) -> Tuple[Person, Place]:
+        person = Person('PERSON1')
+        place = Place('PLACE1', [PlaceName('Amsterdam')])
+        event = Event('EVENT1', Birth())
+        event.date = Date(1970, 1, 1)
+        event.place = place
+        # The presence is only reachable through associations.
+        Presence(person, Subject(), event)
+        app.project.ancestry.entities.append(person, event, place)
+        return person, place
+
+    async def test_should_skip_entities_with_unchanged_associates(self):
+        with App() as app:
+            person, __ = self._build_person_with_place(app)
+            await generate(app, incremental=True)
+            file_path = assert_betty_html(app, '/person/%s/index.html' % person.id)
+            with open(file_path, 'w') as f:
+                f.write('Betty was here')
+            await generate(app, incremental=True)
+        with open(file_path) as f:
+            assert 'Betty was here' == f.read()
+
+    async def test_should_regenerate_entities_with_changed_distant_associates(self):
+        with App() as app:
+            templates_directory_path = Path(app.project.configuration.assets_directory_path) / 'templates' / 'entity'
+            templates_directory_path.mkdir(parents=True)
+            with open(templates_directory_path / 'page--person.html.j2', 'w') as f:
+                f.write('{% for presence in entity.presences %}{{ presence.event.place.names[0].name }}{% endfor %}')
+            person, place = self._build_person_with_place(app)
+            await generate(app, incremental=True)
+            file_path = app.project.configuration.www_directory_path / 'person' / person.id / 'index.html'
+            with open(file_path) as f:
+                assert 'Amsterdam' == f.read()
+            place.names[0] = PlaceName('Rotterdam')
+            await generate(app, incremental=True)
+        with open(file_path) as f:
+            assert 'Rotterdam' == f.read()
+
+    async def test_should_remove_removed_entities(self):
+        with App() as app:
+            person = Person('PERSON1')
+            app.project.ancestry.entities.append(person)
+            await generate(app, incremental=True)
+            app.project.ancestry.entities.remove(person)
+            await generate(app, incremental=True)
+        assert not (app.project.configuration.www_directory_path / 'person' / person.id).exists()
+
+    async def test_should_regenerate_all_for_changed_configuration(self):
+        with App() as app:
+            person = Person('PERSON1')
+            app.project.ancestry.entities.append(person)
+            await generate(app, incremental=True)
+            file_path = assert_betty_html(app, '/person/%s/index.html' % person.id)
+            with open(file_path, 'w') as f:
+                f.write('Betty was here')
+            app.project.configuration.title = 'Betty was here too'
+            await generate(app, incremental=True)
+        assert_betty_html(app, '/person/%s/index.html' % person.id)
+
+    async def test_should_remove_resized_images_of_removed_files(self):
+        with App() as app:
+            file = File('FILE1', Path(__file__))
+            other_file = File('FILE10', Path(__file__))
+            app.project.ancestry.entities.append(file, other_file)
+            await generate(app, incremental=True)
+            file_directory_path = app.project.configuration.www_directory_path / 'file'
+            resized_image_file_path = file_directory_path / 'FILE1--x100.jpg'
+            other_resized_image_file_path = file_directory_path / 'FILE10--x100.jpg'
+            resized_image_file_path.touch()
+            other_resized_image_file_path.touch()
+            app.project.ancestry.entities.remove(file)
+            await generate(app, incremental=True)
+        assert not resized_image_file_path.exists()
+        assert other_resized_image_file_path.exists()
+
+    async def test_should_log_regenerated_entities_only(self, caplog: pytest.LogCaptureFixture):
+        with App() as app:
+            app.project.ancestry.entities.append(Person('PERSON1'))
+            await generate(app, incremental=True)
+            with caplog.at_level(logging.INFO):
+                await generate(app, incremental=True)
+        assert 'Generated pages for 0 People in English (United States).' in caplog.text
+
+
+class TestEntityFingerprinter:
+    class _Value:
+        pass
+
+    def test_fingerprint_should_not_depend_on_memory_addresses(self):
+        person = Person('PERSON1')
+        other_person = Person('PERSON1')
+        person.value = self._Value()  # type: ignore[attr-defined]
+        other_person.value = self._Value()  # type: ignore[attr-defined]
+        person.callback = lambda: None  # type: ignore[attr-defined]
+        other_person.callback = lambda: None  # type: ignore[attr-defined]
+        assert _EntityFingerprinter().fingerprint(person, []) == _EntityFingerprinter().fingerprint(other_person, [])
+
+
+class _PeopleLoader(Extension, Loader):
+    async def load(self) -> None:
+        for i in range(9):
+            person = Person(f'PERSON{i}')
+            event = Event(f'EVENT{i}', Birth())
+            self._app.project.ancestry.entities.append(person, event, Presence(person, Subject(), event))
+
+
+class TestGenerateInProcesses:
+    async def test(self, caplog: pytest.LogCaptureFixture, mocker: MockerFixture):
+        # The worker processes start generating entity IDs from scratch.
+        mocker.patch.object(GeneratedEntityId, '_last_id', 0)
+        with App() as app:
+            app.project.configuration.locales.replace([
+                LocaleConfiguration('en-US', 'en'),
+                LocaleConfiguration('nl-NL', 'nl'),
+            ])
+            app.project.configuration.extensions.add(ExtensionConfiguration(_PeopleLoader))
+            await load(app)
+            with caplog.at_level(logging.WARNING):
+                await generate(app, processes=2)
+        assert [] == caplog.records
+        for person in app.project.ancestry.entities[Person]:
+            assert_betty_html(app, '/en/person/%s/index.html' % person.id)
+            assert_betty_json(app, '/en/person/%s/index.json' % person.id, 'person')
+            assert_betty_html(app, '/nl/person/%s/index.html' % person.id)
+            assert_betty_json(app, '/nl/person/%s/index.json' % person.id, 'person')
+
+    async def test_incremental_should_skip_unchanged_entities(self, caplog: pytest.LogCaptureFixture, mocker: MockerFixture):
+        mocker.patch.object(GeneratedEntityId, '_last_id', 0)
+        with App() as app:
+            app.project.configuration.extensions.add(ExtensionConfiguration(_PeopleLoader))
+            await load(app)
+            await generate(app, incremental=True, processes=2)
+            file_path = assert_betty_html(app, '/person/PERSON0/index.html')
+            with open(file_path, 'w') as f:
+                f.write('Betty was here')
+            with caplog.at_level(logging.WARNING):
+                await generate(app, incremental=True, processes=2)
+        assert [] == caplog.records
+        with open(file_path) as f:
+            assert 'Betty was here' == f.read()
+
+    async def test_with_changed_ancestry_should_generate_in_main_process(self, caplog: pytest.LogCaptureFixture, mocker: MockerFixture):
+        mocker.patch.object(GeneratedEntityId, '_last_id', 0)
+        with App() as app:
+            app.project.configuration.extensions.add(ExtensionConfiguration(_PeopleLoader))
+            await load(app)
+            person = Person('PERSON_IN_MEMORY')
+            app.project.ancestry.entities.append(person)
+            with caplog.at_level(logging.WARNING):
+                await generate(app, processes=2)
+        assert 1 == len(caplog.records)
+        assert_betty_html(app, '/person/%s/index.html' % person.id)
+        assert_betty_json(app, '/person/%s/index.json' % person.id, 'person')
+
+
+class TestGenerateConcurrently:
+    async def test_should_bound_awaitables_in_flight(self):
+        in_flight = 0
+        max_in_flight = 0
+        produced = 0
+
+        async def _task() -> None:
+            nonlocal in_flight, max_in_flight
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            await asyncio.sleep(0)
+            in_flight -= 1
+
+        async def _produce():
+            nonlocal produced
+            for _ in range(99):
+                # Awaitables must only be produced once there is room for them.
+                assert in_flight < 3
+                produced += 1
+                yield _task()
+
+        await _generate_concurrently(_produce(), 3)
+        assert 99 == produced
+        assert 0 == in_flight
+        assert 3 == max_in_flight
+
+    async def test_should_raise_errors(self):
+        async def _fail() -> None:
+            raise RuntimeError
+
+        async def _produce():
+            yield _fail()
+
+        with pytest.raises(RuntimeError):
+            await _generate_concurrently(_produce(), 3)
+
+
+class _ProfiledGenerator(Extension, Generator):
+    async def generate(self) -> None:
+        with open(self.app.project.configuration.www_directory_path / 'profiled.txt', 'w') as f:
+            f.write('Betty was here')
+
+
+class TestGenerateProfile:
+    async def test(self):
+        with App() as app:
+            app.project.configuration.extensions.add(ExtensionConfiguration(_ProfiledGenerator))
+            person = Person('PERSON1')
+            app.project.ancestry.entities.append(person)
+            await generate(app, profile=True)
+        with open(app.project.configuration.output_directory_path / 'generate-profile.json') as f:
+            report = stdjson.load(f)
+        measurements = report['measurements']
+        assert 'en-US' in measurements['locales']
+        assert 'entity/page.html.j2' in measurements['templates']
+        assert 'text/html' in measurements['media_types']
+        assert 'application/json' in measurements['media_types']
+        assert 1 == measurements['generators'][_ProfiledGenerator.name()]['count']
+        person_measurement = measurements['entity_types']['Person']
+        assert 4 == person_measurement['count']
+        assert 0 < person_measurement['bytes']
+        assert 0 <= person_measurement['wall_time']
+        assert 0 <= person_measurement['cpu_time']
+        for stage in ('static assets', 'pages', 'generators'):
+            assert stage in measurements['stages']
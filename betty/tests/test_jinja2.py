@@ -82,6 +82,8 @@ class FilterWalkTest(TemplateTestCase):
         ('', '{{ data | walk("children") | join }}', WalkData('parent')),
         ('child1, child1child1, child2', '{{ data | walk("children") | join(", ") }}',
          WalkData('parent', [WalkData('child1', [WalkData('child1child1')]), WalkData('child2')])),
+        ('child1, child2', '{{ data | walk("children", 1) | join(", ") }}',
+         WalkData('parent', [WalkData('child1', [WalkData('child1child1')]), WalkData('child2')])),
     ])
     def test(self, expected, template, data):
         with self._render(template_string=template, data={
@@ -1,7 +1,9 @@
 import json as stdjson
 from tempfile import NamedTemporaryFile
+from threading import Thread
 
 from geopy import Point
+from pytest_mock import MockerFixture
 
 from betty import json
 from betty.app import App
@@ -26,6 +28,12 @@ class TestJSONEncoder:
         json.validate(encoded_data, schema_definition, app)
         assert expected == encoded_data
 
+    async def test_entity_should_encode_in_event_loop_without_threads(self, mocker: MockerFixture) -> None:
+        with App() as app:
+            start = mocker.spy(Thread, 'start')
+            stdjson.dumps(Person('the_person'), cls=JSONEncoder.get_factory(app))
+            start.assert_not_called()
+
     def test_coordinates_should_encode(self):
         latitude = 12.345
         longitude = -54.321
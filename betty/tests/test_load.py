@@ -0,0 +1,35 @@
+import logging
+from typing import List, Set, Type
+
+from _pytest.logging import LogCaptureFixture
+
+from betty.app import App
+from betty.app.extension import Extension
+from betty.load import PostLoader, load
+from betty.project import ExtensionConfiguration
+
+_post_loaded: List[str] = []
+
+
+class _PostLoaderExtension(Extension, PostLoader):
+    async def post_load(self) -> None:
+        _post_loaded.append(self.name())
+
+
+class _DependentPostLoaderExtension(_PostLoaderExtension):
+    @classmethod
+    def comes_after(cls) -> Set[Type[Extension]]:
+        return {_PostLoaderExtension}
+
+
+class TestLoad:
+    async def test_should_post_load(self, caplog: LogCaptureFixture) -> None:
+        _post_loaded.clear()
+        with App() as app:
+            app.project.configuration.extensions.add(ExtensionConfiguration(_DependentPostLoaderExtension))
+            app.project.configuration.extensions.add(ExtensionConfiguration(_PostLoaderExtension))
+            with caplog.at_level(logging.INFO):
+                await load(app)
+        assert [_PostLoaderExtension.name(), _DependentPostLoaderExtension.name()] == _post_loaded
+        assert f'Post-loaded {_PostLoaderExtension.name()} in ' in caplog.text
+        assert f'Post-loaded {_DependentPostLoaderExtension.name()} in ' in caplog.text
@@ -1,3 +1,4 @@
+import pickle
 from typing import Optional, List, Dict
 
 import pytest
@@ -38,3 +39,9 @@ class TestMediaType:
     def test_invalid_type_should_raise_error(self, media_type: str):
         with pytest.raises(InvalidMediaType):
             MediaType(media_type)
+
+    def test_pickle(self):
+        sut = MediaType('text/html; charset=UTF-8')
+        unpickled_sut = pickle.loads(pickle.dumps(sut))
+        assert sut == unpickled_sut
+        assert str(sut) == str(unpickled_sut)
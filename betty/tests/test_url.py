@@ -1,13 +1,15 @@
 from typing import Any
 
 import pytest
+from pytest_mock import MockerFixture
 
+import betty.url
 from betty.app import App
 from betty.model import UserFacingEntity, Entity
 from betty.model.ancestry import Person, Place, File, Source, PlaceName, Event, Citation
 from betty.model.event_type import Death
-from betty.project import LocaleConfiguration
-from betty.url import ContentNegotiationPathUrlGenerator, _EntityUrlGenerator, AppUrlGenerator
+from betty.project import LocaleConfiguration, ProjectConfiguration
+from betty.url import ContentNegotiationPathUrlGenerator, _EntityUrlGenerator, AppUrlGenerator, StaticPathUrlGenerator
 
 
 class TestLocalizedPathUrlGenerator:
@@ -66,6 +68,17 @@ class TestLocalizedPathUrlGenerator:
             with app.acquire_locale('en'):
                 assert '/en/index.html' == sut.generate('/index.html', 'text/html')
 
+    def test_generate_multilingual_with_locale(self):
+        app = App()
+        app.project.configuration.locales.replace([
+            LocaleConfiguration('nl'),
+            LocaleConfiguration('en'),
+        ])
+        with app:
+            sut = ContentNegotiationPathUrlGenerator(app)
+            with app.acquire_locale('nl'):
+                assert '/en/index.html' == sut.generate('/index.html', 'text/html', locale='en')
+
 
 class EntityUrlGeneratorTestUrlyEntity(UserFacingEntity, Entity):
     pass
@@ -103,8 +116,72 @@ class TestAppUrlGenerator:
             sut = AppUrlGenerator(app)
             assert expected == sut.generate(resource, 'text/html')
 
+    def test_generate_multilingual_with_locale(self):
+        app = App()
+        app.project.configuration.locales.replace([
+            LocaleConfiguration('nl'),
+            LocaleConfiguration('en'),
+        ])
+        with app:
+            sut = AppUrlGenerator(app)
+            with app.acquire_locale('nl'):
+                assert '/en/person/P1/index.html' == sut.generate(Person('P1'), 'text/html', locale='en')
+
     def test_generate_with_invalid_value(self):
         with App() as app:
             sut = AppUrlGenerator(app)
             with pytest.raises(ValueError):
                 sut.generate(9, 'text/html')
+
+    def test_generate_with_entity_subclass(self):
+        class _Person(Person):
+            pass
+        with App() as app:
+            sut = AppUrlGenerator(app)
+            assert '/person/P1/index.html' == sut.generate(_Person('P1'), 'text/html')
+            assert '/person/P2/index.html' == sut.generate(_Person('P2'), 'text/html')
+
+    def test_generate_should_update_when_configuration_changes(self):
+        with App() as app:
+            sut = AppUrlGenerator(app)
+            assert '/person/P1/index.html' == sut.generate(Person('P1'), 'text/html')
+            assert '/index.html' == sut.generate('/index.html', 'text/html')
+            app.project.configuration.root_path = 'root'
+            app.project.configuration.clean_urls = True
+            assert '/root/person/P1' == sut.generate(Person('P1'), 'text/html')
+            assert '/root' == sut.generate('/index.html', 'text/html')
+
+    def test_generate_should_build_prefixes_once_per_locale(self, mocker: MockerFixture):
+        generate_prefix = mocker.spy(betty.url, '_generate_prefix')
+        with App() as app:
+            sut = AppUrlGenerator(app)
+            for __ in range(3):
+                sut.generate(Person('P1'), 'text/html')
+                sut.generate(Event('E1', Death()), 'application/json')
+                sut.generate('/index.html', 'text/html')
+        assert 1 == generate_prefix.call_count
+
+
+class TestStaticPathUrlGenerator:
+    def test_generate(self):
+        configuration = ProjectConfiguration()
+        sut = StaticPathUrlGenerator(configuration)
+        assert '/index.html' == sut.generate('/index.html')
+
+    def test_generate_absolute(self):
+        configuration = ProjectConfiguration()
+        configuration.base_url = 'https://example.com'
+        sut = StaticPathUrlGenerator(configuration)
+        assert 'https://example.com/index.html' == sut.generate('/index.html', absolute=True)
+
+    def test_generate_should_update_when_configuration_changes(self):
+        configuration = ProjectConfiguration()
+        sut = StaticPathUrlGenerator(configuration)
+        assert '/index.html' == sut.generate('/index.html')
+        configuration.root_path = 'root'
+        assert '/root/index.html' == sut.generate('/index.html')
+
+    def test_generate_with_invalid_value(self):
+        sut = StaticPathUrlGenerator(ProjectConfiguration())
+        with pytest.raises(ValueError):
+            sut.generate(9)  # type: ignore
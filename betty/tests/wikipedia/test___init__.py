@@ -1,3 +1,6 @@
+import asyncio
+import json
+from contextlib import closing
 from pathlib import Path
 from tempfile import TemporaryDirectory
 from time import sleep
@@ -21,7 +24,8 @@ from aioresponses import aioresponses
 
 from betty.model.ancestry import Source, Link, Citation
 from betty.load import load
-from betty.wikipedia import Entry, _Retriever, NotAnEntryError, _parse_url, RetrievalError, _Populator, Wikipedia
+from betty.wikipedia import Entry, _Retriever, NotAnEntryError, _parse_url, RetrievalError, _Populator, Wikipedia, \
+    _ResponseCache
 from betty.app import App
 
 
@@ -64,6 +68,85 @@ class TestEntry:
         assert content == sut.content
 
 
+class TestResponseCache:
+    async def test_get_without_response_should_return_none(self) -> None:
+        with TemporaryDirectory() as cache_directory_path:
+            with closing(_ResponseCache(Path(cache_directory_path) / 'responses.sqlite')) as sut:
+                assert await sut.get('https://example.com') is None
+
+    async def test_get_should_return_response(self) -> None:
+        with TemporaryDirectory() as cache_directory_path:
+            with closing(_ResponseCache(Path(cache_directory_path) / 'responses.sqlite')) as sut:
+                await sut.set('https://example.com', 123.0, '{}')
+                assert (123.0, '{}') == await sut.get('https://example.com')
+
+    async def test_get_should_return_replaced_response(self) -> None:
+        with TemporaryDirectory() as cache_directory_path:
+            with closing(_ResponseCache(Path(cache_directory_path) / 'responses.sqlite')) as sut:
+                await sut.set('https://example.com', 123.0, '{}')
+                await sut.set('https://example.com', 456.0, '[]')
+                assert (456.0, '[]') == await sut.get('https://example.com')
+
+    async def test_get_should_return_response_from_other_cache(self) -> None:
+        with TemporaryDirectory() as cache_directory_path:
+            database_path = Path(cache_directory_path) / 'responses.sqlite'
+            with closing(_ResponseCache(database_path)) as cache:
+                await cache.set('https://example.com', 123.0, '{}')
+            with closing(_ResponseCache(database_path)) as sut:
+                assert (123.0, '{}') == await sut.get('https://example.com')
+
+    async def test_get_after_close_should_return_response(self) -> None:
+        with TemporaryDirectory() as cache_directory_path:
+            with closing(_ResponseCache(Path(cache_directory_path) / 'responses.sqlite')) as sut:
+                await sut.set('https://example.com', 123.0, '{}')
+                sut.close()
+                assert (123.0, '{}') == await sut.get('https://example.com')
+
+    async def test_set_should_evict_least_recently_used_responses(self) -> None:
+        with TemporaryDirectory() as cache_directory_path:
+            database_path = Path(cache_directory_path) / 'responses.sqlite'
+            with closing(_ResponseCache(database_path, 4)) as sut:
+                await sut.set('https://example.com/1', 123.0, '11')
+                await sut.set('https://example.com/2', 123.0, '22')
+                await sut.get('https://example.com/1')
+                await sut.set('https://example.com/3', 123.0, '33')
+                assert await sut.get('https://example.com/2') is None
+                assert await sut.get('https://example.com/1') is not None
+                assert await sut.get('https://example.com/3') is not None
+            # Evicted responses must be removed from the database as well.
+            with closing(_ResponseCache(database_path)) as cache:
+                assert await cache.get('https://example.com/2') is None
+
+    async def test_set_should_keep_most_recently_used_response(self) -> None:
+        with TemporaryDirectory() as cache_directory_path:
+            with closing(_ResponseCache(Path(cache_directory_path) / 'responses.sqlite', 4)) as sut:
+                await sut.set('https://example.com/1', 123.0, '11')
+                await sut.set('https://example.com/2', 123.0, '22222')
+                assert await sut.get('https://example.com/1') is None
+                assert (123.0, '22222') == await sut.get('https://example.com/2')
+
+    async def test_preload_should_evict_least_recently_used_responses(self) -> None:
+        with TemporaryDirectory() as cache_directory_path:
+            database_path = Path(cache_directory_path) / 'responses.sqlite'
+            with closing(_ResponseCache(database_path)) as cache:
+                await cache.set('https://example.com/1', 123.0, '11')
+                await cache.set('https://example.com/2', 123.0, '22')
+            with closing(_ResponseCache(database_path, 2)) as sut:
+                assert await sut.get('https://example.com/1') is None
+                assert await sut.get('https://example.com/2') is not None
+
+    async def test_should_remove_legacy_cache_files(self) -> None:
+        with TemporaryDirectory() as cache_directory_path:
+            legacy_cache_file_path = Path(cache_directory_path) / '0123456789abcdef0123456789abcdef'
+            legacy_cache_file_path.touch()
+            other_file_path = Path(cache_directory_path) / 'other'
+            other_file_path.touch()
+            with closing(_ResponseCache(Path(cache_directory_path) / 'responses.sqlite')) as sut:
+                await sut.get('https://example.com')
+            assert not legacy_cache_file_path.exists()
+            assert other_file_path.exists()
+
+
 class TestRetriever:
     @pytest.mark.parametrize('expected, response_pages_json', [
         ({}, {},),
@@ -96,7 +179,8 @@ class TestRetriever:
         aioresponses.get(api_url, payload=api_response_body)
         with TemporaryDirectory() as cache_directory_path:
             async with aiohttp.ClientSession() as session:
-                translations = await _Retriever(session, Path(cache_directory_path)).get_translations(entry_language, entry_name)
+                with closing(_Retriever(session, Path(cache_directory_path))) as retriever:
+                    translations = await retriever.get_translations(entry_language, entry_name)
         assert expected == translations
 
     async def test_get_translations_with_client_error_should_raise_retrieval_error(self, aioresponses: aioresponses, mocker: MockerFixture) -> None:
@@ -108,7 +192,8 @@ class TestRetriever:
         with TemporaryDirectory() as cache_directory_path:
             with pytest.raises(RetrievalError):
                 async with aiohttp.ClientSession() as session:
-                    await _Retriever(session, Path(cache_directory_path)).get_translations(entry_language, entry_name)
+                    with closing(_Retriever(session, Path(cache_directory_path))) as retriever:
+                        await retriever.get_translations(entry_language, entry_name)
 
     async def test_get_translations_with_invalid_json_response_should_raise_retrieval_error(self, aioresponses: aioresponses, mocker: MockerFixture) -> None:
         mocker.patch('sys.stderr')
@@ -119,7 +204,8 @@ class TestRetriever:
         with TemporaryDirectory() as cache_directory_path:
             with pytest.raises(RetrievalError):
                 async with aiohttp.ClientSession() as session:
-                    await _Retriever(session, Path(cache_directory_path)).get_translations(entry_language, entry_name)
+                    with closing(_Retriever(session, Path(cache_directory_path))) as retriever:
+                        await retriever.get_translations(entry_language, entry_name)
 
     @pytest.mark.parametrize('response_json', [
         {},
@@ -146,7 +232,8 @@ class TestRetriever:
         with TemporaryDirectory() as cache_directory_path:
             with pytest.raises(RetrievalError):
                 async with aiohttp.ClientSession() as session:
-                    await _Retriever(session, Path(cache_directory_path)).get_translations(entry_language, entry_name)
+                    with closing(_Retriever(session, Path(cache_directory_path))) as retriever:
+                        await retriever.get_translations(entry_language, entry_name)
 
     async def test_get_entry_should_return(self, aioresponses: aioresponses) -> None:
         entry_language = 'en'
@@ -181,18 +268,19 @@ class TestRetriever:
         aioresponses.get(api_url, payload=api_response_body_4)
         with TemporaryDirectory() as cache_directory_path:
             async with aiohttp.ClientSession() as session:
-                retriever = _Retriever(session, Path(cache_directory_path), 1)
-                # The first retrieval should make a successful request and set the cache.
-                entry_1 = await retriever.get_entry(entry_language, entry_name)
-                # The second retrieval should hit the cache from the first request.
-                entry_2 = await retriever.get_entry(entry_language, entry_name)
-                # The third retrieval should result in a failed request, and hit the cache from the first request.
-                sleep(2)
-                entry_3 = await retriever.get_entry(entry_language, entry_name)
-                # The fourth retrieval should make a successful request and set the cache again.
-                entry_4 = await retriever.get_entry(entry_language, entry_name)
-                # The fifth retrieval should hit the cache from the fourth request.
-                entry_5 = await retriever.get_entry(entry_language, entry_name)
+                with closing(_Retriever(session, Path(cache_directory_path), 1)) as retriever:
+                    # The first retrieval should make a successful request and set the cache.
+                    entry_1 = await retriever.get_entry(entry_language, entry_name)
+                    # The second retrieval should hit the cache from the first request.
+                    entry_2 = await retriever.get_entry(entry_language, entry_name)
+                    # The third retrieval should result in a failed request, and hit the cache from the first request.
+                    sleep(2)
+                    entry_3 = await retriever.get_entry(entry_language, entry_name)
+                    # The fourth retrieval should make a successful request and set the cache again.
+                    sleep(2)
+                    entry_4 = await retriever.get_entry(entry_language, entry_name)
+                    # The fifth retrieval should hit the cache from the fourth request.
+                    entry_5 = await retriever.get_entry(entry_language, entry_name)
         for entry in [entry_1, entry_2, entry_3]:
             assert entry_url == entry.url
             assert title == entry.title
@@ -210,9 +298,108 @@ class TestRetriever:
         aioresponses.get(api_url, exception=aiohttp.ClientError())
         with TemporaryDirectory() as cache_directory_path:
             async with aiohttp.ClientSession() as session:
-                retriever = _Retriever(session, Path(cache_directory_path))
-                with pytest.raises(RetrievalError):
-                    await retriever.get_entry(entry_language, entry_name)
+                with closing(_Retriever(session, Path(cache_directory_path))) as retriever:
+                    with pytest.raises(RetrievalError):
+                        await retriever.get_entry(entry_language, entry_name)
+
+    async def test_get_entry_with_client_error_should_return_expired_entry(self, aioresponses: aioresponses, mocker: MockerFixture) -> None:
+        mocker.patch('sys.stderr')
+        api_url = 'https://en.wikipedia.org/w/api.php?action=query&titles=Amsterdam&prop=extracts&exintro&format=json&formatversion=2'
+        aioresponses.get(api_url, exception=aiohttp.ClientError(), repeat=True)
+        with TemporaryDirectory() as cache_directory_path:
+            async with aiohttp.ClientSession() as session:
+                with closing(_Retriever(session, Path(cache_directory_path))) as retriever:
+                    await retriever._cache.set(api_url, 0, json.dumps({
+                        'query': {
+                            'pages': [
+                                {
+                                    'title': 'Amsterdam',
+                                    'extract': 'De hoofdstad van Nederland.',
+                                },
+                            ],
+                        }
+                    }))
+                    entry = await retriever.get_entry('en', 'Amsterdam')
+                    # The expired entry must remain available without requesting it again.
+                    retrieved_entry = retriever.get_retrieved_entry('en', 'Amsterdam')
+                    await retriever.get_entry('en', 'Amsterdam')
+        assert 'De hoofdstad van Nederland.' == entry.content
+        assert entry is retrieved_entry
+        assert 1 == sum(map(len, aioresponses.requests.values()))
+
+    async def test_get_entry_should_coalesce_concurrent_requests(self, aioresponses: aioresponses) -> None:
+        api_url = 'https://en.wikipedia.org/w/api.php?action=query&titles=Amsterdam&prop=extracts&exintro&format=json&formatversion=2'
+        aioresponses.get(api_url, payload={
+            'query': {
+                'pages': [
+                    {
+                        'title': 'Amsterdam',
+                        'extract': 'De hoofdstad van Nederland.',
+                    },
+                ],
+            }
+        })
+        with TemporaryDirectory() as cache_directory_path:
+            async with aiohttp.ClientSession() as session:
+                with closing(_Retriever(session, Path(cache_directory_path))) as retriever:
+                    entry_1, entry_2 = await asyncio.gather(
+                        retriever.get_entry('en', 'Amsterdam'),
+                        retriever.get_entry('en', 'Amsterdam'),
+                    )
+        assert 'De hoofdstad van Nederland.' == entry_1.content
+        assert 'De hoofdstad van Nederland.' == entry_2.content
+
+    async def test_prefetch_entries_should_retrieve_entries_in_batches(self, aioresponses: aioresponses, mocker: MockerFixture) -> None:
+        mocker.patch('sys.stderr')
+        api_url = 'https://en.wikipedia.org/w/api.php?action=query&titles=Amsterdam|Amsterdam_(disambiguation)|Atlantis&prop=extracts&exintro&exlimit=max&format=json&formatversion=2'
+        aioresponses.get(api_url, payload={
+            'query': {
+                'normalized': [
+                    {
+                        'from': 'Amsterdam_(disambiguation)',
+                        'to': 'Amsterdam (disambiguation)',
+                    },
+                ],
+                'pages': [
+                    {
+                        'title': 'Amsterdam',
+                        'extract': 'De hoofdstad van Nederland.',
+                    },
+                    {
+                        'title': 'Amsterdam (disambiguation)',
+                        'extract': 'Amsterdam may refer to several places.',
+                    },
+                    {
+                        'title': 'Atlantis',
+                        'missing': True,
+                    },
+                ],
+            }
+        })
+        with TemporaryDirectory() as cache_directory_path:
+            async with aiohttp.ClientSession() as session:
+                with closing(_Retriever(session, Path(cache_directory_path))) as retriever:
+                    await retriever.prefetch_entries([
+                        ('en', 'Amsterdam'),
+                        ('en', 'Amsterdam_(disambiguation)'),
+                        ('en', 'Atlantis'),
+                        ('en', 'Amsterdam'),
+                    ])
+                    # Prefetched entries must not be requested again.
+                    entry = await retriever.get_entry('en', 'Amsterdam')
+                    disambiguation_entry = await retriever.get_entry('en', 'Amsterdam_(disambiguation)')
+                    with pytest.raises(RetrievalError):
+                        await retriever.get_entry('en', 'Atlantis')
+        assert 'De hoofdstad van Nederland.' == entry.content
+        assert 'Amsterdam (disambiguation)' == disambiguation_entry.title
+        assert 'https://en.wikipedia.org/wiki/Amsterdam_(disambiguation)' == disambiguation_entry.url
+
+    async def test_get_retrieved_entry_without_retrieval_should_raise_key_error(self) -> None:
+        with TemporaryDirectory() as cache_directory_path:
+            async with aiohttp.ClientSession() as session:
+                with closing(_Retriever(session, Path(cache_directory_path))) as retriever:
+                    with pytest.raises(KeyError):
+                        retriever.get_retrieved_entry('en', 'Amsterdam')
 
 
 class TestPopulator:
@@ -399,6 +586,11 @@ class TestPopulator:
             call(added_entry_language, added_entry_name),
         ])
         m_retriever.get_translations.assert_called_once_with(entry_language, entry_name)
+        m_retriever.prefetch_entries.assert_called_once()
+        assert {
+            (entry_language, entry_name),
+            (added_entry_language, added_entry_name),
+        } == set(m_retriever.prefetch_entries.call_args.args[0])
         assert 2 == len(resource.links)
         link_nl = resource.links.difference({link_en}).pop()
         assert 'Amsterdam' == link_nl.label
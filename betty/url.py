@@ -1,7 +1,6 @@
 from __future__ import annotations
 
-from contextlib import suppress
-from typing import Any, Optional, Type
+from typing import Any, Optional, Type, Callable, Dict, Tuple
 
 from betty.app import App
 from betty.locale import negotiate_locale
@@ -12,7 +11,10 @@ from betty.string import camel_case_to_kebab_case
 
 
 class ContentNegotiationUrlGenerator:
-    def generate(self, resource: Any, media_type: str, absolute: bool = False) -> str:
+    def generate(self, resource: Any, media_type: str, absolute: bool = False, locale: Optional[str] = None) -> str:
+        """
+        Generate a URL for a resource, in the given locale, or in the application's current locale.
+        """
         raise NotImplementedError
 
 
@@ -21,63 +23,122 @@ class StaticUrlGenerator:
         raise NotImplementedError
 
 
+class _UrlPrefixes:
+    """
+    Build a project's URL prefixes once per locale, until the project's configuration changes.
+    """
+
+    def __init__(self, get_configuration: Callable[[], ProjectConfiguration]):
+        self._get_configuration = get_configuration
+        self._configuration: Optional[ProjectConfiguration] = None
+        self._prefixes: Dict[Tuple[Optional[str], bool], Tuple[str, bool]] = {}
+
+    def get(self, locale: Optional[str], absolute: bool) -> Tuple[str, bool]:
+        """
+        Get the URL prefix for a locale, and whether URLs must be clean.
+        """
+        configuration = self._get_configuration()
+        if configuration is not self._configuration:
+            self._configuration = configuration
+            self._prefixes = {}
+            configuration.react.react_weakref(self._clear)
+        try:
+            return self._prefixes[(locale, absolute)]
+        except KeyError:
+            prefix = self._prefixes[(locale, absolute)] = _generate_prefix(configuration, absolute, locale), configuration.clean_urls
+            return prefix
+
+    def _clear(self) -> None:
+        self._prefixes = {}
+
+
 class ContentNegotiationPathUrlGenerator(ContentNegotiationUrlGenerator):
-    def __init__(self, app: App):
+    def __init__(self, app: App, prefixes: Optional[_UrlPrefixes] = None):
         self._app = app
+        self._prefixes = prefixes or _UrlPrefixes(lambda: app.project.configuration)
 
-    def generate(self, resource: Any, media_type: str, absolute: bool = False) -> str:
-        return _generate_from_path(self._app.project.configuration, resource, absolute, self._app.locale)
+    def generate(self, resource: Any, media_type: str, absolute: bool = False, locale: Optional[str] = None) -> str:
+        if not isinstance(resource, str):
+            raise ValueError('%s is not a string.' % type(resource))
+        return _generate_from_prefix(*self._prefixes.get(locale or self._app.locale, absolute), resource)
 
 
 class StaticPathUrlGenerator(StaticUrlGenerator):
     def __init__(self, configuration: ProjectConfiguration):
-        self._configuration = configuration
+        self._prefixes = _UrlPrefixes(lambda: configuration)
 
     def generate(self, resource: Any, absolute: bool = False, ) -> str:
-        return _generate_from_path(self._configuration, resource, absolute)
+        if not isinstance(resource, str):
+            raise ValueError('%s is not a string.' % type(resource))
+        return _generate_from_prefix(*self._prefixes.get(None, absolute), resource)
 
 
 class _EntityUrlGenerator(ContentNegotiationUrlGenerator):
-    def __init__(self, app: App, entity_type: Type[UserFacingEntity]):
+    def __init__(self, app: App, entity_type: Type[UserFacingEntity], prefixes: Optional[_UrlPrefixes] = None):
         self._app = app
         self._entity_type = entity_type
+        self._prefixes = prefixes or _UrlPrefixes(lambda: app.project.configuration)
         self._pattern = f'{camel_case_to_kebab_case(get_entity_type_name(entity_type))}/{{entity_id}}/index.{{extension}}'
+        # The parts of the URLs before and after the entity IDs, keyed by media type, URL prefix, and clean URLs.
+        self._templates: Dict[Tuple[str, str, bool], Tuple[str, str]] = {}
 
-    def generate(self, entity: UserFacingEntity, media_type: str, absolute: bool = False) -> str:
+    def generate(self, entity: UserFacingEntity, media_type: str, absolute: bool = False, locale: Optional[str] = None) -> str:
         if not isinstance(entity, self._entity_type):
             raise ValueError('%s is not a %s' % (type(entity), self._entity_type))
-        return _generate_from_path(self._app.project.configuration, self._pattern.format(
-            entity_id=entity.id,
-            extension=EXTENSIONS[media_type],
-        ), absolute, self._app.locale)
+        prefix, clean_urls = self._prefixes.get(locale or self._app.locale, absolute)
+        try:
+            head, tail = self._templates[(media_type, prefix, clean_urls)]
+        except KeyError:
+            head, tail = self._templates[(media_type, prefix, clean_urls)] = tuple(_generate_from_prefix(  # type: ignore
+                prefix,
+                clean_urls,
+                self._pattern.format(entity_id='\0', extension=EXTENSIONS[media_type]),
+            ).split('\0'))
+        if tail:
+            return head + entity.id + tail
+        return (head + entity.id).rstrip('/')
 
 
 class AppUrlGenerator(ContentNegotiationUrlGenerator):
     def __init__(self, app: App):
-        self._generators = [
-            *(
-                _EntityUrlGenerator(app, entity_type)
-                for entity_type in app.entity_types
-                if issubclass(entity_type, UserFacingEntity)
-            ),
-            ContentNegotiationPathUrlGenerator(app),
+        prefixes = _UrlPrefixes(lambda: app.project.configuration)
+        self._entity_generators = [
+            _EntityUrlGenerator(app, entity_type, prefixes)
+            for entity_type in app.entity_types
+            if issubclass(entity_type, UserFacingEntity)
         ]
-
-    def generate(self, resource: Any, media_type: str, absolute: bool = False) -> str:
-        for generator in self._generators:
-            with suppress(ValueError):
-                return generator.generate(resource, media_type, absolute)
-        raise ValueError('No URL generator found for %s.' % (
-            resource if isinstance(resource, str) else type(resource)))
-
-
-def _generate_from_path(configuration: ProjectConfiguration, path: str, absolute: bool = False, locale: Optional[str] = None) -> str:
-    if not isinstance(path, str):
-        raise ValueError('%s is not a string.' % type(path))
-    url = configuration.base_url if absolute else ''
-    url += '/'
+        # The generators for each resource type, which are added for subclasses when they are first needed.
+        self._generators: Dict[type, ContentNegotiationUrlGenerator] = {
+            str: ContentNegotiationPathUrlGenerator(app, prefixes),
+            **{
+                generator._entity_type: generator
+                for generator
+                in self._entity_generators
+            },
+        }
+
+    def generate(self, resource: Any, media_type: str, absolute: bool = False, locale: Optional[str] = None) -> str:
+        try:
+            generator = self._generators[type(resource)]
+        except KeyError:
+            generator = self._get_generator(resource)
+        return generator.generate(resource, media_type, absolute, locale)
+
+    def _get_generator(self, resource: Any) -> ContentNegotiationUrlGenerator:
+        for generator in self._entity_generators:
+            if isinstance(resource, generator._entity_type):
+                self._generators[type(resource)] = generator
+                return generator
+        if isinstance(resource, str):
+            return self._generators[str]
+        raise ValueError('No URL generator found for %s.' % type(resource))
+
+
+def _generate_prefix(configuration: ProjectConfiguration, absolute: bool = False, locale: Optional[str] = None) -> str:
+    prefix = configuration.base_url if absolute else ''
+    prefix += '/'
     if configuration.root_path:
-        url += configuration.root_path + '/'
+        prefix += configuration.root_path + '/'
     if locale and configuration.multilingual:
         try:
             locale_configuration = configuration.locales[locale]
@@ -94,8 +155,12 @@ def _generate_from_path(configuration: ProjectConfiguration, path: str, absolute
                 )]
             except KeyError:
                 raise ValueError(f'Cannot generate URLs in "{locale}", because it cannot be resolved to any of the enabled project locales: {", ".join(project_locales)}')
-        url += locale_configuration.alias + '/'
-    url += path.strip('/')
-    if configuration.clean_urls and url.endswith('/index.html'):
+        prefix += locale_configuration.alias + '/'
+    return prefix
+
+
+def _generate_from_prefix(prefix: str, clean_urls: bool, path: str) -> str:
+    url = prefix + path.strip('/')
+    if clean_urls and url.endswith('/index.html'):
         url = url[:-10]
     return url.rstrip('/')
@@ -1,15 +1,16 @@
 import asyncio
-import hashlib
 import json
 import logging
 import re
+import sqlite3
+from collections import defaultdict
 from contextlib import suppress
-from os.path import getmtime
 from pathlib import Path
+from threading import Lock
 from time import time
-from typing import Optional, Dict, Callable, Tuple, Iterable, Set, TYPE_CHECKING, cast
+from typing import Optional, Dict, Callable, Tuple, Iterable, Set, TYPE_CHECKING, cast, List, Iterator, OrderedDict
+from urllib.parse import unquote
 
-import aiofiles
 import aiohttp
 from jinja2 import pass_context
 from jinja2.runtime import Context
@@ -23,7 +24,7 @@ from betty.jinja2 import Jinja2Provider, Environment
 from betty.load import PostLoader
 from betty.locale import Localized, negotiate_locale
 from betty.media_type import MediaType
-from betty.model.ancestry import Link, HasLinks, Entity
+from betty.model.ancestry import Link, HasLinks
 
 if TYPE_CHECKING:
     from betty.builtins import _
@@ -75,72 +76,303 @@ class Entry(Localized):
         return self._content
 
 
+class _ResponseCache:
+    """
+    Store HTTP response bodies and the times they were retrieved at in a single SQLite database.
+
+    All responses are loaded into memory when the cache is first used. Once the total size of all responses exceeds the
+    maximum size in bytes, the least recently used responses are evicted. The database connection is opened once, and
+    all database work runs in the event loop's default executor, so that it never blocks the event loop.
+    """
+
+    # Access times are written in batches, so that reading responses does not require writing to the database each time.
+    _ACCESSED_BATCH_SIZE = 1000
+
+    # Earlier versions cached each response in its own file in the same directory, named after the MD5 hash of its URL.
+    # Those files lack the URLs needed to import them, so they are removed instead.
+    _LEGACY_CACHE_FILE_NAME_PATTERN = re.compile(r'[0-9a-f]{32}')
+
+    def __init__(self, database_path: Path, max_size: int = 2 ** 27):
+        self._database_path = database_path
+        self._max_size = max_size
+        # The cache is used by all threads that retrieve Wikipedia entries.
+        self._lock = Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+        # Responses with their retrieval times, sizes, and bodies, from the least to the most recently used.
+        self._responses: OrderedDict[str, Tuple[float, int, str]] = OrderedDict()
+        self._size = 0
+        self._accessed: Dict[str, float] = {}
+
+    async def get(self, url: str) -> Optional[Tuple[float, str]]:
+        """
+        Get a response's retrieval time and body, if it is cached.
+        """
+        return await asyncio.get_running_loop().run_in_executor(None, self._get, url)
+
+    async def set(self, url: str, retrieved: float, body: str) -> None:
+        await asyncio.get_running_loop().run_in_executor(None, self._set, url, retrieved, body)
+
+    def close(self) -> None:
+        """
+        Write any pending changes, and close the database.
+        """
+        with self._lock:
+            if self._connection is None:
+                return
+            with self._connection:
+                self._write_accessed(self._connection)
+            self._connection.close()
+            self._connection = None
+
+    def _connect(self) -> sqlite3.Connection:
+        """
+        Get the database connection, and open and load the database first if needed.
+
+        The lock must be held.
+        """
+        if self._connection is not None:
+            return self._connection
+        self._remove_legacy_cache_files()
+        connection = sqlite3.connect(self._database_path, timeout=30, check_same_thread=False)
+        try:
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            with connection:
+                connection.execute('CREATE TABLE IF NOT EXISTS response (url TEXT PRIMARY KEY, retrieved REAL NOT NULL, accessed REAL NOT NULL, size INTEGER NOT NULL, body TEXT NOT NULL)')
+                self._responses.clear()
+                self._size = 0
+                for url, retrieved, size, body in connection.execute('SELECT url, retrieved, size, body FROM response ORDER BY accessed'):
+                    self._responses[url] = retrieved, size, body
+                    self._size += size
+                self._evict(connection)
+        except BaseException:
+            connection.close()
+            raise
+        self._connection = connection
+        return connection
+
+    def _remove_legacy_cache_files(self) -> None:
+        with suppress(FileNotFoundError):
+            for file_path in self._database_path.parent.iterdir():
+                if self._LEGACY_CACHE_FILE_NAME_PATTERN.fullmatch(file_path.name) and file_path.is_file():
+                    with suppress(FileNotFoundError):
+                        file_path.unlink()
+
+    def _get(self, url: str) -> Optional[Tuple[float, str]]:
+        with self._lock:
+            connection = self._connect()
+            try:
+                retrieved, __, body = self._responses[url]
+            except KeyError:
+                return None
+            self._responses.move_to_end(url)
+            self._accessed[url] = time()
+            if len(self._accessed) >= self._ACCESSED_BATCH_SIZE:
+                with connection:
+                    self._write_accessed(connection)
+            return retrieved, body
+
+    def _set(self, url: str, retrieved: float, body: str) -> None:
+        with self._lock:
+            connection = self._connect()
+            with suppress(KeyError):
+                __, previous_size, ___ = self._responses.pop(url)
+                self._size -= previous_size
+            size = len(body.encode('utf-8'))
+            self._responses[url] = retrieved, size, body
+            self._size += size
+            self._accessed.pop(url, None)
+            with connection:
+                connection.execute(
+                    'INSERT OR REPLACE INTO response (url, retrieved, accessed, size, body) VALUES (?, ?, ?, ?, ?)',
+                    (url, retrieved, time(), size, body),
+                )
+                self._write_accessed(connection)
+                self._evict(connection)
+
+    def _write_accessed(self, connection: sqlite3.Connection) -> None:
+        connection.executemany(
+            'UPDATE response SET accessed = ? WHERE url = ?',
+            [(accessed, url) for url, accessed in self._accessed.items()],
+        )
+        self._accessed.clear()
+
+    def _evict(self, connection: sqlite3.Connection) -> None:
+        evicted_urls = []
+        # Always keep the most recently used response, even if it exceeds the maximum size by itself.
+        while self._size > self._max_size and len(self._responses) > 1:
+            url, (__, size, ___) = self._responses.popitem(last=False)
+            self._size -= size
+            self._accessed.pop(url, None)
+            evicted_urls.append((url,))
+        connection.executemany('DELETE FROM response WHERE url = ?', evicted_urls)
+
+
 class _Retriever:
+    # The API returns no more than this many introductory extracts per request.
+    _ENTRY_BATCH_SIZE = 20
+
     def __init__(self, http_client: aiohttp.ClientSession, cache_directory_path: Path, ttl: int = 86400):
         self._cache_directory_path = cache_directory_path
         self._cache_directory_path.mkdir(exist_ok=True, parents=True)
+        self._cache = _ResponseCache(self._cache_directory_path / 'responses.sqlite')
         self._ttl = ttl
         self._http_client = http_client
-
-    async def _request(self, url: str) -> Dict:
-        cache_file_path = self._cache_directory_path / hashlib.md5(url.encode('utf-8')).hexdigest()
-
-        response_data = None
-        with suppress(FileNotFoundError):
-            if getmtime(cache_file_path) + self._ttl > time():
-                async with aiofiles.open(cache_file_path, encoding='utf-8') as f:
-                    json_data = await f.read()
-                response_data = json.loads(json_data)
-
-        if response_data is None:
-            logger = logging.getLogger()
-            try:
-                async with self._http_client.get(url) as response:
-                    response_data = await response.json(encoding='utf-8')
-                    json_data = await response.text()
-                    async with aiofiles.open(cache_file_path, 'w', encoding='utf-8') as f:
-                        await f.write(json_data)
-            except aiohttp.ClientError as e:
-                logger.warning('Could not successfully connect to Wikipedia at %s: %s' % (url, e))
-            except ValueError as e:
-                logger.warning('Could not parse JSON content from Wikipedia at %s: %s' % (url, e))
-
-        if response_data is None:
-            try:
-                async with aiofiles.open(cache_file_path, encoding='utf-8') as f:
-                    json_data = await f.read()
-                response_data = json.loads(json_data)
-            except FileNotFoundError:
-                raise RetrievalError('Could neither fetch %s, nor find an old version in the cache.' % url)
-
-        return response_data
-
-    async def _get_page_data(self, url: str) -> Dict:
-        response_data = await self._request(url)
+        # Requests in progress, keyed by URL, so that concurrent requests for the same URL are made once only.
+        self._requests: Dict[str, asyncio.Task] = {}
+        # Retrieved entries and the times they were retrieved at, keyed by language and name. Entries are None if they
+        # could not be retrieved.
+        self._entries: Dict[Tuple[str, str], Tuple[float, Optional[Entry]]] = {}
+        self._translations: Dict[Tuple[str, str], Tuple[float, Dict[str, str]]] = {}
+
+    def close(self) -> None:
+        self._cache.close()
+
+    async def _request(self, url: str) -> Tuple[float, Dict]:
+        """
+        Get the response data for a URL, and the time it was retrieved from Wikipedia at.
+
+        If Wikipedia cannot be reached, an expired response from the cache is used instead. Its retrieval time is the
+        current time, so that it is not requested again for the rest of the build.
+        """
+        with suppress(KeyError):
+            request = self._requests[url]
+            # Tasks can only be awaited by the event loop they run on.
+            if request.get_loop() is asyncio.get_running_loop():
+                return await asyncio.shield(request)
+        request = asyncio.create_task(self._do_request(url))
+        self._requests[url] = request
+        try:
+            return await asyncio.shield(request)
+        finally:
+            if self._requests.get(url) is request:
+                del self._requests[url]
+
+    async def _do_request(self, url: str) -> Tuple[float, Dict]:
+        cached_response = await self._cache.get(url)
+        if cached_response is not None:
+            retrieved, json_data = cached_response
+            if retrieved + self._ttl > time():
+                return retrieved, json.loads(json_data)
+
+        logger = logging.getLogger()
         try:
-            return response_data['query']['pages'][0]
+            async with self._http_client.get(url) as response:
+                retrieved = time()
+                response_data = await response.json(encoding='utf-8')
+                json_data = await response.text()
+                await self._cache.set(url, retrieved, json_data)
+                return retrieved, response_data
+        except aiohttp.ClientError as e:
+            logger.warning('Could not successfully connect to Wikipedia at %s: %s' % (url, e))
+        except ValueError as e:
+            logger.warning('Could not parse JSON content from Wikipedia at %s: %s' % (url, e))
+
+        if cached_response is None:
+            raise RetrievalError('Could neither fetch %s, nor find an old version in the cache.' % url)
+        __, json_data = cached_response
+        return time(), json.loads(json_data)
+
+    async def _get_page_data(self, url: str) -> Tuple[float, Dict]:
+        retrieved, response_data = await self._request(url)
+        try:
+            return retrieved, response_data['query']['pages'][0]
         except (LookupError, TypeError) as e:
             raise RetrievalError('Could not successfully parse the JSON format returned by %s: %s' % (url, e))
 
     async def get_translations(self, entry_language: str, entry_name: str) -> Dict[str, str]:
+        with suppress(KeyError):
+            retrieved, translations = self._translations[(entry_language, entry_name)]
+            if retrieved + self._ttl > time():
+                return translations
         url = 'https://%s.wikipedia.org/w/api.php?action=query&titles=%s&prop=langlinks&lllimit=500&format=json&formatversion=2' % (
             entry_language, entry_name)
-        page_data = await self._get_page_data(url)
+        retrieved, page_data = await self._get_page_data(url)
         try:
             translations_data = page_data['langlinks']
         except KeyError:
             # There may not be any translations.
-            return {}
-        return {translation_data['lang']: translation_data['title'] for translation_data in translations_data}
+            translations = {}
+        else:
+            translations = {translation_data['lang']: translation_data['title'] for translation_data in translations_data}
+        self._translations[(entry_language, entry_name)] = retrieved, translations
+        return translations
+
+    def get_retrieved_entry(self, language: str, name: str) -> Optional[Entry]:
+        """
+        Get an entry that was retrieved before.
+
+        :raises KeyError: if the entry has not been retrieved yet, or if it has expired.
+        :raises RetrievalError: if the entry could not be retrieved.
+        """
+        retrieved, entry = self._entries[(language, name)]
+        if retrieved + self._ttl <= time():
+            raise KeyError((language, name))
+        if entry is None:
+            raise RetrievalError('Could not retrieve %s:%s before.' % (language, name))
+        return entry
 
     async def get_entry(self, language: str, name: str) -> Entry:
+        with suppress(KeyError):
+            return cast(Entry, self.get_retrieved_entry(language, name))
         url = 'https://%s.wikipedia.org/w/api.php?action=query&titles=%s&prop=extracts&exintro&format=json&formatversion=2' % (
             language, name)
-        page_data = await self._get_page_data(url)
         try:
-            return Entry(language, name, page_data['title'], page_data['extract'])
-        except KeyError as e:
-            raise RetrievalError('Could not successfully parse the JSON content returned by %s: %s' % (url, e))
+            retrieved, page_data = await self._get_page_data(url)
+            try:
+                entry = Entry(language, name, page_data['title'], page_data['extract'])
+            except KeyError as e:
+                raise RetrievalError('Could not successfully parse the JSON content returned by %s: %s' % (url, e))
+        except RetrievalError:
+            self._entries[(language, name)] = time(), None
+            raise
+        self._entries[(language, name)] = retrieved, entry
+        return entry
+
+    async def prefetch_entries(self, entry_names: Iterable[Tuple[str, str]]) -> None:
+        """
+        Retrieve many entries, using as few requests as possible.
+        """
+        names_by_language: Dict[str, List[str]] = defaultdict(list)
+        for language, name in entry_names:
+            with suppress(KeyError, RetrievalError):
+                self.get_retrieved_entry(language, name)
+                continue
+            if name not in names_by_language[language]:
+                names_by_language[language].append(name)
+        await asyncio.gather(*[
+            self._prefetch_entry_batch(language, names[batch_start:batch_start + self._ENTRY_BATCH_SIZE])
+            for language, names in names_by_language.items()
+            for batch_start in range(0, len(names), self._ENTRY_BATCH_SIZE)
+        ])
+
+    async def _prefetch_entry_batch(self, language: str, names: List[str]) -> None:
+        url = 'https://%s.wikipedia.org/w/api.php?action=query&titles=%s&prop=extracts&exintro&exlimit=max&format=json&formatversion=2' % (
+            language, '|'.join(names))
+        try:
+            retrieved, response_data = await self._request(url)
+            query_data = response_data['query']
+            pages_data = {page_data['title']: page_data for page_data in query_data['pages']}
+            normalized_titles = {
+                normalized_data['from']: normalized_data['to']
+                for normalized_data
+                in query_data.get('normalized', [])
+            }
+        except RetrievalError:
+            return
+        except (LookupError, TypeError) as e:
+            logging.getLogger().warning('Could not successfully parse the JSON format returned by %s: %s' % (url, e))
+            return
+        for name in names:
+            title = unquote(name)
+            page_data = pages_data.get(normalized_titles.get(title, title))
+            # Leave entries that cannot be matched to any page to be retrieved individually.
+            if page_data is None:
+                continue
+            try:
+                self._entries[(language, name)] = retrieved, Entry(language, name, page_data['title'], page_data['extract'])
+            except KeyError:
+                self._entries[(language, name)] = retrieved, None
 
 
 class _Populator:
@@ -150,41 +382,68 @@ class _Populator:
 
     async def populate(self) -> None:
         locales = set(map(lambda x: x.alias, self._app.project.configuration.locales))
-        await asyncio.gather(*[  # type: ignore
-            self._populate_entity(entity, locales)
-            for entity  # type: ignore
-            in self._app.project.ancestry.entities
-        ])
-
-    async def _populate_entity(self, entity: Entity, locales: Set[str]) -> None:
-        if not isinstance(entity, HasLinks):
+        entities_entry_links: List[Tuple[HasLinks, List[Tuple[Link, str, str]]]] = []
+        for entity in self._app.project.ancestry.entities:  # type: ignore
+            if isinstance(entity, HasLinks):
+                entities_entry_links.append((entity, self._get_entry_links(entity)))
+        entry_names = list({
+            (entry_language, entry_name)
+            for __, entry_links in entities_entry_links
+            for ___, entry_language, entry_name in entry_links
+        })
+        if not entry_names:
             return
+        translations = dict(zip(entry_names, await asyncio.gather(*[
+            self._retriever.get_translations(entry_language, entry_name)
+            for entry_language, entry_name
+            in entry_names
+        ])))
+        await self._retriever.prefetch_entries([
+            *entry_names,
+            *(
+                added_entry_name
+                for entry_name in entry_names
+                for added_entry_name in self._get_added_entry_names(entry_name, translations[entry_name], locales)
+            ),
+        ])
+        await asyncio.gather(*[
+            self._populate_entity(entity, entry_links, translations, locales)
+            for entity, entry_links
+            in entities_entry_links
+        ])
 
-        entry_links = set()
+    def _get_entry_links(self, entity: HasLinks) -> List[Tuple[Link, str, str]]:
+        entry_links = []
         for link in entity.links:
-            try:
-                entry_language, entry_name = _parse_url(link.url)
-                entry_links.add((entry_language, entry_name))
-            except NotAnEntryError:
+            with suppress(NotAnEntryError):
+                entry_links.append((link, *_parse_url(link.url)))
+        return entry_links
+
+    def _get_added_entry_names(self, entry_name: Tuple[str, str], entry_translations: Dict[str, str], locales: Set[str]) -> Iterator[Tuple[str, str]]:
+        if len(entry_translations) == 0:
+            return
+        entry_language, __ = entry_name
+        entry_languages = set(entry_translations.keys())
+        for locale in locales.difference({entry_language}):
+            added_entry_language = negotiate_locale(locale, entry_languages)
+            if added_entry_language is None:
                 continue
+            yield added_entry_language, entry_translations[added_entry_language]
 
+    async def _populate_entity(self, entity: HasLinks, entry_links: List[Tuple[Link, str, str]], translations: Dict[Tuple[str, str], Dict[str, str]], locales: Set[str]) -> None:
+        entry_names = set()
+        for entry_link, entry_language, entry_name in entry_links:
+            entry_names.add((entry_language, entry_name))
             entry = None
-            if link.label is None:
+            if entry_link.label is None:
                 with suppress(RetrievalError):
                     entry = await self._retriever.get_entry(entry_language, entry_name)
-            await self.populate_link(link, entry_language, entry)
+            await self.populate_link(entry_link, entry_language, entry)
 
-        for entry_language, entry_name in list(entry_links):
-            entry_translations = await self._retriever.get_translations(entry_language, entry_name)
-            if len(entry_translations) == 0:
-                continue
-            entry_languages = set(entry_translations.keys())
-            for locale in locales.difference({entry_language}):
-                added_entry_language = negotiate_locale(locale, entry_languages)
-                if added_entry_language is None:
-                    continue
-                added_entry_name = entry_translations[added_entry_language]
-                if (added_entry_language, added_entry_name) in entry_links:
+        for entry_language, entry_name in list(entry_names):
+            entry_translations = translations[(entry_language, entry_name)]
+            for added_entry_language, added_entry_name in self._get_added_entry_names((entry_language, entry_name), entry_translations, locales):
+                if (added_entry_language, added_entry_name) in entry_names:
                     continue
                 try:
                     added_entry = await self._retriever.get_entry(added_entry_language, added_entry_name)
@@ -193,7 +452,7 @@ class _Populator:
                 added_link = Link(added_entry.url)
                 await self.populate_link(added_link, added_entry_language, added_entry)
                 entity.links.add(added_link)
-                entry_links.add((added_entry_language, added_entry_name))
+                entry_names.add((added_entry_language, added_entry_name))
 
     async def populate_link(self, link: Link, entry_language: str, entry: Optional[Entry] = None) -> None:
         if link.url.startswith('http:'):
@@ -232,6 +491,8 @@ class Wikipedia(UserFacingExtension, Jinja2Provider, PostLoader, ReactiveInstanc
 
     @_retriever.deleter
     def _retriever(self) -> None:
+        if self.__retriever is not None:
+            self.__retriever.close()
         self.__retriever = None
 
     @reactive  # type: ignore
@@ -252,27 +513,41 @@ class Wikipedia(UserFacingExtension, Jinja2Provider, PostLoader, ReactiveInstanc
         }
 
     @pass_context
-    @sync
-    async def _filter_wikipedia_links(self, context: Context, links: Iterable[Link]) -> Iterable[Entry]:
-        return filter(
-            None,
-            await asyncio.gather(*[
-                self._filter_wikipedia_link(
-                    cast(Environment, context.environment).app.locale,
-                    link,
-                )
-                for link
-                in links
-            ]),
-        )
+    def _filter_wikipedia_links(self, context: Context, links: Iterable[Link]) -> Iterable[Entry]:
+        locale = cast(Environment, context.environment).app.locale
+        entry_names = [
+            entry_name
+            for entry_name
+            in map(self._filter_wikipedia_link, links)
+            if entry_name is not None and negotiate_locale(locale, {entry_name[0]}) is not None
+        ]
+        # Entries are usually retrieved during post-loading already, so only retrieve any others.
+        entries: Dict[Tuple[str, str], Optional[Entry]] = {}
+        for entry_language, entry_name in entry_names:
+            with suppress(KeyError):
+                try:
+                    entries[(entry_language, entry_name)] = self._retriever.get_retrieved_entry(entry_language, entry_name)
+                except RetrievalError:
+                    entries[(entry_language, entry_name)] = None
+        unretrieved_entry_names = [entry_name for entry_name in entry_names if entry_name not in entries]
+        if unretrieved_entry_names:
+            entries.update(zip(unretrieved_entry_names, sync(self._retrieve_entries(unretrieved_entry_names))))
+        return filter(None, (entries[entry_name] for entry_name in entry_names))
 
-    async def _filter_wikipedia_link(self, locale: str, link: Link) -> Optional[Entry]:
+    def _filter_wikipedia_link(self, link: Link) -> Optional[Tuple[str, str]]:
         try:
-            entry_language, entry_name = _parse_url(link.url)
+            return _parse_url(link.url)
         except NotAnEntryError:
             return None
-        if negotiate_locale(locale, {entry_language}) is None:
-            return None
+
+    async def _retrieve_entries(self, entry_names: Iterable[Tuple[str, str]]) -> Iterable[Optional[Entry]]:
+        return await asyncio.gather(*[
+            self._retrieve_entry(entry_language, entry_name)
+            for entry_language, entry_name
+            in entry_names
+        ])
+
+    async def _retrieve_entry(self, entry_language: str, entry_name: str) -> Optional[Entry]:
         try:
             return await self._retriever.get_entry(entry_language, entry_name)
         except RetrievalError: